@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Compile the DSPy programs offline and save them for LLMService to load at startup.
+
+Few-shot demos are bootstrapped with BootstrapFewShot from a recorded dataset
+(JSON lines) or from synthetic study material. Calls go to the backend that
+LLM_BACKEND selects, or to a local stub server started with --stub, and only
+demos whose outputs pass the program's metric are kept. Each program is saved
+under DSPY_PROGRAM_DIR (DSPY_STUB_PROGRAM_DIR with --stub) with a manifest of
+the prompt layout, DSPy version, backend and model it was compiled for; the
+backend ignores artifacts that do not match, so optimizing prompts costs
+nothing at boot.
+
+    python compile_programs.py --stub --synthetic 20
+    python compile_programs.py --dataset recorded.jsonl --programs evaluate
+
+Each dataset line names its program and gives the program's inputs, plus the
+expected score for evaluations if known:
+
+    {"program": "evaluate", "study_context": "...", "question": "...", "max_marks": 5,
+     "reference_answer": "...", "student_answer": "...", "score": 3.5}
+    {"program": "generate", "study_text": "..."}
+"""
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent
+BENCHMARKS_DIR = BACKEND_DIR.parent / "benchmarks"
+
+# Input fields of each compilable program, as LLMService.programs() names them
+PROGRAM_INPUTS = {
+    "evaluate": ("study_context", "question", "max_marks", "reference_answer", "student_answer"),
+    "generate": ("study_text",),
+}
+
+def start_stub_llm() -> subprocess.Popen:
+    """Start the stub LLM server on a free port and point the backend at it through the environment"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    os.environ.update({"LLM_BACKEND": "stub", "STUB_LLM_HOST": "127.0.0.1", "STUB_LLM_PORT": str(port)})
+    server = subprocess.Popen(
+        [sys.executable, "stub_llm.py", "--port", str(port), "--latency-ms", "0", "--jitter-ms", "0"],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Stub LLM server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Stub LLM server did not start within 30 seconds")
+
+def load_dataset(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read recorded examples from a JSON lines file, grouped by program"""
+    records = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            program = record.pop("program", None)
+            if program not in PROGRAM_INPUTS:
+                raise ValueError(f"Line {number}: unknown program {program!r}")
+            missing = [name for name in PROGRAM_INPUTS[program] if name not in record]
+            if missing:
+                raise ValueError(f"Line {number}: missing {', '.join(missing)}")
+            records[program].append(record)
+    return records
+
+def synthetic_dataset(size: int, seed: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Build examples from the benchmarks' synthetic study material and cohort answers"""
+    sys.path.insert(0, str(BENCHMARKS_DIR))
+    import synthetic
+    from services.grading import build_question_contexts
+    from services.material_store import material_store
+    from utils import prepare_csv_evaluation, COHORT_ANSWER_COLUMNS
+
+    material_store.upsert("compile-programs", synthetic.study_material(16 * 1024, seed))
+    questions_df = synthetic.questions(seed=seed)
+    answers_df = synthetic.cohort_answers(questions_df, max(1, size // len(questions_df) + 1), seed)
+    _, pairs, _, _ = prepare_csv_evaluation(questions_df, answers_df, COHORT_ANSWER_COLUMNS)
+    contexts = build_question_contexts("compile-programs", pairs)
+    material_store.delete("compile-programs")
+
+    return {
+        "evaluate": [
+            {
+                "study_context": contexts[pair.question_number][0],
+                "question": pair.question_text,
+                "max_marks": pair.marks,
+                "reference_answer": pair.answer_text,
+                "student_answer": pair.student_answer
+            }
+            for pair in pairs.head(size).itertuples(index=False)
+        ],
+        "generate": [{"study_text": synthetic.study_material(2048, seed + i)} for i in range(size)]
+    }
+
+def evaluate_metric(tolerance: float) -> Callable:
+    """Accept evaluations with a score in range, and near the expected score when one is recorded"""
+    def metric(example, prediction, trace=None) -> bool:
+        match = re.search(r"Score:\s*([0-9.]+)", prediction.evaluation or "")
+        if not match:
+            return False
+        score = float(match.group(1))
+        if not 0 <= score <= float(example.max_marks):
+            return False
+        expected = example.get("score")
+        return expected is None or abs(score - float(expected)) <= tolerance
+    return metric
+
+def generate_metric(example, prediction, trace=None) -> bool:
+    """Accept papers that follow the marks rules without repair"""
+    from utils import parse_paper
+    return not parse_paper(prediction.question_paper or "")["issues"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the DSPy programs offline and save them")
+    parser.add_argument("--programs", default=",".join(PROGRAM_INPUTS), help=f"Comma-separated programs ({', '.join(PROGRAM_INPUTS)})")
+    parser.add_argument("--dataset", help="Recorded examples as JSON lines")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic examples per program")
+    parser.add_argument("--stub", action="store_true", help="Compile against a local stub LLM server")
+    parser.add_argument("--demos", type=int, default=4, help="Maximum bootstrapped demos per predictor")
+    parser.add_argument("--score-tolerance", type=float, default=1.0, help="Allowed distance from a recorded score")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", help="Where to save programs (default: DSPY_PROGRAM_DIR, or DSPY_STUB_PROGRAM_DIR with --stub)")
+    args = parser.parse_args()
+
+    programs = [p for p in args.programs.split(",") if p]
+    unknown = [p for p in programs if p not in PROGRAM_INPUTS]
+    if unknown:
+        parser.error(f"Unknown programs: {', '.join(unknown)}")
+    if not args.dataset and not args.synthetic:
+        parser.error("Provide --dataset or --synthetic")
+
+    # Paths given on the command line are relative to where the script was run
+    dataset = os.path.abspath(args.dataset) if args.dataset else None
+    output_dir = os.path.abspath(args.output_dir) if args.output_dir else None
+    os.chdir(BACKEND_DIR)
+    server = start_stub_llm() if args.stub else None
+    try:
+        # Imported after the stub is started so the LM points at it
+        import dspy
+        from dspy.teleprompt import BootstrapFewShot
+        from config import DSPY_PROGRAM_DIR, DSPY_STUB_PROGRAM_DIR, LLM_BACKEND
+        from services.llm_service import LLMService, lm
+        from services.programs import save_program
+
+        records = load_dataset(dataset) if dataset else synthetic_dataset(args.synthetic, args.seed)
+        metrics = {"evaluate": evaluate_metric(args.score_tolerance), "generate": generate_metric}
+        # Stub demos are only good for load tests, so keep them away from the served programs
+        output_dir = output_dir or (DSPY_STUB_PROGRAM_DIR if args.stub else DSPY_PROGRAM_DIR)
+
+        print(f"🛠️ Compiling {', '.join(programs)} with {LLM_BACKEND} ({lm.model})")
+        for name in programs:
+            examples = [dspy.Example(**record).with_inputs(*PROGRAM_INPUTS[name]) for record in records.get(name, [])]
+            if not examples:
+                print(f"  {name:<9} skipped, no examples")
+                continue
+
+            # Start from the uncompiled program, never from a previously saved one
+            student = LLMService(load_programs=False).programs()[name]
+            optimizer = BootstrapFewShot(metric=metrics[name], max_bootstrapped_demos=args.demos, max_labeled_demos=0)
+            compiled = optimizer.compile(student, trainset=examples)
+            demos = sum(len(predictor.demos) for _, predictor in compiled.named_predictors())
+            path = save_program(compiled, name, LLM_BACKEND, lm.model, output_dir, metadata={
+                "optimizer": "BootstrapFewShot",
+                "examples": len(examples),
+                "demos": demos
+            })
+            print(f"  {name:<9} {len(examples):>5} examples  {demos:>3} demos  saved to {path}")
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
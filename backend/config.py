@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -12,13 +13,96 @@ CHROMA_COLLECTION_NAME = "study_chunks"
 
 # Model Configuration
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
-LLM_MODEL = "openai/llama3-70b-8192"
-GROQ_API_BASE = "https://api.groq.com/openai/v1"
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/llama3-70b-8192")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+
+# LLM Backend Configuration ("groq", "openai" for any OpenAI-compatible URL, or "stub")
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_API_BASE = os.getenv("LLM_API_BASE", "http://localhost:8080/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "")
+
+# Stub LLM Server Configuration
+STUB_LLM_HOST = os.getenv("STUB_LLM_HOST", "127.0.0.1")
+STUB_LLM_PORT = int(os.getenv("STUB_LLM_PORT", 8001))
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", 200))
+STUB_LLM_JITTER_MS = float(os.getenv("STUB_LLM_JITTER_MS", 50))
+STUB_LLM_ERROR_RATE = float(os.getenv("STUB_LLM_ERROR_RATE", 0.0))
+STUB_LLM_ERROR_STATUS = int(os.getenv("STUB_LLM_ERROR_STATUS", 500))
+STUB_LLM_SEED = int(os.getenv("STUB_LLM_SEED", 0))
+STUB_LLM_CHUNK_MS = float(os.getenv("STUB_LLM_CHUNK_MS", 20))  # Delay between streamed lines
+
+# Compiled DSPy Programs (see compile_programs.py); relative paths are resolved
+# against this directory so the server and the compiler agree whatever the CWD
+BACKEND_DIR = Path(__file__).resolve().parent
+DSPY_PROGRAM_DIR = str(BACKEND_DIR / os.getenv("DSPY_PROGRAM_DIR", "compiled_programs"))
+DSPY_STUB_PROGRAM_DIR = str(BACKEND_DIR / os.getenv("DSPY_STUB_PROGRAM_DIR", "compiled_programs_stub"))  # compile_programs.py --stub output
+DSPY_LOAD_PROGRAMS = os.getenv("DSPY_LOAD_PROGRAMS", "true").lower() == "true"
 
 # Text Processing Configuration
 CHUNK_SIZE = 400
 RETRIEVAL_K = 3
 
+# Ingestion Configuration
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", 64 * 1024))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))
+INGEST_QUEUE_BLOCKS = int(os.getenv("INGEST_QUEUE_BLOCKS", 8))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", 1))
+INGEST_CONCEPT_WORKERS = int(os.getenv("INGEST_CONCEPT_WORKERS", 2))
+INGEST_PIPELINE_DEPTH = int(os.getenv("INGEST_PIPELINE_DEPTH", 4))  # Batches in flight before ingest waits
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(2, os.cpu_count() or 1)))  # Document extraction processes
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 16))
+
+# Grading Configuration
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 4))
+GRADE_CACHE_SIZE = int(os.getenv("GRADE_CACHE_SIZE", 10000))
+CLUSTER_SIMILARITY_THRESHOLD = float(os.getenv("CLUSTER_SIMILARITY_THRESHOLD", 0.95))
+CLUSTER_MAX_MARKS = int(os.getenv("CLUSTER_MAX_MARKS", 2))
+
+# LLM Admission Configuration
+LLM_ADMISSION_SLOTS = int(os.getenv("LLM_ADMISSION_SLOTS", 4))  # LLM calls running at once across all requests
+LLM_INTERACTIVE_RESERVED_SLOTS = int(os.getenv("LLM_INTERACTIVE_RESERVED_SLOTS", 1))  # Slots batch work cannot take
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", 64))  # Queued calls per priority class before 503
+BATCH_PATH_PREFIXES = ("/api/v1/evaluate/csv", "/api/v1/evaluate/cohort")
+
+# Analytics Configuration
+RESULTS_STORE_SIZE = int(os.getenv("RESULTS_STORE_SIZE", 100))  # Graded result sets kept for analytics
+ANALYTICS_HISTOGRAM_BINS = 10
+
+# Tiered Grading Configuration
+TIERED_GRADING = os.getenv("TIERED_GRADING", "false").lower() == "true"
+PRESCORE_ACCEPT_SIMILARITY = float(os.getenv("PRESCORE_ACCEPT_SIMILARITY", 0.92))
+PRESCORE_REJECT_SIMILARITY = float(os.getenv("PRESCORE_REJECT_SIMILARITY", 0.15))
+PRESCORE_ACCEPT_COVERAGE = float(os.getenv("PRESCORE_ACCEPT_COVERAGE", 0.8))
+PRESCORE_REJECT_COVERAGE = float(os.getenv("PRESCORE_REJECT_COVERAGE", 0.1))
+
+# Question Paper Rules
+PAPER_TOTAL_MARKS = int(os.getenv("PAPER_TOTAL_MARKS", 50))
+PAPER_ALLOWED_MARKS = (2, 5, 10)
+PAPER_REPAIR = os.getenv("PAPER_REPAIR", "true").lower() == "true"  # Regenerate only the questions needed to fix the total
+
+# Paper Pool Configuration
+PAPER_POOL_SIZE = int(os.getenv("PAPER_POOL_SIZE", 3))  # Ready paper variants kept per material
+PAPER_POOL_WORKERS = int(os.getenv("PAPER_POOL_WORKERS", 1))
+PAPER_POOL_PREFILL = os.getenv("PAPER_POOL_PREFILL", "false").lower() == "true"  # Pre-generate for every material
+
+# LLM Usage Configuration (0 disables a budget)
+LLM_USAGE_LOG = os.getenv("LLM_USAGE_LOG", "")  # JSONL file of every LLM call; empty disables writing
+LLM_REQUEST_TOKEN_BUDGET = int(os.getenv("LLM_REQUEST_TOKEN_BUDGET", 0))
+LLM_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_DAILY_TOKEN_BUDGET", 0))
+LLM_BUDGET_MODE = os.getenv("LLM_BUDGET_MODE", "degrade")  # "degrade" to local estimates or "reject" with 429
+
+# Compression Configuration
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", 1024))  # Smaller responses are sent uncompressed, gzip or brotli
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_LEVEL = int(os.getenv("BROTLI_LEVEL", 4))  # 0-11; low levels keep per-response CPU cost near gzip's
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", 256 * 1024 * 1024))  # Limit for inflated gzip request bodies
+
+# Tracing Configuration
+DEBUG_TIMING_HEADER = os.getenv("DEBUG_TIMING_HEADER", "X-Debug-Timing")
+TRACE_FILE = os.getenv("TRACE_FILE", "")  # JSONL file for trace spans; empty disables writing
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", 0))  # Also trace every request and keep those slower than this
+TRACED_PATH_PREFIXES = ("/api/v1/generate", "/api/v1/evaluate")
+
 # CORS Configuration
 ALLOWED_ORIGINS = [
     "http://localhost:8501",
@@ -0,0 +1,186 @@
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Tuple
+
+from config import EXTRACT_WORKERS, PDF_PAGES_PER_TASK
+
+# Optional document parsers
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+try:
+    import docx
+except ImportError:
+    docx = None
+
+# A section is the metadata kept on its chunks (page or section number) plus its text
+Section = Tuple[Dict[str, Any], str]
+
+DOCUMENT_FORMATS = {
+    ".txt": "txt",
+    ".md": "markdown",
+    ".markdown": "markdown",
+    ".html": "html",
+    ".htm": "html",
+    ".pdf": "pdf",
+    ".docx": "docx",
+}
+
+_executor = None
+
+def document_format(filename: str) -> str:
+    """Return the document format for a filename, raising ValueError if unsupported"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    fmt = DOCUMENT_FORMATS.get(extension)
+    if not fmt:
+        supported = ", ".join(sorted(DOCUMENT_FORMATS))
+        raise ValueError(f"Unsupported file type '{extension}'. Supported types: {supported}")
+    if fmt == "pdf" and PdfReader is None:
+        raise ValueError("PDF support requires pypdf. Please run: pip install pypdf")
+    if fmt == "docx" and docx is None:
+        raise ValueError("DOCX support requires python-docx. Please run: pip install python-docx")
+    return fmt
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the shared extraction process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        # Spawn rather than fork: the parent holds model and database threads
+        _executor = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def _pdf_page_count(path: str) -> int:
+    """Count the pages of a PDF file"""
+    return len(PdfReader(path).pages)
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[Section]:
+    """Extract the text of PDF pages [start, stop) with 1-based page numbers"""
+    reader = PdfReader(path)
+    return [({"page": n + 1}, reader.pages[n].extract_text() or "") for n in range(start, stop)]
+
+def _extract_docx(path: str) -> List[Section]:
+    """Extract DOCX text split into sections at headings"""
+    sections, current = [], []
+    for paragraph in docx.Document(path).paragraphs:
+        if paragraph.style.name.startswith("Heading") and current:
+            sections.append("\n\n".join(current))
+            current = []
+        if paragraph.text.strip():
+            current.append(paragraph.text)
+    if current:
+        sections.append("\n\n".join(current))
+    return [({"section": i}, text) for i, text in enumerate(sections, 1)]
+
+def _strip_markdown(text: str) -> str:
+    """Remove Markdown markup, keeping the readable text"""
+    text = re.sub(r"^```.*$", "", text, flags=re.MULTILINE)
+    text = re.sub(r"!\[[^\]]*\]\([^)]*\)", "", text)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"<!--.*?-->", "", text, flags=re.DOTALL)
+    text = re.sub(r"</?[a-zA-Z][^>]*>", "", text)
+    text = re.sub(r"^[ \t]{0,3}(#{1,6}|>|[-*+]|\d+\.)[ \t]+", "", text, flags=re.MULTILINE)
+    text = re.sub(r"`([^`\n]+)`", r"\1", text)
+    # Emphasis only when the markers hug the text and are not inside a word, so
+    # identifiers like my_var_name and products like 2*3*4 survive
+    text = re.sub(r"(?<![\w*])(\*\*|\*)(?=\S)(.+?)(?<=\S)\1(?![\w*])", r"\2", text)
+    text = re.sub(r"(?<![\w_])(__|_)(?=\S)(.+?)(?<=\S)\1(?![\w_])", r"\2", text)
+    return text
+
+def _extract_markdown(path: str) -> List[Section]:
+    """Extract Markdown text split into sections at headings"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    parts = re.split(r"(?m)^(?=#{1,6}\s)", content)
+    sections = [_strip_markdown(part) for part in parts if part.strip()]
+    return [({"section": i}, text) for i, text in enumerate(sections, 1)]
+
+class _HTMLTextParser(HTMLParser):
+    """Collect readable HTML text, starting a new section at each h1-h3"""
+
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "section", "article", "h4", "h5", "h6", "pre", "blockquote"}
+    SECTION_TAGS = {"h1", "h2", "h3"}
+    SKIP_TAGS = {"script", "style", "noscript", "head"}
+
+    def __init__(self):
+        super().__init__()
+        self.sections = [[]]
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.SECTION_TAGS and any(s.strip() for s in self.sections[-1]):
+            self.sections.append([])
+        elif tag in self.BLOCK_TAGS:
+            self.sections[-1].append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in self.SECTION_TAGS or tag in self.BLOCK_TAGS:
+            self.sections[-1].append("\n\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.sections[-1].append(data)
+
+def _extract_html(path: str) -> List[Section]:
+    """Extract HTML text split into sections at h1-h3 headings"""
+    parser = _HTMLTextParser()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        parser.feed(f.read())
+    parser.close()
+    sections = ["".join(parts) for parts in parser.sections]
+    sections = [text for text in sections if text.strip()]
+    return [({"section": i}, text) for i, text in enumerate(sections, 1)]
+
+def _extract_txt(path: str) -> List[Section]:
+    """Read a plain text file as a single section"""
+    with open(path, encoding="utf-8") as f:
+        return [({}, f.read())]
+
+_EXTRACTORS = {
+    "txt": _extract_txt,
+    "markdown": _extract_markdown,
+    "html": _extract_html,
+    "docx": _extract_docx,
+}
+
+def iter_document_sections(path: str, fmt: str) -> Iterator[Section]:
+    """
+    Extract a document's sections in the process pool, yielding them in order.
+
+    PDFs are split into page ranges parsed in parallel; sections are yielded as
+    soon as their range is done, so chunking and embedding of early pages can
+    start while later pages are still being extracted. Other formats are parsed
+    whole by a single worker.
+    """
+    executor = get_executor()
+
+    if fmt != "pdf":
+        yield from executor.submit(_EXTRACTORS[fmt], path).result()
+        return
+
+    page_count = executor.submit(_pdf_page_count, path).result()
+    futures = [
+        executor.submit(_extract_pdf_pages, path, start, min(start + PDF_PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+def extract_text(path: str, fmt: str) -> str:
+    """Extract the full text of a document"""
+    return "\n\n".join(text for _, text in iter_document_sections(path, fmt))
@@ -1,11 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routes import generate, evaluate
+from fastapi.responses import PlainTextResponse, JSONResponse, ORJSONResponse
+from routes import generate, evaluate, materials, usage, analytics
+from middleware import (
+    MetricsMiddleware, TracingMiddleware, UsageMiddleware, AdmissionMiddleware, CompressionMiddleware
+)
+import metrics
+
+# Serialize JSON responses with orjson when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = FastAPI(
     title="Question Paper Generator & Evaluator API",
     description="AI-powered question paper generation and answer evaluation system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse if orjson is not None else JSONResponse
 )
 
 # Configure CORS
@@ -15,11 +27,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Trace-Id"],
 )
 
+# Record per-route latency and in-flight requests, trace requests that opt in,
+# account LLM tokens per endpoint and admit LLM calls by priority
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(UsageMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Inflate gzip request bodies and compress large responses with brotli or gzip
+app.add_middleware(CompressionMiddleware)
+
 # Include routers
 app.include_router(generate.router, prefix="/api/v1", tags=["generation"])
 app.include_router(evaluate.router, prefix="/api/v1", tags=["evaluation"])
+app.include_router(materials.router, prefix="/api/v1", tags=["materials"])
+app.include_router(usage.router, prefix="/api/v1", tags=["usage"])
+app.include_router(analytics.router, prefix="/api/v1", tags=["analytics"])
 
 @app.get("/")
 async def root():
@@ -29,6 +55,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: stage timings, LLM calls and tokens, cache hits and in-flight requests"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
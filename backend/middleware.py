@@ -0,0 +1,289 @@
+import time
+import zlib
+import anyio
+from typing import Optional, Set
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import (
+    DEBUG_TIMING_HEADER, TRACE_FILE, TRACE_SLOW_MS, TRACED_PATH_PREFIXES,
+    GZIP_MIN_SIZE, GZIP_LEVEL, BROTLI_LEVEL, MAX_REQUEST_BYTES, BATCH_PATH_PREFIXES
+)
+from metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT
+from tracing import start_trace, end_trace, write_trace
+from services.usage import usage_ledger
+from services.admission import admission
+
+# Optional brotli response compression
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def route_template(app: ASGIApp, scope: Scope) -> str:
+    """Return the path template of the route matching a request, e.g. /api/v1/materials/{material_id}"""
+    for route in getattr(app, "routes", []):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            route = child_scope.get("route", route)
+            return getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+    # Unmatched paths share one label so scanners cannot blow up cardinality
+    return "unmatched"
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests per route"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = route_template(scope["app"], scope)
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        with HTTP_REQUESTS_IN_FLIGHT.track(route=route):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Routing sets the matched route on the scope; prefer it when available
+                matched = scope.get("route")
+                HTTP_REQUEST_SECONDS.observe(
+                    time.perf_counter() - start,
+                    method=scope["method"],
+                    route=getattr(matched, "path_format", None) or route,
+                    status=status
+                )
+
+class TracingMiddleware:
+    """
+    ASGI middleware tracing generate and evaluate requests.
+
+    A request sending the debug header (X-Debug-Timing: 1) gets its per-stage
+    timing breakdown back in a Server-Timing header along with an X-Trace-Id.
+    Each stage reports self time, excluding the stages nested inside it.
+    Traced requests are appended to TRACE_FILE as JSONL; with TRACE_SLOW_MS
+    set, every request is traced and those slower than it are kept.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(TRACED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        debug = Headers(scope=scope).get(DEBUG_TIMING_HEADER, "").lower() in ("1", "true", "yes")
+        if not debug and not TRACE_SLOW_MS:
+            await self.app(scope, receive, send)
+            return
+
+        trace = start_trace()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    timings = [f"{name};dur={ms}" for name, ms in trace.breakdown().items()]
+                    timings.append(f"total;dur={round(trace.elapsed_ms(), 3)}")
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", ", ".join(timings))
+                    headers.append("X-Trace-Id", trace.trace_id)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_trace()
+            if TRACE_FILE and (debug or trace.elapsed_ms() >= TRACE_SLOW_MS):
+                record = trace.to_dict(method=scope["method"], path=scope["path"], status=status)
+                await anyio.to_thread.run_sync(write_trace, TRACE_FILE, record)
+
+class UsageMiddleware:
+    """ASGI middleware attributing the LLM tokens of generate and evaluate requests to their endpoint"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(TRACED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        # These endpoints have no path parameters, so the path is a bounded label
+        usage_ledger.start_request(scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            usage_ledger.end_request()
+
+class AdmissionMiddleware:
+    """ASGI middleware classing each request's LLM calls as batch (CSV and cohort grading) or interactive"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(TRACED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        admission.start_request("batch" if scope["path"].startswith(BATCH_PATH_PREFIXES) else "interactive")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.end_request()
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Return the content codings an Accept-Encoding header allows, skipping those with q=0"""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding.strip():
+            accepted.add(coding.strip())
+    return accepted
+
+class Compressor:
+    """Streaming gzip or brotli compressor with one interface"""
+
+    def __init__(self, encoding: str, gzip_level: int = GZIP_LEVEL, brotli_level: int = BROTLI_LEVEL):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_level)
+        else:
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self.encoding == "br" else self._gzip.compress(data)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self.encoding == "br" else self._gzip.flush()
+
+class CompressionMiddleware:
+    """
+    ASGI middleware for compressed request and response bodies.
+
+    Request bodies sent with Content-Encoding: gzip are inflated as they are
+    read, up to MAX_REQUEST_BYTES. Responses of at least GZIP_MIN_SIZE bytes
+    are compressed with brotli when the client accepts it and brotli is
+    installed, otherwise with gzip; event streams are passed through so their
+    events are not held back by the compressor.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = GZIP_MIN_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_level: int = BROTLI_LEVEL, max_request_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+        self.max_request_bytes = max_request_bytes
+    def inflate(self, receive: Receive) -> Receive:
+        """Wrap receive so gzip request body chunks are decompressed as the app reads them"""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        inflated = 0
+
+        async def receive_inflated() -> Message:
+            nonlocal inflated
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            try:
+                body = decompressor.decompress(message.get("body", b""), self.max_request_bytes - inflated + 1)
+                if not message.get("more_body", False) and not decompressor.unconsumed_tail:
+                    body += decompressor.flush()
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="Invalid gzip request body")
+            inflated += len(body)
+            if inflated > self.max_request_bytes or decompressor.unconsumed_tail:
+                raise HTTPException(status_code=413, detail=f"Request body exceeds {self.max_request_bytes} bytes")
+            return {**message, "body": body}
+
+        return receive_inflated
+
+    def response_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Pick the response coding for an Accept-Encoding header, preferring brotli"""
+        accepted = accepted_encodings(accept_encoding)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def compress(self, send: Send, encoding: str) -> Send:
+        """Wrap send so large enough response bodies are compressed with the given coding"""
+        start: Message = {}
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=list(start["headers"]))
+                if ("content-encoding" in headers
+                        or headers.get("content-type", "").startswith("text/event-stream")
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, self.gzip_level, self.brotli_level)
+                del headers["content-length"]
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                await send({**start, "headers": headers.raw})
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        return send_compressed
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get("content-encoding", "").lower() == "gzip":
+            # The app sees an ordinary, uncompressed body of unknown length
+            scope = {
+                **scope,
+                "headers": [(k, v) for k, v in scope["headers"] if k not in (b"content-encoding", b"content-length")]
+            }
+            receive = self.inflate(receive)
+        encoding = self.response_encoding(headers.get("accept-encoding", ""))
+        if encoding:
+            send = self.compress(send, encoding)
+
+        await self.app(scope, receive, send)
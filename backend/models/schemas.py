@@ -8,19 +8,33 @@ class StudyMaterialUpload(BaseModel):
     content: str
 
 class QuestionPaperRequest(BaseModel):
-    study_text: str
+    study_text: Optional[str] = None
+    material_id: Optional[str] = None  # Registered material (alternative to study_text)
+    fresh: bool = False  # Always call the LLM instead of serving a pre-generated paper
 
 class SingleEvaluationRequest(BaseModel):
-    study_text: str
+    study_text: Optional[str] = None
+    material_id: Optional[str] = None  # Registered material (alternative to study_text)
     question: str
     reference_answer: str
     student_answer: str
     max_marks: int
+    include_analysis: bool = True  # Set false to omit detailed_analysis, which repeats the feedback
 
 class CSVEvaluationRequest(BaseModel):
-    study_text: str
+    study_text: Optional[str] = None
+    material_id: Optional[str] = None  # Registered material (alternative to study_text)
     questions_csv: str  # Base64 encoded CSV content
     student_answers_csv: str  # Base64 encoded CSV content
+    cluster_answers: bool = False  # Grade one representative per cluster of near-identical answers
+
+class MaterialCreateRequest(BaseModel):
+    study_text: str
+    prefill_papers: bool = False  # Pre-generate question paper variants in the background
+
+class MaterialUpdateRequest(BaseModel):
+    study_text: str
+    prefill_papers: bool = False  # Pre-generate question paper variants in the background
 
 # Response Models
 class Question(BaseModel):
@@ -32,13 +46,18 @@ class GeneratedPaper(BaseModel):
     questions: List[Question]
     total_marks: int
     raw_paper: str
+    material_id: Optional[str] = None
+    pooled: bool = False  # Served from the pre-generated paper pool
+    issues: List[str] = []  # Broken marks rules left after repair, empty for a valid paper
+    regenerated_questions: int = 0  # Questions regenerated to fix the total marks
 
 class EvaluationFeedback(BaseModel):
     score: float
     max_marks: int
     rubric: str
     feedback: str
-    detailed_analysis: str
+    detailed_analysis: Optional[str] = None  # Left out of responses when include_analysis is false
+    graded_by: str = "llm"  # Grading tier: "local" pre-scorer, "llm" or "estimate" when over budget
 
 class SingleEvaluationResponse(BaseModel):
     question: str
@@ -49,12 +68,124 @@ class CSVEvaluationResult(BaseModel):
     score: float
     max_marks: int
     feedback: str
+    graded_by: str = "llm"  # Grading tier: "cache", "local" pre-scorer, "llm" or "estimate" when over budget
+    propagated: bool = False  # Score copied from an identical or near-identical answer
+    similarity: Optional[float] = None  # Cosine similarity to that answer when propagated
+
+class RejectedRow(BaseModel):
+    source: str  # "questions" or "student_answers"
+    row: int  # 1-based data row, excluding the header
+    reason: str
 
 class CSVEvaluationResponse(BaseModel):
     results: List[CSVEvaluationResult]
     total_score: float
     total_max_marks: int
     percentage: float
+    rejected_rows: List[RejectedRow] = []
+    result_id: Optional[str] = None  # Stored result set for /analytics/{result_id}
+
+class CohortStudentResult(BaseModel):
+    student_id: str
+    results: List[CSVEvaluationResult]
+    total_score: float
+    total_max_marks: int
+    percentage: float
+
+class CohortEvaluationResponse(BaseModel):
+    students: List[CohortStudentResult]
+    total_answers: int
+    unique_evaluations: int
+    rejected_rows: List[RejectedRow] = []
+    result_id: Optional[str] = None  # Stored result set for /analytics/{result_id}
+
+class GradingTierStats(BaseModel):
+    tier: str
+    answers: int
+    mean_latency_ms: float
+
+class ResultSetInfo(BaseModel):
+    result_id: str
+    answers: int
+
+class ResultSetDeleteResponse(BaseModel):
+    result_id: str
+    deleted: bool
+
+class AnalyticsSummary(BaseModel):
+    answers: int
+    total_score: float
+    total_max_marks: int
+    percentage: float
+    mean_score: float
+    median_score: float
+    std_score: float
+    mean_percentage: float
+
+class QuestionAnalytics(BaseModel):
+    question_number: int
+    answers: int
+    mean_score: float
+    max_marks: int
+    mean_percentage: float
+    difficulty: str  # "Very Hard", "Hard", "Moderate" or "Easy" by mean percentage
+
+class StudentAnalytics(BaseModel):
+    student_id: str
+    total_score: float
+    total_max_marks: int
+    percentage: float
+
+class DifficultyBand(BaseModel):
+    band: str
+    questions: int
+    mean_percentage: float
+
+class HistogramBin(BaseModel):
+    start: float  # Percentage score range
+    end: float
+    count: int
+
+class ResultAnalytics(BaseModel):
+    result_id: str
+    summary: AnalyticsSummary
+    per_question: List[QuestionAnalytics]
+    per_student: List[StudentAnalytics]  # Empty unless results have student IDs
+    difficulty: List[DifficultyBand]
+    histogram: List[HistogramBin]
+
+class UsageTotals(BaseModel):
+    key: str  # Endpoint path or material ID
+    calls: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    mean_latency_ms: float
+
+class UsageReport(BaseModel):
+    day: str  # UTC date the daily budget applies to
+    daily_tokens: int
+    daily_budget: int  # 0 means unlimited
+    request_budget: int  # 0 means unlimited
+    by_endpoint: List[UsageTotals]
+    by_material: List[UsageTotals]
+
+class MaterialUpdateResponse(BaseModel):
+    material_id: str
+    chunks: int
+    added: int
+    removed: int
+    unchanged: int
+
+class MaterialInfo(BaseModel):
+    material_id: str
+    chunks: int
+    concepts: int
+    pooled_papers: int = 0  # Pre-generated question papers ready to serve
+
+class MaterialDeleteResponse(BaseModel):
+    material_id: str
+    deleted: bool
 
 # Error Models
 class ErrorResponse(BaseModel):
@@ -0,0 +1,76 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File
+from models.schemas import ResultSetInfo, ResultAnalytics, ResultSetDeleteResponse
+from services.results_store import results_store
+from tables import read_table
+from fastapi.concurrency import run_in_threadpool
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+router = APIRouter()
+
+RESULT_CSV_COLUMNS = ["score", "max_marks"]
+OPTIONAL_RESULT_CSV_COLUMNS = ["question_number", "student_id"]
+
+@router.post("/analytics/results", response_model=ResultSetInfo)
+async def upload_results(
+    results_csv: UploadFile = File(..., description="Evaluation results table (.csv, .parquet or Arrow IPC) with score, max_marks and optionally question_number and student_id")
+):
+    """
+    Store an evaluation results CSV for analytics.
+
+    Batch and cohort evaluations store their results automatically and return
+    their result_id, so this is only needed for results saved earlier. Without
+    a question_number column each row is treated as its own question.
+    """
+    try:
+        try:
+            # Only the columns analytics use are parsed, whatever else the table carries
+            results = await run_in_threadpool(
+                read_table, results_csv.file, results_csv.filename, RESULT_CSV_COLUMNS + OPTIONAL_RESULT_CSV_COLUMNS
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid results table: {str(e)}")
+
+        missing = [c for c in RESULT_CSV_COLUMNS if c not in results.columns]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Results table is missing columns: {', '.join(missing)}")
+
+        try:
+            result_id = results_store.add(results)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid results table: {str(e)}")
+        return ResultSetInfo(result_id=result_id, answers=len(results))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/analytics/{result_id}", response_model=ResultAnalytics)
+async def get_result_analytics(result_id: str):
+    """
+    Get aggregates of a stored result set: summary statistics, per-question and
+    per-student totals, difficulty bands and a percentage histogram.
+    """
+    try:
+        analytics = await run_in_threadpool(results_store.analytics, result_id)
+        if analytics is None:
+            raise HTTPException(status_code=404, detail=f"Result set '{result_id}' not found")
+        return ResultAnalytics(result_id=result_id, **analytics)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.delete("/analytics/{result_id}", response_model=ResultSetDeleteResponse)
+async def delete_result_set(result_id: str):
+    """
+    Delete a stored result set.
+    """
+    if not results_store.delete(result_id):
+        raise HTTPException(status_code=404, detail=f"Result set '{result_id}' not found")
+    return ResultSetDeleteResponse(result_id=result_id, deleted=True)
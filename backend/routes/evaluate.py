@@ -2,66 +2,126 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from models.schemas import (
     SingleEvaluationRequest, CSVEvaluationRequest, 
     SingleEvaluationResponse, CSVEvaluationResponse, CSVEvaluationResult,
-    EvaluationFeedback
+    EvaluationFeedback, RejectedRow, CohortStudentResult, CohortEvaluationResponse, GradingTierStats
 )
-from services.llm_service import llm_service
+from services.material_store import material_store
+from services.usage import BudgetExceeded
+from services.admission import Overloaded
+from services.grading import grade_pairs, merge_grades, grade_material_answer, tier_stats
+from services.results_store import results_store
+from routes.materials import resolve_material
+from config import CLUSTER_SIMILARITY_THRESHOLD
 from utils import (
-    store_chunks, retrieve_chunks, build_graph, graph_context,
-    decode_csv_content, calculate_percentage
+    decode_csv_content, calculate_percentage,
+    prepare_csv_evaluation, QUESTION_COLUMNS, ANSWER_COLUMNS, COHORT_ANSWER_COLUMNS
 )
+from tables import read_table
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
 import sys
 import os
 import pandas as pd
-import io
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 router = APIRouter()
 
-@router.post("/evaluate/one", response_model=SingleEvaluationResponse)
+async def read_upload_table(upload: UploadFile, columns: List[str]) -> pd.DataFrame:
+    """Parse the given columns of an uploaded CSV, Parquet or Arrow table off the event loop"""
+    try:
+        return await run_in_threadpool(read_table, upload.file, upload.filename, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def to_csv_result(row) -> CSVEvaluationResult:
+    """Build a result from a graded row"""
+    return CSVEvaluationResult(
+        question_number=row.question_number,
+        score=row.score,
+        max_marks=row.marks,
+        feedback=row.feedback,
+        graded_by=row.graded_by,
+        propagated=row.propagated,
+        similarity=row.similarity if row.propagated else None
+    )
+
+def grade_csv_rows(material_id: str, rows: pd.DataFrame, pairs: pd.DataFrame,
+                   rejected: List[Dict[str, Any]], cluster_threshold: Optional[float] = None) -> CSVEvaluationResponse:
+    """Grade each unique (question, answer) pair once and map the scores onto every row"""
+    rows = merge_grades(rows, grade_pairs(material_id, pairs, cluster_threshold))
+    results = [to_csv_result(row) for row in rows.itertuples(index=False)]
+
+    total_score = float(rows["score"].sum())
+    total_max_marks = int(rows["marks"].sum())
+
+    return CSVEvaluationResponse(
+        results=results,
+        total_score=total_score,
+        total_max_marks=total_max_marks,
+        percentage=calculate_percentage(total_score, total_max_marks),
+        rejected_rows=[RejectedRow(**r) for r in rejected],
+        result_id=results_store.add(rows.rename(columns={"marks": "max_marks"}))
+    )
+
+def grade_cohort_rows(material_id: str, rows: pd.DataFrame, pairs: pd.DataFrame, paper_marks: int,
+                      rejected: List[Dict[str, Any]], cluster_threshold: Optional[float] = None) -> CohortEvaluationResponse:
+    """Grade unique answers across the whole cohort and total them per student"""
+    graded = grade_pairs(material_id, pairs, cluster_threshold)
+    rows = merge_grades(rows, graded)
+
+    students = []
+    for student_id, student_rows in rows.groupby("student_id", sort=False):
+        total_score = float(student_rows["score"].sum())
+        students.append(CohortStudentResult(
+            student_id=student_id,
+            results=[to_csv_result(row) for row in student_rows.itertuples(index=False)],
+            total_score=total_score,
+            total_max_marks=paper_marks,
+            percentage=calculate_percentage(total_score, paper_marks)
+        ))
+
+    return CohortEvaluationResponse(
+        students=students,
+        total_answers=len(rows),
+        unique_evaluations=int((~graded["propagated"]).sum()),
+        rejected_rows=[RejectedRow(**r) for r in rejected],
+        result_id=results_store.add(rows.rename(columns={"marks": "max_marks"}))
+    )
+
+@router.get("/evaluate/tiers", response_model=List[GradingTierStats])
+async def get_grading_tiers():
+    """
+    Get how many answers each grading tier has handled and its mean latency.
+
+    Answers scored by the local pre-scorer or served from the grade cache never
+    reach the LLM; only the "llm" tier costs API calls.
+    """
+    return [GradingTierStats(**stats) for stats in tier_stats.snapshot()]
+
+@router.post("/evaluate/one", response_model=SingleEvaluationResponse, response_model_exclude_none=True)
 async def evaluate_single_answer(
-    file: UploadFile = File(None, description="Study material file (.txt)"),
+    file: UploadFile = File(None, description="Study material file (.txt, .md, .html, .pdf, .docx)"),
     study_text: str = Form(None, description="Study material text"),
+    material_id: str = Form(None, description="Registered material ID (alternative to file or study_text)"),
     question: str = Form(..., description="Question text"),
     reference_answer: str = Form(..., description="Reference answer"),
     student_answer: str = Form(..., description="Student answer"),
-    max_marks: int = Form(..., description="Maximum marks for this question")
+    max_marks: int = Form(..., description="Maximum marks for this question"),
+    include_analysis: bool = Form(True, description="Include detailed_analysis, which repeats the feedback")
 ):
     """
     Evaluate a single student answer.
     """
+    temporary = False
     try:
-        # Get study text from file or form
-        if file:
-            if not file.filename.endswith('.txt'):
-                raise HTTPException(status_code=400, detail="Only .txt files are supported")
-            
-            content = await file.read()
-            study_text = content.decode('utf-8')
-        elif study_text:
-            study_text = study_text
-        else:
-            raise HTTPException(status_code=400, detail="Either file or study_text must be provided")
-        
-        if not study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+        # Use the registered material or index the inline study material
+        material_id, temporary = await resolve_material(material_id, file, study_text)
         
-        # Store chunks and build graph
-        chunks = store_chunks(study_text)
-        graph = build_graph(study_text)
-        
-        # Build context for evaluation
-        context = f"Maximum Marks: {max_marks}\nReference Answer: {reference_answer}\n"
-        context += "\n".join(retrieve_chunks(question)) + "\n\n"
-        context += graph_context(question, graph)
-        
-        # Evaluate using LLM
-        result = llm_service.evaluate_answer(
-            study_context=context,
-            question=question,
-            student_answer=student_answer,
-            reference_answer=reference_answer
+        # Retrieve context and score locally when confident, otherwise evaluate using LLM
+        result = await run_in_threadpool(
+            grade_material_answer, material_id, question,
+            student_answer, reference_answer, max_marks
         )
         
         if not result["success"]:
@@ -73,7 +133,8 @@ async def evaluate_single_answer(
             max_marks=max_marks,
             rubric="Academic evaluation rubric",
             feedback=result["evaluation"],
-            detailed_analysis=result["detailed_analysis"]
+            detailed_analysis=result["detailed_analysis"] if include_analysis else None,
+            graded_by=result["tier"]
         )
         
         return SingleEvaluationResponse(
@@ -81,35 +142,32 @@ async def evaluate_single_answer(
             evaluation=evaluation
         )
         
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if temporary:
+            material_store.delete(material_id)
 
-@router.post("/evaluate/one/text", response_model=SingleEvaluationResponse)
+@router.post("/evaluate/one/text", response_model=SingleEvaluationResponse, response_model_exclude_none=True)
 async def evaluate_single_answer_from_text(request: SingleEvaluationRequest):
     """
     Evaluate a single student answer from text input.
     """
+    temporary = False
     try:
-        if not request.study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
-        
-        # Store chunks and build graph
-        chunks = store_chunks(request.study_text)
-        graph = build_graph(request.study_text)
-        
-        # Build context for evaluation
-        context = f"Maximum Marks: {request.max_marks}\nReference Answer: {request.reference_answer}\n"
-        context += "\n".join(retrieve_chunks(request.question)) + "\n\n"
-        context += graph_context(request.question, graph)
+        # Use the registered material or index the inline study material
+        material_id, temporary = await resolve_material(request.material_id, study_text=request.study_text)
         
-        # Evaluate using LLM
-        result = llm_service.evaluate_answer(
-            study_context=context,
-            question=request.question,
-            student_answer=request.student_answer,
-            reference_answer=request.reference_answer
+        # Retrieve context and score locally when confident, otherwise evaluate using LLM
+        result = await run_in_threadpool(
+            grade_material_answer, material_id, request.question,
+            request.student_answer, request.reference_answer, request.max_marks
         )
         
         if not result["success"]:
@@ -121,7 +179,8 @@ async def evaluate_single_answer_from_text(request: SingleEvaluationRequest):
             max_marks=request.max_marks,
             rubric="Academic evaluation rubric",
             feedback=result["evaluation"],
-            detailed_analysis=result["detailed_analysis"]
+            detailed_analysis=result["detailed_analysis"] if request.include_analysis else None,
+            graded_by=result["tier"]
         )
         
         return SingleEvaluationResponse(
@@ -129,167 +188,149 @@ async def evaluate_single_answer_from_text(request: SingleEvaluationRequest):
             evaluation=evaluation
         )
         
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if temporary:
+            material_store.delete(material_id)
 
 @router.post("/evaluate/csv", response_model=CSVEvaluationResponse)
 async def evaluate_from_csv(
-    file: UploadFile = File(None, description="Study material file (.txt)"),
+    file: UploadFile = File(None, description="Study material file (.txt, .md, .html, .pdf, .docx)"),
     study_text: str = Form(None, description="Study material text"),
-    questions_csv: UploadFile = File(..., description="Questions CSV file"),
-    student_answers_csv: UploadFile = File(..., description="Student answers CSV file")
+    material_id: str = Form(None, description="Registered material ID (alternative to file or study_text)"),
+    questions_csv: UploadFile = File(..., description="Questions table (.csv, .parquet or Arrow IPC .arrow/.feather)"),
+    student_answers_csv: UploadFile = File(..., description="Student answers table (.csv, .parquet or Arrow IPC .arrow/.feather)"),
+    cluster_answers: bool = Form(False, description="Grade one representative per cluster of near-identical short answers")
 ):
     """
     Evaluate multiple student answers from CSV files.
+    
+    Parquet and Arrow IPC uploads are accepted too, picked by file extension.
     """
+    temporary = False
     try:
-        # Get study text from file or form
-        if file:
-            if not file.filename.endswith('.txt'):
-                raise HTTPException(status_code=400, detail="Only .txt files are supported")
-            
-            content = await file.read()
-            study_text = content.decode('utf-8')
-        elif study_text:
-            study_text = study_text
-        else:
-            raise HTTPException(status_code=400, detail="Either file or study_text must be provided")
+        # Use the registered material or index the inline study material
+        material_id, temporary = await resolve_material(material_id, file, study_text)
         
-        if not study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+        # Parse only the needed columns straight from the uploaded files
+        questions_df = await read_upload_table(questions_csv, QUESTION_COLUMNS)
+        student_answers_df = await read_upload_table(student_answers_csv, ANSWER_COLUMNS)
         
-        # Read CSV files
-        questions_content = await questions_csv.read()
-        student_answers_content = await student_answers_csv.read()
+        # Validate both CSVs and join answers to questions up front
+        try:
+            rows, pairs, rejected, _ = prepare_csv_evaluation(questions_df, student_answers_df)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        questions_df = pd.read_csv(io.StringIO(questions_content.decode('utf-8')))
-        student_answers_df = pd.read_csv(io.StringIO(student_answers_content.decode('utf-8')))
+        # Evaluate each unique answer once
+        cluster_threshold = CLUSTER_SIMILARITY_THRESHOLD if cluster_answers else None
+        return await run_in_threadpool(grade_csv_rows, material_id, rows, pairs, rejected, cluster_threshold)
         
-        # Store chunks and build graph
-        chunks = store_chunks(study_text)
-        graph = build_graph(study_text)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if temporary:
+            material_store.delete(material_id)
+
+@router.post("/evaluate/cohort", response_model=CohortEvaluationResponse)
+async def evaluate_cohort(
+    file: UploadFile = File(None, description="Study material file (.txt, .md, .html, .pdf, .docx)"),
+    study_text: str = Form(None, description="Study material text"),
+    material_id: str = Form(None, description="Registered material ID (alternative to file or study_text)"),
+    questions_csv: UploadFile = File(..., description="Questions table (.csv, .parquet or Arrow IPC .arrow/.feather)"),
+    answers_csv: UploadFile = File(..., description="Long-format answers table (student_id, question_number, answer)"),
+    cluster_answers: bool = Form(False, description="Grade one representative per cluster of near-identical short answers")
+):
+    """
+    Evaluate a whole class from one questions CSV and one long-format answers CSV.
+    
+    Retrieval and graph context are built once per question, identical answers
+    are graded once for all students, and LLM calls are scheduled across the
+    whole cohort. Each student's total is out of the marks of the full paper.
+    For large cohorts, Parquet or Arrow IPC uploads avoid CSV parsing altogether.
+    """
+    temporary = False
+    try:
+        # Use the registered material or index the inline study material
+        material_id, temporary = await resolve_material(material_id, file, study_text)
         
-        # Evaluate each answer
-        results = []
-        total_score = 0
-        total_max_marks = 0
+        # Parse only the needed columns straight from the uploaded files
+        questions_df = await read_upload_table(questions_csv, QUESTION_COLUMNS)
+        answers_df = await read_upload_table(answers_csv, COHORT_ANSWER_COLUMNS)
         
-        for _, student_row in student_answers_df.iterrows():
-            question_number = int(student_row["question_number"])
-            question_idx = question_number - 1
-            
-            if question_idx >= len(questions_df):
-                continue
-                
-            question_row = questions_df.iloc[question_idx]
-            
-            # Build context
-            context = f"Maximum Marks: {question_row['marks']}\nReference Answer: {question_row['answer_text']}\n"
-            context += "\n".join(retrieve_chunks(question_row['question_text'])) + "\n\n"
-            context += graph_context(question_row['question_text'], graph)
-            
-            # Evaluate
-            result = llm_service.evaluate_answer(
-                study_context=context,
-                question=question_row['question_text'],
-                student_answer=student_row["student_answer"],
-                reference_answer=question_row['answer_text']
-            )
-            
-            score = result["score"] if result["success"] else 0.0
-            
-            results.append(CSVEvaluationResult(
-                question_number=question_number,
-                score=score,
-                max_marks=question_row['marks'],
-                feedback=result["evaluation"] if result["success"] else "Evaluation failed"
-            ))
-            
-            total_score += score
-            total_max_marks += question_row['marks']
+        # Validate both CSVs and join answers to questions up front
+        try:
+            rows, pairs, rejected, questions = prepare_csv_evaluation(questions_df, answers_df, COHORT_ANSWER_COLUMNS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        percentage = calculate_percentage(total_score, total_max_marks)
+        # Rejected questions are reported, not part of the paper students are marked out of
+        paper_marks = int(questions["marks"].sum())
         
-        return CSVEvaluationResponse(
-            results=results,
-            total_score=total_score,
-            total_max_marks=total_max_marks,
-            percentage=percentage
-        )
+        # Evaluate each unique answer once across the cohort
+        cluster_threshold = CLUSTER_SIMILARITY_THRESHOLD if cluster_answers else None
+        return await run_in_threadpool(grade_cohort_rows, material_id, rows, pairs, paper_marks, rejected, cluster_threshold)
         
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if temporary:
+            material_store.delete(material_id)
 
 @router.post("/evaluate/csv/text", response_model=CSVEvaluationResponse)
 async def evaluate_from_csv_text(request: CSVEvaluationRequest):
     """
     Evaluate multiple student answers from base64 encoded CSV content.
     """
+    temporary = False
     try:
-        if not request.study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+        # Use the registered material or index the inline study material
+        material_id, temporary = await resolve_material(request.material_id, study_text=request.study_text)
         
         # Decode CSV content
-        questions_df = decode_csv_content(request.questions_csv)
-        student_answers_df = decode_csv_content(request.student_answers_csv)
-        
-        # Store chunks and build graph
-        chunks = store_chunks(request.study_text)
-        graph = build_graph(request.study_text)
-        
-        # Evaluate each answer
-        results = []
-        total_score = 0
-        total_max_marks = 0
+        try:
+            questions_df = await run_in_threadpool(decode_csv_content, request.questions_csv, QUESTION_COLUMNS)
+            student_answers_df = await run_in_threadpool(decode_csv_content, request.student_answers_csv, ANSWER_COLUMNS)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        for _, student_row in student_answers_df.iterrows():
-            question_number = int(student_row["question_number"])
-            question_idx = question_number - 1
-            
-            if question_idx >= len(questions_df):
-                continue
-                
-            question_row = questions_df.iloc[question_idx]
-            
-            # Build context
-            context = f"Maximum Marks: {question_row['marks']}\nReference Answer: {question_row['answer_text']}\n"
-            context += "\n".join(retrieve_chunks(question_row['question_text'])) + "\n\n"
-            context += graph_context(question_row['question_text'], graph)
-            
-            # Evaluate
-            result = llm_service.evaluate_answer(
-                study_context=context,
-                question=question_row['question_text'],
-                student_answer=student_row["student_answer"],
-                reference_answer=question_row['answer_text']
-            )
-            
-            score = result["score"] if result["success"] else 0.0
-            
-            results.append(CSVEvaluationResult(
-                question_number=question_number,
-                score=score,
-                max_marks=question_row['marks'],
-                feedback=result["evaluation"] if result["success"] else "Evaluation failed"
-            ))
-            
-            total_score += score
-            total_max_marks += question_row['marks']
+        # Validate both CSVs and join answers to questions up front
+        try:
+            rows, pairs, rejected, _ = prepare_csv_evaluation(questions_df, student_answers_df)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        percentage = calculate_percentage(total_score, total_max_marks)
-        
-        return CSVEvaluationResponse(
-            results=results,
-            total_score=total_score,
-            total_max_marks=total_max_marks,
-            percentage=percentage
-        )
+        # Evaluate each unique answer once
+        cluster_threshold = CLUSTER_SIMILARITY_THRESHOLD if request.cluster_answers else None
+        return await run_in_threadpool(grade_csv_rows, material_id, rows, pairs, rejected, cluster_threshold)
         
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if temporary:
+            material_store.delete(material_id) 
\ No newline at end of file
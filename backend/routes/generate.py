@@ -1,7 +1,22 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from models.schemas import QuestionPaperRequest, GeneratedPaper, Question
 from services.llm_service import llm_service
-from utils import store_chunks, extract_questions_from_paper
+from services.material_store import material_store
+from services.usage import usage_ledger, BudgetExceeded
+from services.admission import Overloaded
+from services.ingestion import read_upload_text
+from routes.materials import check_document_format, require_material, register_text
+from services.paper_pool import paper_pool
+from services.paper_repair import repair_paper
+from services.single_flight import single_flight, request_key
+from utils import parse_paper, paper_issues, QuestionStreamParser
+from metrics import stage
+from config import PAPER_POOL_PREFILL, PAPER_REPAIR
+from fastapi.concurrency import run_in_threadpool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import itertools
+import json
 import sys
 import os
 
@@ -10,63 +25,161 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 router = APIRouter()
 
+async def load_study_material(
+    material_id: Optional[str],
+    file: Optional[UploadFile] = None,
+    study_text: Optional[str] = None
+) -> Tuple[str, str]:
+    """Return (material_id, study_text), registering inline study material for later requests"""
+    if material_id:
+        require_material(material_id)
+        usage_ledger.set_material(material_id)
+        return material_id, await run_in_threadpool(material_store.text, material_id)
+
+    if file:
+        check_document_format(file)
+        study_text = await read_upload_text(file)
+    elif study_text is None:
+        raise HTTPException(status_code=400, detail="Either file, study_text or material_id must be provided")
+
+    # Register the material so evaluations can reference it by ID
+    material_id = await register_text(study_text)
+    usage_ledger.set_material(material_id)
+    return material_id, study_text
+
+def build_paper(study_text: str) -> Dict[str, Any]:
+    """Generate and parse a question paper with the LLM, raising HTTPException if generation fails"""
+    result = llm_service.generate_question_paper(study_text)
+
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=f"Generation failed: {result['error']}")
+
+    # Extract questions from generated paper, regenerating only what breaks the marks rules
+    paper = parse_paper(result["question_paper"])
+    if PAPER_REPAIR:
+        paper = repair_paper(paper, study_text)
+    return paper
+
+async def generate_paper(material_id: str, study_text: str, fresh: bool = False) -> GeneratedPaper:
+    """
+    Serve a pooled paper for the material if one is ready, otherwise generate one with the LLM.
+
+    Identical requests arriving while a paper is being generated for the same
+    material version share that one generation.
+    """
+    paper = None if fresh else paper_pool.take(material_id)
+    pooled = paper is not None
+
+    if paper is None:
+        key = request_key("generate", material_id, material_store.version(material_id))
+        paper = await run_in_threadpool(single_flight.do, key, build_paper, study_text)
+
+    if PAPER_POOL_PREFILL:
+        paper_pool.enable(material_id)
+
+    return GeneratedPaper(
+        questions=[Question(**q) for q in paper["questions"]],
+        total_marks=paper["total_marks"],
+        raw_paper=paper["raw_paper"],
+        material_id=material_id,
+        pooled=pooled,
+        issues=paper["issues"],
+        regenerated_questions=paper.get("regenerated_questions", 0)
+    )
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def paper_events(material_id: str, study_text: str, paper_text: Iterable[str], pooled: bool = False) -> Iterator[str]:
+    """
+    Parse paper text as it arrives into question events with a running total of marks.
+
+    If the finished paper breaks the marks rules, the questions dropped by
+    the repair are announced in a "removed" event and their replacements
+    follow as further question events.
+    """
+    parser = QuestionStreamParser()
+    live: Dict[int, Dict[str, Any]] = {}
+    raw: List[str] = []
+    counter = itertools.count(1)
+
+    def question_event(record: Dict[str, Any]) -> str:
+        number = next(counter)
+        live[number] = record
+        return sse_event("question", {
+            "number": number,
+            "question": Question(**record).model_dump(),
+            "total_marks": sum(q["marks"] for q in live.values())
+        })
+
+    try:
+        for text in paper_text:
+            raw.append(text)
+            for record in parser.feed(text):
+                yield question_event(record)
+        for record in parser.close():
+            yield question_event(record)
+
+        questions = list(live.values())
+        paper = {
+            "questions": questions,
+            "total_marks": sum(q["marks"] for q in questions),
+            "raw_paper": "".join(raw),
+            "issues": paper_issues(questions)
+        }
+        if PAPER_REPAIR and paper["issues"]:
+            repaired = repair_paper(paper, study_text)
+            if "dropped" in repaired:
+                numbers = list(live)
+                for i in repaired["dropped"]:
+                    del live[numbers[i]]
+                yield sse_event("removed", {
+                    "numbers": [numbers[i] for i in repaired["dropped"]],
+                    "total_marks": sum(q["marks"] for q in live.values())
+                })
+                for record in repaired["questions"][len(live):]:
+                    yield question_event(record)
+                paper = repaired
+    except Exception as e:
+        yield sse_event("error", {"detail": f"Generation failed: {str(e)}"})
+        return
+
+    yield sse_event("done", {
+        "total_marks": paper["total_marks"],
+        "question_count": len(paper["questions"]),
+        "raw_paper": paper["raw_paper"],
+        "material_id": material_id,
+        "pooled": pooled,
+        "issues": paper["issues"],
+        "regenerated_questions": paper.get("regenerated_questions", 0)
+    })
+
 @router.post("/generate/paper", response_model=GeneratedPaper)
 async def generate_question_paper(
-    file: UploadFile = File(None, description="Study material file (.txt)"),
-    study_text: str = Form(None, description="Study material text (alternative to file upload)")
+    file: UploadFile = File(None, description="Study material file (.txt, .md, .html, .pdf, .docx)"),
+    study_text: str = Form(None, description="Study material text (alternative to file upload)"),
+    material_id: str = Form(None, description="Registered material ID (alternative to file or study_text)"),
+    fresh: bool = Form(False, description="Always call the LLM instead of serving a pre-generated paper")
 ):
     """
     Generate a question paper from study material.
     
-    Either upload a .txt file or provide study_text directly.
+    Either upload a document (.txt, .md, .html, .pdf, .docx), provide study_text
+    directly, or reference a registered material by material_id. Materials
+    with a paper pool are served a pre-generated paper unless fresh is set.
     """
     try:
-        # Get study text from file or form
-        if file:
-            if not file.filename.endswith('.txt'):
-                raise HTTPException(status_code=400, detail="Only .txt files are supported")
-            
-            content = await file.read()
-            study_text = content.decode('utf-8')
-        elif study_text:
-            study_text = study_text
-        else:
-            raise HTTPException(status_code=400, detail="Either file or study_text must be provided")
-        
-        if not study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
-        
-        # Store chunks in ChromaDB for later retrieval
-        chunks = store_chunks(study_text)
+        # Get study text from the registered material, file or form
+        with stage("ingest"):
+            material_id, study_text = await load_study_material(material_id, file, study_text)
         
-        # Generate question paper using LLM
-        result = llm_service.generate_question_paper(study_text)
-        
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=f"Generation failed: {result['error']}")
-        
-        # Extract questions from generated paper
-        questions_df = extract_questions_from_paper(result["question_paper"])
-        
-        # Convert to response format
-        questions = []
-        total_marks = 0
-        
-        for _, row in questions_df.iterrows():
-            question = Question(
-                question_text=row['question_text'],
-                marks=row['marks'],
-                answer_text=row['answer_text']
-            )
-            questions.append(question)
-            total_marks += row['marks']
-        
-        return GeneratedPaper(
-            questions=questions,
-            total_marks=total_marks,
-            raw_paper=result["raw_paper"]
-        )
+        return await generate_paper(material_id, study_text, fresh)
         
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
@@ -75,44 +188,55 @@ async def generate_question_paper(
 @router.post("/generate/paper/text", response_model=GeneratedPaper)
 async def generate_question_paper_from_text(request: QuestionPaperRequest):
     """
-    Generate a question paper from study material text.
+    Generate a question paper from study material text or a registered material.
     """
     try:
-        if not request.study_text.strip():
-            raise HTTPException(status_code=400, detail="Study material cannot be empty")
-        
-        # Store chunks in ChromaDB for later retrieval
-        chunks = store_chunks(request.study_text)
+        # Get study text from the registered material or the request
+        with stage("ingest"):
+            material_id, study_text = await load_study_material(request.material_id, study_text=request.study_text)
         
-        # Generate question paper using LLM
-        result = llm_service.generate_question_paper(request.study_text)
+        return await generate_paper(material_id, study_text, request.fresh)
         
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=f"Generation failed: {result['error']}")
-        
-        # Extract questions from generated paper
-        questions_df = extract_questions_from_paper(result["question_paper"])
-        
-        # Convert to response format
-        questions = []
-        total_marks = 0
-        
-        for _, row in questions_df.iterrows():
-            question = Question(
-                question_text=row['question_text'],
-                marks=row['marks'],
-                answer_text=row['answer_text']
-            )
-            questions.append(question)
-            total_marks += row['marks']
-        
-        return GeneratedPaper(
-            questions=questions,
-            total_marks=total_marks,
-            raw_paper=result["raw_paper"]
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
+
+@router.post("/generate/paper/stream")
+async def stream_question_paper(request: QuestionPaperRequest):
+    """
+    Stream a question paper as server-sent events while the LLM writes it.
+
+    Each question is sent as a "question" event as soon as its answer is
+    complete, with the running total of marks, followed by a "done" event
+    carrying the raw paper, or an "error" event if generation fails midway.
+    """
+    try:
+        # Get study text from the registered material or the request
+        with stage("ingest"):
+            material_id, study_text = await load_study_material(request.material_id, study_text=request.study_text)
+
+        paper = None if request.fresh else paper_pool.take(material_id)
+        paper_text = [paper["raw_paper"]] if paper else llm_service.stream_question_paper(study_text)
+
+        if PAPER_POOL_PREFILL:
+            paper_pool.enable(material_id)
+
+        return StreamingResponse(
+            paper_events(material_id, study_text, paper_text, pooled=paper is not None),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"}
         )
-        
+
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
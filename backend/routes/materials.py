@@ -0,0 +1,232 @@
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from models.schemas import (
+    MaterialCreateRequest, MaterialUpdateRequest, MaterialUpdateResponse,
+    MaterialInfo, MaterialDeleteResponse
+)
+from services.material_store import material_store
+from services.ingestion import ingest_upload
+from services.usage import usage_ledger
+from services.paper_pool import paper_pool
+from services.single_flight import single_flight, request_key
+from config import PAPER_POOL_PREFILL
+from extraction import document_format
+from metrics import stage
+from typing import Any, Dict, List, Optional, Tuple
+import sys
+import os
+import uuid
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+router = APIRouter()
+
+def check_document_format(file: UploadFile) -> None:
+    """Reject uploads whose format cannot be extracted"""
+    try:
+        document_format(file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def require_material(material_id: str) -> None:
+    """Raise 404 unless the material is registered"""
+    if material_store.get(material_id) is None:
+        raise HTTPException(status_code=404, detail=f"Material '{material_id}' not found")
+
+def require_writable(material_id: str) -> None:
+    """Reject updates to content-derived IDs, which must always name the text they were derived from"""
+    if material_store.is_content_addressed(material_id):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Material '{material_id}' is derived from its text and cannot be updated; "
+                   f"register the new text with POST /materials or use an ID of your own"
+        )
+
+async def index_text(material_id: str, study_text: str) -> Dict[str, Any]:
+    """Index study text, sharing the work with an identical registration already running"""
+    return await run_in_threadpool(
+        single_flight.do, request_key("materials", material_id), material_store.upsert, material_id, study_text
+    )
+
+async def register_text(study_text: str) -> str:
+    """Register study text under its content-derived ID and return the ID"""
+    if not study_text.strip():
+        raise HTTPException(status_code=400, detail="Study material cannot be empty")
+
+    material_id = material_store.text_material_id(study_text)
+    await index_text(material_id, study_text)
+    return material_id
+
+async def resolve_material(
+    material_id: Optional[str],
+    file: Optional[UploadFile] = None,
+    study_text: Optional[str] = None
+) -> Tuple[str, bool]:
+    """
+    Return the material a request refers to, indexing inline study material if needed.
+
+    The flag is True when the material was indexed from an upload just for this
+    request and should be deleted once the request is done.
+    """
+    if material_id:
+        require_material(material_id)
+        usage_ledger.set_material(material_id)
+        return material_id, False
+
+    if file:
+        check_document_format(file)
+        temporary_id = f"request-{uuid.uuid4().hex}"
+        with stage("ingest"):
+            stats = await ingest_upload(temporary_id, file)
+        if stats["chunks"] == 0:
+            material_store.delete(temporary_id)
+            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+        # Per-request materials are never reused, so per-material usage would only pile up
+        return temporary_id, True
+
+    if study_text is not None:
+        with stage("ingest"):
+            material_id = await register_text(study_text)
+        usage_ledger.set_material(material_id)
+        return material_id, False
+
+    raise HTTPException(status_code=400, detail="Either file, study_text or material_id must be provided")
+
+def material_info(material_id: str) -> MaterialInfo:
+    """Summarize a registered material"""
+    record = material_store.get(material_id)
+    return MaterialInfo(
+        material_id=material_id,
+        chunks=len(record.chunk_ids),
+        concepts=record.graph.number_of_edges(),
+        pooled_papers=paper_pool.ready(material_id)
+    )
+
+def maybe_prefill(material_id: str, prefill_papers: bool) -> None:
+    """Start pre-generating question papers for a material if requested or configured"""
+    if prefill_papers or PAPER_POOL_PREFILL:
+        paper_pool.enable(material_id)
+
+@router.post("/materials", response_model=MaterialUpdateResponse)
+async def create_material(request: MaterialCreateRequest):
+    """
+    Register study material from text and return its ID.
+
+    The ID is derived from the content, so registering the same text again is
+    cheap and returns the same ID.
+    """
+    try:
+        if not request.study_text.strip():
+            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+
+        material_id = material_store.text_material_id(request.study_text)
+        stats = await index_text(material_id, request.study_text)
+        maybe_prefill(material_id, request.prefill_papers)
+        return MaterialUpdateResponse(**stats)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.post("/materials/file", response_model=MaterialUpdateResponse)
+async def create_material_from_file(
+    file: UploadFile = File(..., description="Study material file (.txt, .md, .html, .pdf, .docx)"),
+    prefill_papers: bool = Form(False, description="Pre-generate question paper variants in the background")
+):
+    """
+    Register study material from an uploaded document and return its ID.
+    """
+    material_id = None
+    try:
+        check_document_format(file)
+
+        material_id = f"material-{uuid.uuid4().hex}"
+        stats = await ingest_upload(material_id, file)
+        if stats["chunks"] == 0:
+            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+
+        maybe_prefill(material_id, prefill_papers)
+        return MaterialUpdateResponse(**stats)
+
+    except HTTPException:
+        if material_id:
+            material_store.delete(material_id)
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.get("/materials", response_model=List[MaterialInfo])
+async def list_materials():
+    """
+    List registered study materials.
+    """
+    return [material_info(material_id) for material_id in material_store.list_ids()]
+
+@router.get("/materials/{material_id}", response_model=MaterialInfo)
+async def get_material(material_id: str):
+    """
+    Get a registered study material.
+    """
+    require_material(material_id)
+    return material_info(material_id)
+
+@router.delete("/materials/{material_id}", response_model=MaterialDeleteResponse)
+async def delete_material(material_id: str):
+    """
+    Delete a registered study material and its chunks.
+    """
+    require_material(material_id)
+    deleted = await run_in_threadpool(material_store.delete, material_id)
+    paper_pool.discard(material_id)
+    return MaterialDeleteResponse(material_id=material_id, deleted=deleted)
+
+@router.put("/materials/{material_id}", response_model=MaterialUpdateResponse)
+async def update_material(material_id: str, request: MaterialUpdateRequest):
+    """
+    Create or update a study material incrementally.
+
+    Only chunks whose text changed are re-embedded and re-parsed; removed
+    chunks are deleted together with the concept graph edges they contributed.
+    """
+    try:
+        require_writable(material_id)
+        if not request.study_text.strip():
+            raise HTTPException(status_code=400, detail="Study material cannot be empty")
+
+        stats = await run_in_threadpool(material_store.upsert, material_id, request.study_text)
+        # Papers pooled for the old version are dropped; refill for the new one
+        maybe_prefill(material_id, request.prefill_papers or paper_pool.enabled(material_id))
+        return MaterialUpdateResponse(**stats)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@router.put("/materials/{material_id}/file", response_model=MaterialUpdateResponse)
+async def upload_material(
+    material_id: str,
+    file: UploadFile = File(..., description="Study material file (.txt, .md, .html, .pdf, .docx)"),
+    prefill_papers: bool = Form(False, description="Pre-generate question paper variants in the background")
+):
+    """
+    Create or update a study material from an uploaded file.
+
+    Plain text is decoded and indexed block by block from the spooled upload,
+    holding only a few blocks in memory. PDF, DOCX, Markdown and HTML are extracted in a process pool, keeping page or
+    section numbers as chunk metadata.
+    """
+    try:
+        require_writable(material_id)
+        check_document_format(file)
+
+        stats = await ingest_upload(material_id, file)
+        maybe_prefill(material_id, prefill_papers or paper_pool.enabled(material_id))
+        return MaterialUpdateResponse(**stats)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from models.schemas import UsageReport
+from services.usage import usage_ledger
+import sys
+import os
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+router = APIRouter()
+
+@router.get("/usage", response_model=UsageReport)
+async def get_usage():
+    """
+    Get LLM token usage per endpoint and per material, with today's budget.
+    """
+    return UsageReport(**usage_ledger.report())
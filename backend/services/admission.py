@@ -0,0 +1,142 @@
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, Optional, Tuple
+
+from config import LLM_ADMISSION_SLOTS, LLM_INTERACTIVE_RESERVED_SLOTS, ADMISSION_QUEUE_SIZE
+from metrics import stage, ADMISSION_REQUESTS
+
+# Priority classes, most urgent first
+PRIORITIES = ("interactive", "batch", "background")
+
+class Overloaded(Exception):
+    """Raised when an LLM call cannot be queued because its priority class's queue is full"""
+
+    def __init__(self, priority: str, queued: int, retry_after: int):
+        self.priority = priority
+        self.retry_after = retry_after
+        super().__init__(f"Server is busy: {queued} {priority} LLM calls already queued, retry in {retry_after}s")
+
+# (priority class, job) of the request being served; each job is one request
+_current_job: ContextVar[Optional[Tuple[str, str]]] = ContextVar("current_admission_job", default=None)
+# Whether the current request passed check(), so its calls wait rather than being rejected
+_admitted: ContextVar[bool] = ContextVar("admission_admitted", default=False)
+
+class AdmissionController:
+    """
+    Service admitting LLM calls by priority class.
+
+    At most `slots` calls run at once, and `reserved` of them are kept for
+    interactive calls so a single answer or paper never waits behind a full
+    set of batch calls. Waiting calls are served interactive first, then
+    batch, then background; within a class, jobs take turns so one large
+    batch cannot starve another. Each class queues at most `queue_size`
+    calls; beyond that calls are rejected with Overloaded, except those of a
+    request already admitted by check(), which wait so no started work is lost.
+    """
+
+    def __init__(self, slots: int = LLM_ADMISSION_SLOTS, reserved: int = LLM_INTERACTIVE_RESERVED_SLOTS,
+                 queue_size: int = ADMISSION_QUEUE_SIZE):
+        self.slots = slots
+        self.reserved = min(reserved, slots - 1)
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        # Waiting calls per class, by job in turn order
+        self._waiting: Dict[str, "OrderedDict[str, Deque[threading.Event]]"] = {
+            priority: OrderedDict() for priority in PRIORITIES
+        }
+        self._queued: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        # Moving average of how long a call holds its slot, for Retry-After
+        self._hold_seconds = 1.0
+
+    def start_request(self, priority: str, job: Optional[str] = None) -> None:
+        """Admit the current request's LLM calls under a priority class, as one job"""
+        _current_job.set((priority, job or uuid.uuid4().hex))
+        _admitted.set(False)
+
+    def end_request(self) -> None:
+        _current_job.set(None)
+        _admitted.set(False)
+
+    def current(self) -> Tuple[str, str]:
+        """Priority class and job of the current request; unclassified calls are interactive"""
+        return _current_job.get() or ("interactive", "")
+
+    def _admissible(self, priority: str) -> bool:
+        active = sum(self._active.values())
+        if active >= self.slots:
+            return False
+        if priority == "interactive":
+            return True
+        return active - self._active["interactive"] < self.slots - self.reserved
+
+    def _retry_after(self, priority: str) -> int:
+        waits = (self._queued[priority] + 1) * self._hold_seconds / self.slots
+        return max(1, math.ceil(waits))
+
+    def check(self) -> None:
+        """
+        Raise Overloaded now if the current request's calls would be rejected.
+
+        Otherwise the request is admitted: its later calls in this context queue
+        for a slot even past the queue limit instead of failing partway through.
+        """
+        priority, _ = self.current()
+        with self._lock:
+            if self._queued[priority] >= self.queue_size:
+                ADMISSION_REQUESTS.inc(priority=priority, outcome="rejected")
+                raise Overloaded(priority, self._queued[priority], self._retry_after(priority))
+        _admitted.set(True)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting calls, most urgent class first and jobs in turn"""
+        for priority in PRIORITIES:
+            jobs = self._waiting[priority]
+            while jobs and self._admissible(priority):
+                job, waiters = jobs.popitem(last=False)
+                event = waiters.popleft()
+                if waiters:
+                    jobs[job] = waiters
+                self._queued[priority] -= 1
+                self._active[priority] += 1
+                event.set()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold an LLM slot for the enclosed call, waiting for one if needed"""
+        priority, job = self.current()
+        event = None
+        with self._lock:
+            # Queue behind calls already waiting in this or a more urgent class
+            waiting = any(self._waiting[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            if not waiting and self._admissible(priority):
+                self._active[priority] += 1
+            elif self._queued[priority] >= self.queue_size and not _admitted.get():
+                ADMISSION_REQUESTS.inc(priority=priority, outcome="rejected")
+                raise Overloaded(priority, self._queued[priority], self._retry_after(priority))
+            else:
+                event = threading.Event()
+                self._waiting[priority].setdefault(job, deque()).append(event)
+                self._queued[priority] += 1
+        ADMISSION_REQUESTS.inc(priority=priority, outcome="admitted" if event is None else "queued")
+
+        if event is not None:
+            with stage("llm_queue"):
+                event.wait()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.perf_counter() - start)
+                self._active[priority] -= 1
+                self._dispatch()
+
+# Global admission controller instance
+admission = AdmissionController()
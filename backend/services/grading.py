@@ -0,0 +1,262 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from config import LLM_CONCURRENCY, GRADE_CACHE_SIZE, CLUSTER_MAX_MARKS, TIERED_GRADING, LLM_BUDGET_MODE
+from services.llm_service import llm_service
+from services.material_store import material_store
+from services.prescorer import pre_scorer
+from services.usage import BudgetExceeded
+from services.single_flight import single_flight, request_key
+from services.admission import admission, Overloaded
+from metrics import stage, timed_stage, CACHE_REQUESTS, GRADED_ANSWERS
+from tracing import bind
+from utils import graph_context, embedding_fn
+
+class GradeCache:
+    """Thread-safe LRU cache of grades keyed by material version, question and normalized answer"""
+
+    def __init__(self, max_size: int = GRADE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: Hashable, value: Tuple[float, str]) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+grade_cache = GradeCache()
+
+class TierStats:
+    """Thread-safe count and latency of answers graded by each tier"""
+
+    def __init__(self):
+        self._answers: Dict[str, int] = defaultdict(int)
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def record(self, tier: str, seconds: float) -> None:
+        with self._lock:
+            self._answers[tier] += 1
+            self._seconds[tier] += seconds
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "tier": tier,
+                    "answers": answers,
+                    "mean_latency_ms": 1000 * self._seconds[tier] / answers
+                }
+                for tier, answers in self._answers.items()
+            ]
+
+tier_stats = TierStats()
+
+def normalize_answer(answer: str) -> str:
+    """Strip surrounding whitespace for exact-match deduplication; case and inner spacing can carry meaning"""
+    return answer.strip()
+
+def fold_answer(answer: str) -> str:
+    """Fold case and whitespace for the approximate merging done when clustering answers"""
+    return " ".join(answer.lower().split())
+
+@timed_stage("prompt_assembly")
+def build_context(material_id: str, question: str, graph: nx.DiGraph) -> Tuple[str, List[str]]:
+    """
+    Build the study material context for a question, returning it with the retrieved chunks.
+
+    The context holds only material-derived text, so it is byte-identical for
+    every answer to the same question and leads the evaluation prompt as a
+    stable prefix that providers can cache; marks and answers follow it.
+    """
+    chunks = material_store.retrieve(material_id, question)
+    context = "\n".join(chunks) + "\n\n"
+    context += graph_context(question, graph)
+    return context, chunks
+
+def build_question_contexts(material_id: str, questions: pd.DataFrame) -> Dict[int, Tuple[str, List[str]]]:
+    """Build the retrieval and graph context once per question"""
+    graph = material_store.get(material_id).graph
+    return {
+        question.question_number: build_context(material_id, question.question_text, graph)
+        for question in questions.drop_duplicates("question_number").itertuples(index=False)
+    }
+
+def grade_answer(context: str, chunks: List[str], question: str, student_answer: str,
+                 reference_answer: str, max_marks: int) -> Dict[str, Any]:
+    """
+    Grade one answer, trying the local pre-scorer before the LLM.
+
+    Blank, near-verbatim and clearly off-topic answers are scored locally; only
+    answers the pre-scorer is unsure about are escalated. Once the token budget
+    is spent they get a local estimate instead (tier "estimate"), unless
+    LLM_BUDGET_MODE is "reject". The result has the shape of
+    LLMService.evaluate_answer plus the tier that produced it. Identical
+    gradings already in flight, from this or another request, are shared.
+    """
+    key = request_key("evaluate", context, question, normalize_answer(student_answer), reference_answer, max_marks)
+    return single_flight.do(key, _grade_answer, context, chunks, question, student_answer, reference_answer, max_marks)
+
+def grade_material_answer(material_id: str, question: str, student_answer: str,
+                          reference_answer: str, max_marks: int) -> Dict[str, Any]:
+    """
+    Grade one answer against a material, building the question's context first.
+
+    Retrieval embeds the question and queries the vector store, so callers on
+    the event loop should run this whole function in the threadpool.
+    """
+    graph = material_store.get(material_id).graph
+    context, chunks = build_context(material_id, question, graph)
+    return grade_answer(context, chunks, question, student_answer, reference_answer, max_marks)
+
+def _grade_answer(context: str, chunks: List[str], question: str, student_answer: str,
+                  reference_answer: str, max_marks: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = None
+    if TIERED_GRADING:
+        with stage("prescore"):
+            result = pre_scorer.score(student_answer, reference_answer, max_marks, chunks)
+    tier = "local"
+    if result is None:
+        tier = "llm"
+        try:
+            result = llm_service.evaluate_answer(
+                study_context=context,
+                question=question,
+                student_answer=student_answer,
+                reference_answer=reference_answer,
+                max_marks=max_marks
+            )
+        except BudgetExceeded:
+            if LLM_BUDGET_MODE != "degrade":
+                raise
+            # Out of tokens: fall back to the local estimate rather than failing the request
+            tier = "estimate"
+            result = pre_scorer.estimate(student_answer, reference_answer, max_marks, chunks)
+    tier_stats.record(tier, time.perf_counter() - start)
+    GRADED_ANSWERS.inc(tier=tier)
+    return {**result, "tier": tier}
+
+def assign_representatives(pairs: pd.DataFrame, cluster_threshold: Optional[float] = None) -> pd.DataFrame:
+    """
+    Point every pair at the pair whose grade it reuses.
+
+    Identical answers (ignoring surrounding whitespace) always share a grade.
+    With a cluster_threshold, answers to questions worth at most
+    CLUSTER_MAX_MARKS also share a grade when they differ only in case or
+    spacing, and the non-empty ones are embedded and greedily clustered: an
+    answer joins the first representative whose cosine similarity reaches the
+    threshold.
+    """
+    positions = pd.Series(np.arange(len(pairs)), index=pairs.index)
+    keys = pairs["student_answer"].map(normalize_answer)
+    if cluster_threshold is not None:
+        approximate = pairs["marks"] <= CLUSTER_MAX_MARKS
+        keys = keys.where(~approximate, pairs["student_answer"].map(fold_answer))
+    representative = positions.groupby([pairs["question_number"], keys]).transform("first")
+    similarity = pd.Series(1.0, index=pairs.index)
+
+    if cluster_threshold is not None:
+        candidates = pairs[(representative == positions) & (pairs["marks"] <= CLUSTER_MAX_MARKS) & (keys != "")]
+        cluster_of: Dict[int, Tuple[int, float]] = {}
+
+        for _, group in candidates.groupby("question_number"):
+            if len(group) < 2:
+                continue
+            vectors = np.asarray(embedding_fn(group["student_answer"].tolist()), dtype=float)
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+            rep_positions, rep_vectors = [], []
+            for position, vector in zip(positions[group.index], vectors):
+                if rep_vectors:
+                    scores = np.stack(rep_vectors) @ vector
+                    best = int(scores.argmax())
+                    if scores[best] >= cluster_threshold:
+                        cluster_of[position] = (rep_positions[best], float(scores[best]))
+                        continue
+                rep_positions.append(position)
+                rep_vectors.append(vector)
+
+        # Exact duplicates follow their representative into its cluster
+        similarity = representative.map(lambda p: cluster_of.get(p, (p, 1.0))[1])
+        representative = representative.map(lambda p: cluster_of.get(p, (p, 1.0))[0])
+
+    return pairs.assign(representative=representative.values, similarity=similarity.values)
+
+def grade_pairs(material_id: str, pairs: pd.DataFrame, cluster_threshold: Optional[float] = None) -> pd.DataFrame:
+    """
+    Grade unique (question, answer) pairs, returning them with score and feedback.
+
+    Contexts are shared by every answer to the same question, and each batch
+    grades its representative pairs on its own LLM_CONCURRENCY workers; the
+    admission controller shares LLM slots fairly between concurrent batches.
+    Each grade records the tier that produced it (cache, local or llm); pairs
+    graded through another answer are flagged as propagated.
+    """
+    # Fail fast with Overloaded rather than partway through the batch; once
+    # admitted, the batch's calls wait for slots instead of being rejected
+    admission.check()
+    pairs = assign_representatives(pairs.reset_index(drop=True), cluster_threshold)
+    to_grade = pairs[pairs["representative"] == pairs.index]
+    contexts = build_question_contexts(material_id, to_grade)
+    # Re-ingested material changes the contexts, so grades from older versions must not be reused
+    version = material_store.version(material_id)
+
+    def grade(pair) -> Tuple[float, str, str]:
+        key = (material_id, version, pair.question_text, pair.answer_text, pair.marks, normalize_answer(pair.student_answer))
+        cached = grade_cache.get(key)
+        CACHE_REQUESTS.inc(cache="grade", result="miss" if cached is None else "hit")
+        if cached is not None:
+            tier_stats.record("cache", 0.0)
+            GRADED_ANSWERS.inc(tier="cache")
+            return (*cached, "cache")
+
+        context, chunks = contexts[pair.question_number]
+        try:
+            result = grade_answer(context, chunks, pair.question_text, pair.student_answer, pair.answer_text, pair.marks)
+        except Overloaded:
+            # Shared with another request's rejected call; keep the grades already spent on
+            return 0.0, "Evaluation failed: server busy", "llm"
+        if not result["success"]:
+            return 0.0, "Evaluation failed", result["tier"]
+
+        outcome = (result["score"], result["evaluation"])
+        # Local scores are cheap to redo, and estimates should be re-graded once budget frees up
+        if result["tier"] == "llm":
+            grade_cache.put(key, outcome)
+        return (*outcome, result["tier"])
+
+    with stage("grade_batch"), ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="grading") as executor:
+        outcomes = dict(zip(to_grade.index, executor.map(bind(grade), to_grade.itertuples(index=False))))
+    return pairs.assign(
+        score=[outcomes[r][0] for r in pairs["representative"]],
+        feedback=[outcomes[r][1] for r in pairs["representative"]],
+        graded_by=[outcomes[r][2] for r in pairs["representative"]],
+        propagated=pairs["representative"] != pairs.index
+    )
+
+def merge_grades(rows: pd.DataFrame, graded: pd.DataFrame) -> pd.DataFrame:
+    """Copy the grades of unique pairs back onto every row that shares them"""
+    keys = ["question_number", "student_answer"]
+    columns = keys + ["score", "feedback", "graded_by", "propagated", "similarity"]
+    return rows.merge(graded[columns], on=keys, how="left")
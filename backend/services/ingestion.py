@@ -0,0 +1,120 @@
+import asyncio
+import codecs
+import os
+import tempfile
+from typing import Any, AsyncIterator, Dict, Iterator
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from config import UPLOAD_BLOCK_SIZE, INGEST_QUEUE_BLOCKS
+from extraction import document_format, iter_document_sections, extract_text
+from services.material_store import material_store
+from tracing import bind
+
+_END = object()
+
+class IngestAborted(Exception):
+    """Raised inside the ingest worker when the upload stream fails"""
+
+async def iter_upload_text(file: UploadFile, block_size: int = UPLOAD_BLOCK_SIZE) -> AsyncIterator[str]:
+    """Read an uploaded file block by block, decoding UTF-8 incrementally"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        block = await file.read(block_size)
+        if not block:
+            break
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def _drain(blocks: asyncio.Queue, loop: asyncio.AbstractEventLoop) -> Iterator[str]:
+    """Yield text pieces from the event loop's queue until the producer signals the end"""
+    while True:
+        piece = asyncio.run_coroutine_threadsafe(blocks.get(), loop).result()
+        if piece is _END:
+            return
+        if isinstance(piece, BaseException):
+            raise IngestAborted(str(piece)) from piece
+        yield piece
+
+async def _put(blocks: asyncio.Queue, item: Any, worker: asyncio.Future) -> None:
+    """Queue an item for the worker, waiting for room without blocking the event loop"""
+    put = asyncio.ensure_future(blocks.put(item))
+    await asyncio.wait({put, worker}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        # The worker stopped early; surface its error instead of waiting forever
+        put.cancel()
+        worker.result()
+
+async def ingest_stream(material_id: str, pieces: AsyncIterator[str]) -> Dict[str, Any]:
+    """
+    Index a material from a stream of text pieces.
+
+    Pieces are handed to a worker thread through a bounded queue, so chunking,
+    embedding and concept extraction run while later pieces are still being
+    read and decoded, and at most INGEST_QUEUE_BLOCKS pieces are held in memory
+    at once. For an UploadFile the body has already been spooled to disk by
+    Starlette before the handler runs, so this bounds memory, not network time.
+    """
+    blocks = asyncio.Queue(maxsize=INGEST_QUEUE_BLOCKS)
+    loop = asyncio.get_running_loop()
+    worker = loop.run_in_executor(None, bind(material_store.upsert_stream), material_id, _drain(blocks, loop))
+
+    try:
+        async for piece in pieces:
+            await _put(blocks, piece, worker)
+    except Exception as e:
+        # Abort the worker so it rolls back the partial ingest
+        if not worker.done():
+            await _put(blocks, e, worker)
+        await asyncio.gather(worker, return_exceptions=True)
+        raise
+
+    await _put(blocks, _END, worker)
+    return await worker
+
+async def save_upload(file: UploadFile, block_size: int = UPLOAD_BLOCK_SIZE) -> str:
+    """Copy an upload to a temporary file block by block and return its path"""
+    suffix = os.path.splitext(file.filename or "")[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        while True:
+            block = await file.read(block_size)
+            if not block:
+                break
+            tmp.write(block)
+    return tmp.name
+
+async def ingest_upload(material_id: str, file: UploadFile) -> Dict[str, Any]:
+    """
+    Index an uploaded document into the material store.
+
+    Plain text is streamed straight from the upload. Other formats are saved to a
+    temporary file and extracted in the process pool, feeding sections to the
+    store as they are extracted; page numbers are kept as chunk metadata.
+    """
+    fmt = document_format(file.filename)
+    if fmt == "txt":
+        return await ingest_stream(material_id, iter_upload_text(file))
+
+    path = await save_upload(file)
+    try:
+        return await run_in_threadpool(
+            material_store.upsert_sections, material_id, iter_document_sections(path, fmt)
+        )
+    finally:
+        os.unlink(path)
+
+async def read_upload_text(file: UploadFile) -> str:
+    """Read the full text of an uploaded document"""
+    fmt = document_format(file.filename)
+    if fmt == "txt":
+        return "".join([piece async for piece in iter_upload_text(file)])
+
+    path = await save_upload(file)
+    try:
+        return await run_in_threadpool(extract_text, path, fmt)
+    finally:
+        os.unlink(path)
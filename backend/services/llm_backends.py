@@ -0,0 +1,47 @@
+from typing import Callable, Dict, List
+import dspy
+
+from config import (
+    LLM_BACKEND, LLM_MODEL, GROQ_API_KEY, GROQ_API_BASE, LLM_API_BASE, LLM_API_KEY,
+    STUB_LLM_HOST, STUB_LLM_PORT
+)
+
+# Registered backends, each a factory returning a configured DSPy LM
+LLM_BACKENDS: Dict[str, Callable[[], dspy.LM]] = {}
+
+def register_backend(name: str):
+    """Register an LM factory under a backend name"""
+    def decorator(factory: Callable[[], dspy.LM]) -> Callable[[], dspy.LM]:
+        LLM_BACKENDS[name] = factory
+        return factory
+    return decorator
+
+@register_backend("groq")
+def groq_backend() -> dspy.LM:
+    """Groq's hosted OpenAI-compatible API"""
+    return dspy.LM(LLM_MODEL, api_key=GROQ_API_KEY, api_base=GROQ_API_BASE)
+
+@register_backend("openai")
+def openai_compatible_backend() -> dspy.LM:
+    """Any OpenAI-compatible server (vLLM, llama.cpp, Ollama, ...) at LLM_API_BASE"""
+    return dspy.LM(LLM_MODEL, api_key=LLM_API_KEY or "none", api_base=LLM_API_BASE)
+
+@register_backend("stub")
+def stub_backend() -> dspy.LM:
+    """The local deterministic stub server (see stub_llm.py), uncached so every call reaches it"""
+    return dspy.LM(
+        "openai/stub",
+        api_key="stub",
+        api_base=f"http://{STUB_LLM_HOST}:{STUB_LLM_PORT}/v1",
+        cache=False
+    )
+
+def available_backends() -> List[str]:
+    """Return the names of the registered backends"""
+    return sorted(LLM_BACKENDS)
+
+def create_lm(backend: str = LLM_BACKEND) -> dspy.LM:
+    """Create the LM for a backend, raising ValueError if it is not registered"""
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}'. Available backends: {', '.join(available_backends())}")
+    return LLM_BACKENDS[backend]()
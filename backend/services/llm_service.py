@@ -1,55 +1,73 @@
-import os
 import dspy
 from dspy import Signature, InputField, OutputField, Predict, Module
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List
+import litellm
 import re
+import time
 
-# Configure DSPy with Groq
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "..")
+from services.llm_backends import create_lm
+from services.usage import usage_ledger
+from services.admission import admission
+from services.programs import load_program
+from config import DSPY_LOAD_PROGRAMS, LLM_BACKEND
+from metrics import stage, LLM_REQUESTS
 
-# Initialize DSPy LM
-lm = dspy.LM(
-    "openai/llama3-70b-8192",
-    api_key=GROQ_API_KEY,
-    api_base="https://api.groq.com/openai/v1"
-)
-dspy.configure(lm=lm)
+# Initialize DSPy LM for the configured backend (LLM_BACKEND)
+lm = create_lm()
+dspy.configure(lm=lm, track_usage=True)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token"""
+    return len(text) // 4
+
+def record_usage(operation: str, result: Any, prompt: str, completion: str, latency_ms: float) -> None:
+    """
+    Record an LLM call's usage, estimating tokens from text length when the backend reports none.
+
+    DSPy reports no usage for calls it answers from its cache; with caching on
+    those spent no tokens, so they are not recorded at all.
+    """
+    usage = result.get_lm_usage() if hasattr(result, "get_lm_usage") else None
+    if usage:
+        prompt_tokens = sum(u.get("prompt_tokens") or 0 for u in usage.values())
+        completion_tokens = sum(u.get("completion_tokens") or 0 for u in usage.values())
+    elif getattr(lm, "cache", False):
+        return
+    else:
+        prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(completion)
+    usage_ledger.record(operation, lm.model, prompt_tokens, completion_tokens, latency_ms, estimated=not usage)
 
 class EvalSignature(dspy.Signature):
     """Signature for answer evaluation"""
+    # Inputs render in this order: shared study context first, the student's answer last
     study_context = dspy.InputField()
     question = dspy.InputField()
+    max_marks = dspy.InputField()
     reference_answer = dspy.InputField()
     student_answer = dspy.InputField()
     evaluation = OutputField(desc="Score, rubric, and feedback")
 
 class EvalModule(Module):
     """DSPy module for evaluating student answers"""
+    PROGRAM_VERSION = 1  # Bump when prompt assembly changes so compiled demos are recompiled
+
     def __init__(self):
         super().__init__()
         self.pred = Predict(EvalSignature)
 
-    def forward(self, study_context: str, question: str, student_answer: str, reference_answer: str):
+    def forward(self, study_context: str, question: str, student_answer: str, reference_answer: str,
+                max_marks: int):
         return self.pred(
             study_context=study_context,
             question=question,
-            student_answer=student_answer,
-            reference_answer=reference_answer
+            max_marks=str(max_marks),
+            reference_answer=reference_answer,
+            student_answer=student_answer
         )
 
-class QuestionGenSignature(Signature):
-    """Signature for question paper generation"""
-    study_text = InputField()
-    question_paper = OutputField(desc="50-mark question paper with answers")
-
-class QuestionGenModule(Module):
-    """DSPy module for generating question papers"""
-    def __init__(self):
-        super().__init__()
-        self.gen = Predict(QuestionGenSignature)
-
-    def forward(self, study_text: str):
-        prompt = f"""
+def question_paper_prompt(study_text: str) -> str:
+    """Build the examiner prompt asking for a 50-mark paper from the study material"""
+    return f"""
 You are a strict academic examiner.
 
 Generate a question paper totaling **EXACTLY 50 marks** from the study material below, using ONLY questions of **2, 5, or 10 marks**.
@@ -76,61 +94,205 @@ Answer: ...
 STUDY MATERIAL:
 {study_text}
 """
-        return self.gen(study_text=prompt)
+
+def missing_questions_prompt(study_text: str, marks: List[int], existing: List[str]) -> str:
+    """Build the prompt asking for only the questions a paper is missing"""
+    wanted = "\n".join(f"{i}. Question text ({m} marks)\nAnswer: ..." for i, m in enumerate(marks, 1))
+    avoid = "\n".join(f"- {q}" for q in existing) or "- (none)"
+    return f"""
+You are a strict academic examiner completing a question paper.
+
+Write EXACTLY {len(marks)} new question(s) from the study material below, worth these marks in this order: {", ".join(map(str, marks))}.
+
+❗Important Rules:
+- Do not repeat or rephrase any of the existing questions listed below.
+- Include model answers.
+- Format must be:
+
+{wanted}
+
+📌 Do NOT include any titles, instructions, or extra explanations.
+
+EXISTING QUESTIONS:
+{avoid}
+
+STUDY MATERIAL:
+{study_text}
+"""
+
+class QuestionGenSignature(Signature):
+    """Signature for question paper generation"""
+    study_text = InputField()
+    question_paper = OutputField(desc="50-mark question paper with answers")
+
+class QuestionGenModule(Module):
+    """DSPy module for generating question papers"""
+    PROGRAM_VERSION = 1  # Bump when question_paper_prompt changes so compiled demos are recompiled
+
+    def __init__(self):
+        super().__init__()
+        self.gen = Predict(QuestionGenSignature)
+
+    def forward(self, study_text: str):
+        return self.gen(study_text=question_paper_prompt(study_text))
+
+class QuestionFillSignature(Signature):
+    """Signature for generating the questions missing from a paper"""
+    study_text = InputField()
+    questions = OutputField(desc="Numbered questions with answers")
+
+class QuestionFillModule(Module):
+    """DSPy module for generating specific questions to complete a paper"""
+    def __init__(self):
+        super().__init__()
+        self.gen = Predict(QuestionFillSignature)
+
+    def forward(self, study_text: str, marks: List[int], existing: List[str]):
+        return self.gen(study_text=missing_questions_prompt(study_text, marks, existing))
 
 class LLMService:
     """Service class for LLM operations"""
     
-    def __init__(self):
+    def __init__(self, load_programs: bool = DSPY_LOAD_PROGRAMS):
         self.question_generator = QuestionGenModule()
+        self.question_filler = QuestionFillModule()
         self.evaluator = EvalModule()
+        # Programs compiled offline by compile_programs.py; loading them only reads their demos
+        self.compiled = {
+            name: load_program(module, name, LLM_BACKEND, lm.model) if load_programs else False
+            for name, module in self.programs().items()
+        }
+
+    def programs(self) -> Dict[str, Module]:
+        """The DSPy programs that can be compiled offline, by artifact name"""
+        return {"evaluate": self.evaluator, "generate": self.question_generator}
     
     def generate_question_paper(self, study_text: str) -> Dict[str, Any]:
-        """Generate a question paper from study material"""
-        try:
-            result = self.question_generator(study_text=study_text)
-            return {
-                "success": True,
-                "question_paper": result.question_paper,
-                "raw_paper": result.question_paper
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "question_paper": "",
-                "raw_paper": ""
-            }
+        """Generate a question paper from study material, raising BudgetExceeded or Overloaded"""
+        usage_ledger.check_budget(estimate_tokens(study_text))
+        with admission.slot():
+            try:
+                start = time.perf_counter()
+                with stage("llm_generate"):
+                    result = self.question_generator(study_text=study_text)
+                LLM_REQUESTS.inc(operation="generate", outcome="success")
+                record_usage("generate", result, study_text, result.question_paper, (time.perf_counter() - start) * 1000)
+                return {
+                    "success": True,
+                    "question_paper": result.question_paper,
+                    "raw_paper": result.question_paper
+                }
+            except Exception as e:
+                LLM_REQUESTS.inc(operation="generate", outcome="error")
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "question_paper": "",
+                    "raw_paper": ""
+                }
     
-    def evaluate_answer(self, study_context: str, question: str, 
-                       student_answer: str, reference_answer: str) -> Dict[str, Any]:
-        """Evaluate a single student answer"""
+    def generate_questions(self, study_text: str, marks: List[int], existing: List[str]) -> Dict[str, Any]:
+        """Generate only questions of the given marks, raising BudgetExceeded or Overloaded"""
+        usage_ledger.check_budget(estimate_tokens(study_text))
+        with admission.slot():
+            try:
+                start = time.perf_counter()
+                with stage("llm_generate"):
+                    result = self.question_filler(study_text=study_text, marks=marks, existing=existing)
+                LLM_REQUESTS.inc(operation="generate_questions", outcome="success")
+                record_usage("generate_questions", result, study_text, result.questions, (time.perf_counter() - start) * 1000)
+                return {"success": True, "questions": result.questions}
+            except Exception as e:
+                LLM_REQUESTS.inc(operation="generate_questions", outcome="error")
+                return {"success": False, "error": str(e), "questions": ""}
+
+    def stream_question_paper(self, study_text: str) -> Iterator[str]:
+        """
+        Stream a question paper's text as the LLM produces it.
+
+        The budget and admission queue are checked before streaming starts,
+        raising BudgetExceeded or Overloaded; the LLM slot is held while the
+        paper streams, and LLM errors surface while iterating. The prompt is
+        sent to the model as plain text, so a compiled "generate" program's
+        demos apply only to generate_question_paper and the paper pool.
+        """
+        usage_ledger.check_budget(estimate_tokens(study_text))
+        admission.check()
+        return self._stream_question_paper(study_text)
+
+    def _stream_question_paper(self, study_text: str) -> Iterator[str]:
+        prompt = question_paper_prompt(study_text)
+        start = time.perf_counter()
+        parts, usage = [], None
         try:
-            result = self.evaluator(
-                study_context=study_context,
-                question=question,
-                student_answer=student_answer,
-                reference_answer=reference_answer
-            )
+            with admission.slot(), stage("llm_generate"):
+                # DSPy predictors return whole completions, so stream from the LM's model
+                # directly; this bypasses self.question_generator and its compiled demos
+                response = litellm.completion(
+                    model=lm.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **lm.kwargs
+                )
+                for chunk in response:
+                    usage = getattr(chunk, "usage", None) or usage
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        parts.append(text)
+                        yield text
+        except Exception:
+            LLM_REQUESTS.inc(operation="generate", outcome="error")
+            raise
+
+        LLM_REQUESTS.inc(operation="generate", outcome="success")
+        completion = "".join(parts)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if usage:
+            usage_ledger.record("generate", lm.model, usage.prompt_tokens, usage.completion_tokens, latency_ms)
+        else:
+            usage_ledger.record("generate", lm.model, estimate_tokens(prompt), estimate_tokens(completion),
+                                latency_ms, estimated=True)
+
+    def evaluate_answer(self, study_context: str, question: str,
+                       student_answer: str, reference_answer: str, max_marks: int) -> Dict[str, Any]:
+        """Evaluate a single student answer, raising BudgetExceeded or Overloaded"""
+        prompt = "\n".join([study_context, question, str(max_marks), reference_answer, student_answer])
+        usage_ledger.check_budget(estimate_tokens(prompt))
+        with admission.slot():
+            try:
+                start = time.perf_counter()
+                with stage("llm_evaluate"):
+                    result = self.evaluator(
+                        study_context=study_context,
+                        question=question,
+                        student_answer=student_answer,
+                        reference_answer=reference_answer,
+                        max_marks=max_marks
+                    )
+                LLM_REQUESTS.inc(operation="evaluate", outcome="success")
+                record_usage("evaluate", result, prompt, result.evaluation, (time.perf_counter() - start) * 1000)
             
-            # Extract score from evaluation text
-            score_match = re.search(r"Score:\s*([0-9.]+)", result.evaluation)
-            score = float(score_match.group(1)) if score_match else 0.0
+                # Extract score from evaluation text
+                with stage("parse"):
+                    score_match = re.search(r"Score:\s*([0-9.]+)", result.evaluation)
+                    score = float(score_match.group(1)) if score_match else 0.0
             
-            return {
-                "success": True,
-                "evaluation": result.evaluation,
-                "score": score,
-                "detailed_analysis": result.evaluation
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "evaluation": "",
-                "score": 0.0,
-                "detailed_analysis": ""
-            }
+                return {
+                    "success": True,
+                    "evaluation": result.evaluation,
+                    "score": score,
+                    "detailed_analysis": result.evaluation
+                }
+            except Exception as e:
+                LLM_REQUESTS.inc(operation="evaluate", outcome="error")
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "evaluation": "",
+                    "score": 0.0,
+                    "detailed_analysis": ""
+                }
 
 # Global service instance
 llm_service = LLMService() 
@@ -0,0 +1,264 @@
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Any
+import networkx as nx
+
+from config import (
+    CHUNK_SIZE, RETRIEVAL_K, EMBED_BATCH_SIZE,
+    INGEST_EMBED_WORKERS, INGEST_CONCEPT_WORKERS, INGEST_PIPELINE_DEPTH
+)
+from metrics import stage, timed_stage
+from tracing import bind
+from utils import (
+    get_or_create_collection, embedding_fn, iter_paragraph_slices, chunk_hash,
+    extract_concepts, add_chunk_edges, remove_chunk_edges, copy_concept_graph
+)
+
+# Embedding and concept extraction are independent, so each gets its own executor
+_embed_executor = ThreadPoolExecutor(max_workers=INGEST_EMBED_WORKERS, thread_name_prefix="ingest-embed")
+_concept_executor = ThreadPoolExecutor(max_workers=INGEST_CONCEPT_WORKERS, thread_name_prefix="ingest-concepts")
+
+# Prefix of IDs derived from a material's text by text_material_id
+TEXT_ID_PREFIX = "text-"
+
+# A batch of (chunk_id, chunk, metadata) waiting on its embedding and concept futures
+Batch = List[Tuple[str, str, Dict[str, Any]]]
+PendingBatch = Tuple[Batch, Future, Future]
+
+@dataclass
+class MaterialRecord:
+    """Indexed state of a single study material"""
+    material_id: str
+    chunk_ids: List[str] = field(default_factory=list)
+    # Chunks that continue the previous chunk's paragraph mid-text
+    continued: Set[str] = field(default_factory=set)
+    metadata: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    concepts: Dict[str, List[Tuple[str, str, str]]] = field(default_factory=dict)
+    graph: nx.DiGraph = field(default_factory=nx.DiGraph)
+
+class MaterialStore:
+    """Service keeping study material chunks and concept graphs indexed incrementally"""
+
+    def __init__(self):
+        self._materials: Dict[str, MaterialRecord] = {}
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+    @staticmethod
+    def _chunk_id(material_id: str, chunk: str, seen: Counter) -> str:
+        """Content-addressed chunk ID; repeated chunks get an occurrence suffix"""
+        digest = chunk_hash(chunk)
+        chunk_id = f"{material_id}:{digest}:{seen[digest]}"
+        seen[digest] += 1
+        return chunk_id
+
+    @staticmethod
+    def text_material_id(text: str) -> str:
+        """Content-derived ID so registering the same text twice reuses one material"""
+        return f"{TEXT_ID_PREFIX}{chunk_hash(text)}"
+
+    @staticmethod
+    def is_content_addressed(material_id: str) -> bool:
+        """Whether the ID is derived from the material's text, so its content must never change"""
+        return material_id.startswith(TEXT_ID_PREFIX)
+
+    def get(self, material_id: str) -> Optional[MaterialRecord]:
+        """Return the indexed record for a material, if any"""
+        return self._materials.get(material_id)
+
+    def list_ids(self) -> List[str]:
+        """Return the IDs of all indexed materials"""
+        return list(self._materials)
+
+    def version(self, material_id: str) -> Optional[str]:
+        """Content version of a material; changes whenever any of its chunks change"""
+        record = self._materials.get(material_id)
+        if not record:
+            return None
+        # Paragraph breaks between chunks are part of the text too
+        return chunk_hash("\n".join(f"+{cid}" if cid in record.continued else cid for cid in record.chunk_ids))
+
+    def text(self, material_id: str) -> str:
+        """Reassemble a material's text from its stored chunks, in document order
+
+        Slices of an over-long paragraph are joined back without a separator, so
+        words cut at a chunk boundary come back whole.
+        """
+        record = self._materials.get(material_id)
+        if not record or not record.chunk_ids:
+            return ""
+
+        stored = get_or_create_collection().get(ids=record.chunk_ids)
+        documents = dict(zip(stored['ids'], stored['documents']))
+        parts = []
+        for cid in record.chunk_ids:
+            if cid in documents:
+                if parts:
+                    parts.append("" if cid in record.continued else "\n\n")
+                parts.append(documents[cid])
+        return "".join(parts)
+
+    @staticmethod
+    def _embed(material_id: str, batch: Batch) -> None:
+        """Embed a batch of chunks and add them to the vector store"""
+        ids = [cid for cid, _, _ in batch]
+        chunks = [chunk for _, chunk, _ in batch]
+        with stage("embed"):
+            embeddings = embedding_fn(chunks)
+        with stage("vector_store_add"):
+            get_or_create_collection().add(
+                ids=ids,
+                documents=chunks,
+                embeddings=embeddings,
+                metadatas=[{"material_id": material_id, **metadata} for _, _, metadata in batch]
+            )
+
+    @staticmethod
+    def _extract(batch: Batch) -> List[List[Tuple[str, str, str]]]:
+        """Extract the concepts of each chunk in a batch"""
+        return [extract_concepts(chunk) for _, chunk, _ in batch]
+
+    def _submit(self, record: MaterialRecord, batch: Batch) -> PendingBatch:
+        """Start embedding and concept extraction of a batch concurrently"""
+        embedded = _embed_executor.submit(bind(self._embed), record.material_id, batch)
+        extracted = _concept_executor.submit(bind(self._extract), batch)
+        return batch, embedded, extracted
+
+    @staticmethod
+    def _join(record: MaterialRecord, graph: nx.DiGraph, pending: PendingBatch) -> None:
+        """Wait for a batch's stages and merge them into the material record and working graph"""
+        batch, embedded, extracted = pending
+        embedded.result()
+        for (cid, _, metadata), concepts in zip(batch, extracted.result()):
+            record.metadata[cid] = metadata
+            record.concepts[cid] = concepts
+            add_chunk_edges(graph, cid, concepts)
+
+    def _unindex(self, record: MaterialRecord, graph: nx.DiGraph, chunk_ids: List[str]) -> None:
+        """Delete chunks along with the edges they contributed to the working graph"""
+        if not chunk_ids:
+            return
+        get_or_create_collection().delete(ids=chunk_ids)
+        for cid in chunk_ids:
+            record.metadata.pop(cid, None)
+            remove_chunk_edges(graph, cid, record.concepts.pop(cid, []))
+
+    @timed_stage("index")
+    def _upsert(self, material_id: str, chunks: Iterable[Tuple[str, Dict[str, Any], bool]]) -> Dict[str, Any]:
+        """Index (chunk, metadata, continued) triples, embedding and parsing only chunks that changed"""
+        with self._locks[material_id]:
+            record = self._materials.get(material_id) or MaterialRecord(material_id=material_id)
+            old_ids = set(record.chunk_ids)
+            # Grading threads read record.graph without the lock, so changes go to a
+            # copy that replaces it in one assignment once the ingest succeeds
+            graph = copy_concept_graph(record.graph)
+            seen = Counter()
+            ids, added, batch, relabeled = [], [], [], []
+            continued = set()
+            # Batches whose embedding and concept stages are still running
+            pending: Deque[PendingBatch] = deque()
+
+            def submit(batch: Batch) -> None:
+                added.extend(cid for cid, _, _ in batch)
+                pending.append(self._submit(record, batch))
+                while len(pending) > INGEST_PIPELINE_DEPTH:
+                    self._join(record, graph, pending.popleft())
+
+            try:
+                for chunk, metadata, continues in chunks:
+                    cid = self._chunk_id(material_id, chunk, seen)
+                    ids.append(cid)
+                    if continues:
+                        continued.add(cid)
+                    if cid in old_ids:
+                        # Unchanged text that moved (e.g. to another page) only needs new metadata
+                        if record.metadata.get(cid, {}) != metadata:
+                            relabeled.append((cid, metadata))
+                        continue
+                    batch.append((cid, chunk, metadata))
+                    if len(batch) >= EMBED_BATCH_SIZE:
+                        submit(batch)
+                        batch = []
+                if batch:
+                    submit(batch)
+                while pending:
+                    self._join(record, graph, pending.popleft())
+            except Exception:
+                # Let in-flight stages finish, then roll back the partial ingest
+                wait([future for _, embedded, extracted in pending for future in (embedded, extracted)])
+                self._unindex(record, graph, added)
+                raise
+
+            if relabeled:
+                get_or_create_collection().update(
+                    ids=[cid for cid, _ in relabeled],
+                    metadatas=[{"material_id": material_id, **metadata} for _, metadata in relabeled]
+                )
+                record.metadata.update(relabeled)
+
+            new_ids = set(ids)
+            removed = [cid for cid in record.chunk_ids if cid not in new_ids]
+            self._unindex(record, graph, removed)
+
+            record.chunk_ids = ids
+            record.graph = graph
+            record.continued = continued
+            self._materials[material_id] = record
+
+        return {
+            "material_id": material_id,
+            "chunks": len(ids),
+            "added": len(added),
+            "removed": len(removed),
+            "unchanged": len(ids) - len(added)
+        }
+
+    def upsert_stream(self, material_id: str, pieces: Iterable[str]) -> Dict[str, Any]:
+        """Index a material from a text stream, embedding and parsing only changed chunks
+
+        Chunks are embedded and parsed in batches as they arrive, so memory stays
+        bounded by the batch size and pipeline depth rather than the size of the material.
+        """
+        chunks = iter_paragraph_slices(pieces, CHUNK_SIZE)
+        return self._upsert(material_id, ((chunk, {}, continues) for chunk, continues in chunks))
+
+    def upsert_sections(self, material_id: str, sections: Iterable[Tuple[Dict[str, Any], str]]) -> Dict[str, Any]:
+        """Index a material from extracted document sections, keeping their page metadata"""
+        def chunks():
+            for metadata, text in sections:
+                for chunk, continues in iter_paragraph_slices([text], CHUNK_SIZE):
+                    yield chunk, metadata, continues
+        return self._upsert(material_id, chunks())
+
+    def upsert(self, material_id: str, text: str) -> Dict[str, Any]:
+        """Index a material, embedding and parsing only the chunks that changed"""
+        return self.upsert_stream(material_id, [text])
+
+    @timed_stage("retrieve")
+    def retrieve(self, material_id: str, question: str, k: int = RETRIEVAL_K) -> List[str]:
+        """Retrieve the chunks of one material most relevant to a question"""
+        record = self._materials.get(material_id)
+        if not record or not record.chunk_ids:
+            return []
+
+        collection = get_or_create_collection()
+        results = collection.query(
+            query_texts=[question],
+            n_results=min(k, len(record.chunk_ids)),
+            where={"material_id": material_id}
+        )
+        return results['documents'][0]
+
+    def delete(self, material_id: str) -> bool:
+        """Remove a material and all of its chunks"""
+        with self._locks[material_id]:
+            record = self._materials.pop(material_id, None)
+            if record and record.chunk_ids:
+                get_or_create_collection().delete(ids=record.chunk_ids)
+        # Per-request materials come and go, so their locks must not pile up
+        self._locks.pop(material_id, None)
+        return record is not None
+
+# Global store instance
+material_store = MaterialStore()
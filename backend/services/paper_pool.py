@@ -0,0 +1,116 @@
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from config import PAPER_POOL_SIZE, PAPER_POOL_WORKERS, PAPER_REPAIR
+from metrics import CACHE_REQUESTS
+from services.llm_service import llm_service
+from services.material_store import material_store
+from services.usage import usage_ledger, BudgetExceeded
+from services.paper_repair import repair_paper
+from services.admission import admission, Overloaded
+from utils import parse_paper
+
+# A pooled paper and the material version it was generated from
+PooledPaper = Tuple[str, Dict[str, Any]]
+
+class PaperPool:
+    """
+    Service keeping pre-generated question paper variants ready per material.
+
+    Papers are generated in background threads and tagged with the material's
+    content version, so papers generated before an update are never served.
+    """
+
+    def __init__(self, size: int = PAPER_POOL_SIZE, workers: int = PAPER_POOL_WORKERS):
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="paper-pool")
+        self._papers: Dict[str, Deque[PooledPaper]] = defaultdict(deque)
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._enabled: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def enable(self, material_id: str) -> None:
+        """Keep a material's pool filled from now on and start filling it"""
+        with self._lock:
+            self._enabled.add(material_id)
+        self.fill(material_id)
+
+    def enabled(self, material_id: str) -> bool:
+        with self._lock:
+            return material_id in self._enabled
+
+    def fill(self, material_id: str) -> int:
+        """Schedule background generation until the pool is full; returns the number scheduled"""
+        version = material_store.version(material_id)
+        with self._lock:
+            if material_id not in self._enabled or version is None:
+                return 0
+            papers = self._papers[material_id]
+            # Drop papers generated from an older version of the material
+            while papers and papers[0][0] != version:
+                papers.popleft()
+            missing = self.size - len(papers) - self._pending[material_id]
+            self._pending[material_id] += max(missing, 0)
+
+        for _ in range(missing):
+            self._executor.submit(self._generate, material_id, version)
+        return max(missing, 0)
+
+    def _generate(self, material_id: str, version: str) -> None:
+        """Generate one paper variant and add it to the pool if the material is unchanged"""
+        usage_ledger.start_request("paper_pool")
+        usage_ledger.set_material(material_id)
+        # Pool papers only use LLM capacity that requests leave spare
+        admission.start_request("background", job=material_id)
+        try:
+            if material_store.version(material_id) != version:
+                return
+            study_text = material_store.text(material_id)
+            result = llm_service.generate_question_paper(study_text)
+            if not result["success"]:
+                return
+            paper = parse_paper(result["question_paper"])
+            if PAPER_REPAIR:
+                paper = repair_paper(paper, study_text)
+            with self._lock:
+                if material_id in self._enabled and material_store.version(material_id) == version:
+                    self._papers[material_id].append((version, paper))
+        except (BudgetExceeded, Overloaded):
+            # Leave the pool short; requests fall back to generating on demand
+            return
+        finally:
+            usage_ledger.end_request()
+            admission.end_request()
+            with self._lock:
+                self._pending[material_id] -= 1
+
+    def take(self, material_id: str) -> Optional[Dict[str, Any]]:
+        """Pop a ready paper for the material's current version and refill the pool in the background"""
+        version = material_store.version(material_id)
+        paper = None
+        with self._lock:
+            papers = self._papers.get(material_id)
+            while papers:
+                paper_version, candidate = papers.popleft()
+                if paper_version == version:
+                    paper = candidate
+                    break
+        CACHE_REQUESTS.inc(cache="paper_pool", result="miss" if paper is None else "hit")
+        self.fill(material_id)
+        return paper
+
+    def ready(self, material_id: str) -> int:
+        """Number of papers ready for a material"""
+        with self._lock:
+            return len(self._papers.get(material_id, ()))
+
+    def discard(self, material_id: str) -> None:
+        """Forget a material's pool, e.g. after the material is deleted"""
+        with self._lock:
+            self._enabled.discard(material_id)
+            self._papers.pop(material_id, None)
+
+# Global pool instance
+paper_pool = PaperPool()
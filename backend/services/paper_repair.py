@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import PAPER_TOTAL_MARKS, PAPER_ALLOWED_MARKS
+from metrics import stage
+from services.llm_service import llm_service
+from services.usage import BudgetExceeded
+from services.admission import Overloaded
+from utils import extract_questions_from_paper, format_paper, paper_issues
+
+def fewest_questions(allowed_marks: Sequence[int], limit: int) -> List[Optional[List[int]]]:
+    """For every total up to limit, the fewest allowed-mark questions summing to it (None if impossible)"""
+    best: List[Optional[List[int]]] = [[]] + [None] * limit
+    for total in range(1, limit + 1):
+        for marks in allowed_marks:
+            previous = best[total - marks] if marks <= total else None
+            if previous is not None and (best[total] is None or len(previous) + 1 < len(best[total])):
+                best[total] = previous + [marks]
+    return best
+
+# A paper total the allowed marks cannot add up to could never be met or repaired
+if fewest_questions(PAPER_ALLOWED_MARKS, PAPER_TOTAL_MARKS)[PAPER_TOTAL_MARKS] is None:
+    raise ValueError(
+        f"PAPER_TOTAL_MARKS={PAPER_TOTAL_MARKS} cannot be made from questions of "
+        f"{', '.join(map(str, PAPER_ALLOWED_MARKS))} marks"
+    )
+
+def plan_repair(marks: List[int], total_marks: int = PAPER_TOTAL_MARKS,
+                allowed_marks: Sequence[int] = PAPER_ALLOWED_MARKS) -> Optional[Tuple[List[int], List[int]]]:
+    """
+    Choose which questions to drop and which marks to add so a paper totals total_marks.
+
+    Questions with disallowed marks are always dropped. Among the rest, a
+    subset-sum over the droppable totals is combined with the fewest new
+    questions for each remaining shortfall, preferring the plan with the
+    fewest new questions (each one costs LLM tokens) and then the fewest
+    dropped ones. Returns (indices to drop, marks of questions to add), or
+    None if total_marks cannot be made from allowed_marks at all.
+    """
+    drop = [i for i, m in enumerate(marks) if m not in allowed_marks]
+    kept = [i for i, m in enumerate(marks) if m in allowed_marks]
+    kept_total = sum(marks[i] for i in kept)
+
+    # Fewest kept questions whose marks sum to each droppable total, dropping from the end first
+    dropped: Dict[int, List[int]] = {0: []}
+    for i in reversed(kept):
+        for total, indices in list(dropped.items()):
+            candidate = total + marks[i]
+            if candidate not in dropped or len(indices) + 1 < len(dropped[candidate]):
+                dropped[candidate] = indices + [i]
+
+    additions = fewest_questions(allowed_marks, total_marks)
+    best: Optional[Tuple[Tuple[int, int], List[int], List[int]]] = None
+    for total, indices in dropped.items():
+        shortfall = total_marks - (kept_total - total)
+        if 0 <= shortfall <= total_marks and additions[shortfall] is not None:
+            cost = (len(additions[shortfall]), len(indices))
+            if best is None or cost < best[0]:
+                best = (cost, indices, additions[shortfall])
+
+    # Otherwise dropping every kept question leaves a solvable shortfall of total_marks
+    if best is None:
+        return None
+    _, indices, add = best
+    return sorted(drop + indices), sorted(add)
+
+def repair_paper(paper: Dict[str, Any], study_text: str) -> Dict[str, Any]:
+    """
+    Fix a parsed paper that breaks the marks rules by regenerating only the questions it needs.
+
+    Returns the paper unchanged if it is valid, if no plan can fix it, or if
+    the replacement questions cannot be generated (their issues are kept on
+    the paper).
+    A repaired paper lists the indices of the questions it dropped.
+    """
+    if not paper["issues"]:
+        return paper
+
+    questions = paper["questions"]
+    plan = plan_repair([q["marks"] for q in questions])
+    if plan is None:
+        return paper
+    drop, add = plan
+    dropped = set(drop)
+    kept = [q for i, q in enumerate(questions) if i not in dropped]
+
+    new_questions: List[Dict[str, Any]] = []
+    if add:
+        try:
+            result = llm_service.generate_questions(study_text, add, [q["question_text"] for q in kept])
+        except (BudgetExceeded, Overloaded):
+            return paper
+        if not result["success"]:
+            return paper
+        new_questions = extract_questions_from_paper(result["questions"])
+
+    with stage("parse"):
+        # Keep only replacements matching the planned marks, in case the LLM strays
+        wanted = list(add)
+        accepted = []
+        for q in new_questions:
+            if q["marks"] in wanted:
+                wanted.remove(q["marks"])
+                accepted.append(q)
+        repaired = kept + accepted
+        issues = paper_issues(repaired)
+
+    return {
+        "questions": repaired,
+        "total_marks": sum(q["marks"] for q in repaired),
+        "raw_paper": format_paper(repaired),
+        "issues": issues,
+        "dropped": drop,
+        "regenerated_questions": len(accepted)
+    }
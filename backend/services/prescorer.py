@@ -0,0 +1,98 @@
+import re
+from typing import Any, Dict, List, Optional, Set
+import numpy as np
+
+from config import (
+    PRESCORE_ACCEPT_SIMILARITY, PRESCORE_REJECT_SIMILARITY,
+    PRESCORE_ACCEPT_COVERAGE, PRESCORE_REJECT_COVERAGE
+)
+from utils import embedding_fn
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while
+who whom why will with would you your yours
+""".split())
+
+def keywords(text: str) -> Set[str]:
+    """Lowercase content words of a text, without stopwords and single letters; numbers are kept"""
+    return {w for w in re.findall(r"[a-z0-9]+", text.lower()) if (len(w) > 1 or w.isdigit()) and w not in STOPWORDS}
+
+class PreScorer:
+    """Service scoring answers locally when the outcome is clear enough to skip the LLM"""
+
+    def __init__(
+        self,
+        accept_similarity: float = PRESCORE_ACCEPT_SIMILARITY,
+        reject_similarity: float = PRESCORE_REJECT_SIMILARITY,
+        accept_coverage: float = PRESCORE_ACCEPT_COVERAGE,
+        reject_coverage: float = PRESCORE_REJECT_COVERAGE
+    ):
+        self.accept_similarity = accept_similarity
+        self.reject_similarity = reject_similarity
+        self.accept_coverage = accept_coverage
+        self.reject_coverage = reject_coverage
+
+    @staticmethod
+    def _result(score: float, max_marks: int, reason: str) -> Dict[str, Any]:
+        """Build a result shaped like LLMService.evaluate_answer"""
+        evaluation = f"Score: {score:g}/{max_marks}\nFeedback: {reason}"
+        return {"success": True, "evaluation": evaluation, "score": score, "detailed_analysis": evaluation}
+
+    def signals(self, student_answer: str, reference_answer: str, chunks: List[str]) -> Dict[str, float]:
+        """
+        Compute the local grading signals for an answer.
+
+        similarity is the cosine similarity between the answer and the reference
+        answer embeddings. coverage is the share of the reference answer's key
+        terms found in the answer, where key terms are reference keywords that
+        also occur in the retrieved study chunks (all reference keywords if none do).
+        """
+        reference_terms = keywords(reference_answer)
+        key_terms = reference_terms & keywords(" ".join(chunks)) or reference_terms
+        answer_terms = keywords(student_answer)
+        coverage = len(key_terms & answer_terms) / len(key_terms) if key_terms else 0.0
+
+        vectors = np.asarray(embedding_fn([student_answer, reference_answer]), dtype=float)
+        norms = np.linalg.norm(vectors, axis=1)
+        similarity = float(vectors[0] @ vectors[1] / (norms[0] * norms[1])) if norms.all() else 0.0
+
+        return {"similarity": similarity, "coverage": coverage}
+
+    def score(self, student_answer: str, reference_answer: str, max_marks: int,
+              chunks: List[str]) -> Optional[Dict[str, Any]]:
+        """Score an answer locally, or return None if it should be escalated to the LLM"""
+        if not student_answer.strip():
+            return self._result(0.0, max_marks, "The answer is blank.")
+        if not keywords(reference_answer):
+            # Short references like "No" or "7" leave nothing to measure coverage against
+            return None
+
+        signals = self.signals(student_answer, reference_answer, chunks)
+        similarity, coverage = signals["similarity"], signals["coverage"]
+        detail = f"(similarity {similarity:.2f}, key term coverage {coverage:.0%})"
+
+        if similarity >= self.accept_similarity and coverage >= self.accept_coverage:
+            return self._result(float(max_marks), max_marks, f"The answer matches the reference answer {detail}.")
+        if similarity <= self.reject_similarity and coverage <= self.reject_coverage:
+            return self._result(0.0, max_marks, f"The answer does not address the question {detail}.")
+        return None
+
+    def estimate(self, student_answer: str, reference_answer: str, max_marks: int,
+                 chunks: List[str]) -> Dict[str, Any]:
+        """Score any answer from the local signals alone, for when the LLM cannot be used"""
+        result = self.score(student_answer, reference_answer, max_marks, chunks)
+        if result is not None:
+            return result
+
+        signals = self.signals(student_answer, reference_answer, chunks)
+        fraction = min(1.0, max(0.0, (signals["similarity"] + signals["coverage"]) / 2))
+        score = round(fraction * max_marks * 2) / 2
+        detail = f"(similarity {signals['similarity']:.2f}, key term coverage {signals['coverage']:.0%})"
+        return self._result(score, max_marks, f"Estimated locally because the LLM token budget is exhausted {detail}.")
+
+# Global service instance
+pre_scorer = PreScorer()
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import dspy
+
+from config import DSPY_PROGRAM_DIR
+
+def signature_fingerprint(signature: Any) -> Dict[str, Any]:
+    """Describe a signature's instructions and fields, which compiled demos depend on"""
+    fields = []
+    for name, field in signature.fields.items():
+        extra = field.json_schema_extra or {}
+        fields.append([name, extra.get("__dspy_field_type"), extra.get("desc")])
+    return {"instructions": signature.instructions, "fields": fields}
+
+def program_version(module: dspy.Module) -> str:
+    """
+    Version of a program's prompt layout.
+
+    Combines the module's PROGRAM_VERSION, bumped by hand whenever its prompt
+    assembly changes, with the fingerprints of its predictors' signatures.
+    A compiled artifact is only loaded into a program of the same version.
+    """
+    layout = {
+        "module": type(module).__name__,
+        "version": getattr(module, "PROGRAM_VERSION", 0),
+        "predictors": {name: signature_fingerprint(p.signature) for name, p in module.named_predictors()}
+    }
+    return hashlib.sha256(json.dumps(layout, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def program_paths(name: str, directory: str = DSPY_PROGRAM_DIR):
+    """Paths of a program's saved state and its manifest"""
+    return os.path.join(directory, f"{name}.json"), os.path.join(directory, f"{name}.manifest.json")
+
+def save_program(module: dspy.Module, name: str, backend: str, model: str, directory: str = DSPY_PROGRAM_DIR,
+                 metadata: Optional[Dict[str, Any]] = None) -> str:
+    """Save a compiled program with a manifest recording the versions and LM it was compiled for"""
+    os.makedirs(directory, exist_ok=True)
+    state_path, manifest_path = program_paths(name, directory)
+    module.save(state_path)
+    manifest = {
+        "name": name,
+        "program_version": program_version(module),
+        "dspy_version": getattr(dspy, "__version__", "unknown"),
+        "backend": backend,
+        "model": model,
+        "compiled_at": datetime.now(timezone.utc).isoformat(),
+        **(metadata or {})
+    }
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return state_path
+
+def load_program(module: dspy.Module, name: str, backend: str, model: str,
+                 directory: str = DSPY_PROGRAM_DIR) -> bool:
+    """
+    Load a compiled program's demos and instructions into module, if a compatible one is saved.
+
+    Returns False, leaving the module uncompiled, when there is no artifact or
+    it was compiled for another prompt layout, DSPy version, LLM backend or
+    model; demos bootstrapped from the stub server never reach a real model.
+    """
+    state_path, manifest_path = program_paths(name, directory)
+    if not os.path.exists(state_path) or not os.path.exists(manifest_path):
+        return False
+
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    expected = {
+        "program_version": program_version(module),
+        "dspy_version": getattr(dspy, "__version__", "unknown"),
+        "backend": backend,
+        "model": model
+    }
+    stale = [key for key, value in expected.items() if manifest.get(key) != value]
+    if stale:
+        print(f"⚠️ Ignoring compiled program '{name}': {', '.join(stale)} changed since it was compiled. "
+              f"Please run: python backend/compile_programs.py --programs {name} --synthetic 20 "
+              f"(or --dataset recorded.jsonl)")
+        return False
+
+    module.load(state_path)
+    return True
@@ -0,0 +1,177 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from config import RESULTS_STORE_SIZE, ANALYTICS_HISTOGRAM_BINS
+from metrics import timed_stage
+from utils import calculate_percentage
+
+# Questions are banded by their mean percentage score
+DIFFICULTY_BINS = [0, 50, 70, 85, 100]
+DIFFICULTY_LABELS = ["Very Hard", "Hard", "Moderate", "Easy"]
+
+def validate_results(results: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check a result set's score, max_marks and question_number columns, returning them numeric.
+
+    Scores must be non-negative numbers and max_marks non-negative whole numbers.
+    Without a question_number column each row counts as its own question,
+    numbered by position. Raises ValueError naming the offending 1-based data rows.
+    """
+    score = pd.to_numeric(results["score"], errors="coerce")
+    max_marks = pd.to_numeric(results["max_marks"], errors="coerce")
+    if "question_number" in results.columns:
+        question_number = pd.to_numeric(results["question_number"], errors="coerce")
+    else:
+        question_number = pd.Series(np.arange(1, len(results) + 1), index=results.index)
+
+    checks = (
+        (score.isna() | (score < 0), "score is missing or not a non-negative number"),
+        (max_marks.isna() | (max_marks < 0) | (max_marks % 1 != 0), "max_marks is missing or not a non-negative integer"),
+        (question_number.isna() | (question_number % 1 != 0), "question_number is not an integer")
+    )
+    problems = []
+    for invalid, reason in checks:
+        rows = np.flatnonzero(invalid.to_numpy()) + 1
+        if len(rows):
+            shown = ", ".join(map(str, rows[:10])) + (", ..." if len(rows) > 10 else "")
+            problems.append(f"{reason} in rows {shown}")
+    if problems:
+        raise ValueError("; ".join(problems))
+
+    return results.assign(score=score, max_marks=max_marks.astype(int), question_number=question_number.astype(int))
+
+def compact_results(results: pd.DataFrame) -> pd.DataFrame:
+    """Validate a result set and keep only the columns analytics need, in compact dtypes"""
+    results = validate_results(results)
+    if "student_id" not in results.columns:
+        results = results.assign(student_id="")
+    return pd.DataFrame({
+        "student_id": results["student_id"].fillna("").astype(str).astype("category"),
+        "question_number": pd.to_numeric(results["question_number"], downcast="integer"),
+        "score": results["score"].astype("float32"),
+        "max_marks": pd.to_numeric(results["max_marks"], downcast="integer")
+    })
+
+@timed_stage("analytics")
+def compute_analytics(results: pd.DataFrame, bins: int = ANALYTICS_HISTOGRAM_BINS) -> Dict[str, Any]:
+    """Aggregate graded results per question, per student, by difficulty band and as a histogram"""
+    percentage = (results["score"] / results["max_marks"].where(results["max_marks"] > 0) * 100).fillna(0.0)
+    total_score = float(results["score"].sum())
+    total_max_marks = int(results["max_marks"].sum())
+
+    questions = results.assign(percentage=percentage).groupby("question_number", sort=True).agg(
+        answers=("score", "size"),
+        mean_score=("score", "mean"),
+        max_marks=("max_marks", "max"),
+        mean_percentage=("percentage", "mean")
+    )
+    questions["difficulty"] = pd.cut(
+        questions["mean_percentage"], bins=DIFFICULTY_BINS, labels=DIFFICULTY_LABELS, include_lowest=True
+    ).astype(str)
+
+    students: List[Dict[str, Any]] = []
+    if results["student_id"].astype(str).ne("").any():
+        totals = results.groupby("student_id", observed=True, sort=False)[["score", "max_marks"]].sum()
+        students = [
+            {
+                "student_id": str(student_id),
+                "total_score": float(row.score),
+                "total_max_marks": int(row.max_marks),
+                "percentage": calculate_percentage(float(row.score), int(row.max_marks))
+            }
+            for student_id, row in zip(totals.index, totals.itertuples(index=False))
+        ]
+
+    bands = questions.groupby("difficulty")["mean_percentage"].agg(["size", "mean"])
+    difficulty = [
+        {"band": band, "questions": int(bands.loc[band, "size"]), "mean_percentage": float(bands.loc[band, "mean"])}
+        for band in DIFFICULTY_LABELS if band in bands.index
+    ]
+
+    counts, edges = np.histogram(percentage.clip(0, 100), bins=bins, range=(0, 100))
+    histogram = [
+        {"start": float(edges[i]), "end": float(edges[i + 1]), "count": int(count)}
+        for i, count in enumerate(counts)
+    ]
+
+    std = results["score"].std()
+    return {
+        "summary": {
+            "answers": len(results),
+            "total_score": total_score,
+            "total_max_marks": total_max_marks,
+            "percentage": calculate_percentage(total_score, total_max_marks),
+            "mean_score": float(results["score"].mean()) if len(results) else 0.0,
+            "median_score": float(results["score"].median()) if len(results) else 0.0,
+            "std_score": 0.0 if pd.isna(std) else float(std),
+            "mean_percentage": float(percentage.mean()) if len(results) else 0.0
+        },
+        "per_question": [
+            {
+                "question_number": int(question_number),
+                "answers": int(row.answers),
+                "mean_score": float(row.mean_score),
+                "max_marks": int(row.max_marks),
+                "mean_percentage": float(row.mean_percentage),
+                "difficulty": row.difficulty
+            }
+            for question_number, row in zip(questions.index, questions.itertuples(index=False))
+        ],
+        "per_student": students,
+        "difficulty": difficulty,
+        "histogram": histogram
+    }
+
+class ResultsStore:
+    """Service keeping recent graded result sets and caching their analytics"""
+
+    def __init__(self, size: int = RESULTS_STORE_SIZE):
+        self.size = size
+        self._results: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._analytics: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, results: pd.DataFrame) -> str:
+        """
+        Store a result set with score and max_marks (and optionally question_number and student_id) columns.
+
+        Raises ValueError if any row has a missing or invalid score, max_marks or question_number.
+        """
+        result_id = uuid.uuid4().hex[:16]
+        results = compact_results(results)
+        with self._lock:
+            self._results[result_id] = results
+            while len(self._results) > self.size:
+                evicted, _ = self._results.popitem(last=False)
+                self._analytics.pop(evicted, None)
+        return result_id
+
+    def analytics(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Aggregates of a stored result set, computed once; None if it is unknown"""
+        with self._lock:
+            results = self._results.get(result_id)
+            cached = self._analytics.get(result_id)
+            if results is not None:
+                self._results.move_to_end(result_id)
+        if results is None or cached is not None:
+            return cached
+
+        # Result sets never change, so their aggregates can be cached until eviction
+        computed = compute_analytics(results)
+        with self._lock:
+            if result_id in self._results:
+                self._analytics[result_id] = computed
+        return computed
+
+    def delete(self, result_id: str) -> bool:
+        """Forget a result set and its cached aggregates"""
+        with self._lock:
+            self._analytics.pop(result_id, None)
+            return self._results.pop(result_id, None) is not None
+
+# Global store instance
+results_store = ResultsStore()
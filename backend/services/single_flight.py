@@ -0,0 +1,58 @@
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict
+
+from metrics import COALESCED_REQUESTS
+
+def request_key(operation: str, *inputs: Any) -> str:
+    """Canonical hash of an operation and its inputs, equal for identical requests"""
+    payload = json.dumps([operation, *inputs], sort_keys=True, default=str, ensure_ascii=False)
+    return f"{operation}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+class SingleFlight:
+    """
+    Service coalescing identical concurrent calls into one in-flight computation.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it runs wait for it and receive the same result or
+    exception. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn for the key, or wait for the identical call already running"""
+        operation = key.partition(":")[0]
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            COALESCED_REQUESTS.inc(operation=operation)
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
+
+# Global single-flight instance
+single_flight = SingleFlight()
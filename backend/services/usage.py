@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config import LLM_USAGE_LOG, LLM_REQUEST_TOKEN_BUDGET, LLM_DAILY_TOKEN_BUDGET
+from metrics import LLM_TOKENS
+
+class BudgetExceeded(Exception):
+    """Raised before an LLM call that would exceed the request or daily token budget"""
+
+    def __init__(self, scope: str, used: int, budget: int):
+        self.scope = scope
+        super().__init__(f"LLM token budget exceeded for this {scope}: {used} of {budget} tokens used")
+
+@dataclass
+class RequestUsage:
+    """Tokens used by the request being served"""
+    endpoint: str
+    material_id: Optional[str] = None
+    tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens += tokens
+
+_current_request: ContextVar[Optional[RequestUsage]] = ContextVar("current_request_usage", default=None)
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+def _empty_totals() -> Dict[str, float]:
+    return {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0}
+
+class UsageLedger:
+    """Service recording the tokens and latency of every LLM call and enforcing token budgets"""
+
+    def __init__(self, log_path: str = LLM_USAGE_LOG,
+                 request_budget: int = LLM_REQUEST_TOKEN_BUDGET, daily_budget: int = LLM_DAILY_TOKEN_BUDGET):
+        self.log_path = log_path
+        self.request_budget = request_budget
+        self.daily_budget = daily_budget
+        self._lock = threading.Lock()
+        self._by_endpoint: Dict[str, Dict[str, float]] = defaultdict(_empty_totals)
+        self._by_material: Dict[str, Dict[str, float]] = defaultdict(_empty_totals)
+        self._day = _today()
+        self._day_tokens = self._load_day_tokens(self._day)
+
+    def _load_day_tokens(self, day: str) -> int:
+        """Sum today's tokens from the usage log so the daily budget survives restarts"""
+        if not self.log_path or not os.path.exists(self.log_path):
+            return 0
+        total = 0
+        with open(self.log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("timestamp", "").startswith(day):
+                    total += record.get("prompt_tokens", 0) + record.get("completion_tokens", 0)
+        return total
+
+    def start_request(self, endpoint: str) -> RequestUsage:
+        """Start accounting the current request's LLM usage under an endpoint"""
+        usage = RequestUsage(endpoint=endpoint)
+        _current_request.set(usage)
+        return usage
+
+    def end_request(self) -> None:
+        _current_request.set(None)
+
+    def set_material(self, material_id: str) -> None:
+        """Attribute the current request's LLM usage to a material"""
+        usage = _current_request.get()
+        if usage is not None:
+            usage.material_id = material_id
+
+    def check_budget(self, estimated_tokens: int = 0) -> None:
+        """Raise BudgetExceeded if a call of about estimated_tokens would go over a budget"""
+        usage = _current_request.get()
+        if self.request_budget and usage is not None and usage.tokens + estimated_tokens > self.request_budget:
+            raise BudgetExceeded("request", usage.tokens, self.request_budget)
+
+        with self._lock:
+            if self._day != _today():
+                self._day, self._day_tokens = _today(), 0
+            day_tokens = self._day_tokens
+        if self.daily_budget and day_tokens + estimated_tokens > self.daily_budget:
+            raise BudgetExceeded("day", day_tokens, self.daily_budget)
+
+    def record(self, operation: str, model: str, prompt_tokens: int, completion_tokens: int,
+               latency_ms: float, estimated: bool = False) -> None:
+        """Record one LLM call against the current request, its endpoint and material"""
+        tokens = prompt_tokens + completion_tokens
+        usage = _current_request.get()
+        endpoint = usage.endpoint if usage else "none"
+        material_id = usage.material_id if usage else None
+        if usage is not None:
+            usage.add(tokens)
+
+        with self._lock:
+            if self._day != _today():
+                self._day, self._day_tokens = _today(), 0
+            self._day_tokens += tokens
+            groups = [self._by_endpoint[endpoint]]
+            if material_id:
+                groups.append(self._by_material[material_id])
+            for totals in groups:
+                totals["calls"] += 1
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["latency_ms"] += latency_ms
+
+        LLM_TOKENS.inc(prompt_tokens, operation=operation, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, operation=operation, kind="completion")
+
+        if self.log_path:
+            line = json.dumps({
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "operation": operation,
+                "model": model,
+                "endpoint": endpoint,
+                "material_id": material_id,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency_ms": round(latency_ms, 3),
+                "estimated": estimated
+            })
+            with self._lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    @staticmethod
+    def _rows(groups: Dict[str, Dict[str, float]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "key": key,
+                "calls": int(totals["calls"]),
+                "prompt_tokens": int(totals["prompt_tokens"]),
+                "completion_tokens": int(totals["completion_tokens"]),
+                "total_tokens": int(totals["prompt_tokens"] + totals["completion_tokens"]),
+                "mean_latency_ms": totals["latency_ms"] / totals["calls"] if totals["calls"] else 0.0
+            }
+            for key, totals in groups.items()
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        """Usage aggregated per endpoint and per material, with today's budget state"""
+        with self._lock:
+            return {
+                "day": self._day,
+                "daily_tokens": self._day_tokens,
+                "daily_budget": self.daily_budget,
+                "request_budget": self.request_budget,
+                "by_endpoint": self._rows(self._by_endpoint),
+                "by_material": self._rows(self._by_material)
+            }
+
+# Global service instance
+usage_ledger = UsageLedger()
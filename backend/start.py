@@ -12,8 +12,8 @@ from pathlib import Path
 backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
 
-from main import app
-
+# The app is imported by uvicorn from "main:app", never here: spawned extraction
+# workers re-import this script, and must not load the models and stores with it
 if __name__ == "__main__":
     # Get configuration from environment
     host = os.getenv("HOST", "0.0.0.0")
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Deterministic OpenAI-compatible stub LLM server for offline load testing.
+
+Answers /v1/chat/completions in the field format DSPy's chat adapter parses,
+or as plain text for direct and streamed (stream=true) requests, with
+configurable latency, jitter and error injection. Replies depend only on
+the prompt, so repeated runs grade and generate identically. Point the backend
+at it with LLM_BACKEND=stub.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import re
+import time
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from config import (
+    STUB_LLM_HOST, STUB_LLM_PORT, STUB_LLM_LATENCY_MS, STUB_LLM_JITTER_MS,
+    STUB_LLM_ERROR_RATE, STUB_LLM_ERROR_STATUS, STUB_LLM_SEED, STUB_LLM_CHUNK_MS
+)
+
+# 5 x 2 + 2 x 5 + 3 x 10 = 50 marks, matching what QuestionGenModule asks for
+PAPER_MARKS = [2, 2, 2, 2, 2, 5, 5, 10, 10, 10]
+
+class StubSettings:
+    """Latency and error injection settings, shared by all requests"""
+
+    def __init__(self, latency_ms: float = STUB_LLM_LATENCY_MS, jitter_ms: float = STUB_LLM_JITTER_MS,
+                 error_rate: float = STUB_LLM_ERROR_RATE, error_status: int = STUB_LLM_ERROR_STATUS,
+                 seed: int = STUB_LLM_SEED, chunk_ms: float = STUB_LLM_CHUNK_MS):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.chunk_ms = chunk_ms
+
+settings = StubSettings()
+app = FastAPI(title="Stub LLM", description="Deterministic OpenAI-compatible stub for load testing")
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Flatten chat messages into one prompt string"""
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+def digest(text: str) -> int:
+    """Stable integer hash of a prompt"""
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def stub_paper(prompt: str, paper_marks: List[int] = PAPER_MARKS) -> str:
+    """Build a question paper with the given marks from words of the study material"""
+    words = re.findall(r"[A-Za-z]{5,}", prompt.split("STUDY MATERIAL:")[-1]) or ["the material"]
+    lines = []
+    for i, marks in enumerate(paper_marks, 1):
+        topic = words[digest(f"{prompt}:{i}") % len(words)]
+        lines.append(f"{i}. Explain the role of {topic} in the study material. ({marks} marks)")
+        lines.append(f"Answer: {topic.capitalize()} is discussed in the study material.")
+        lines.append("")
+    return "\n".join(lines)
+
+def stub_questions(prompt: str) -> str:
+    """Build just the questions a paper repair asks for"""
+    match = re.search(r"worth these marks in this order:\s*([\d, ]+)", prompt)
+    marks = [int(m) for m in re.findall(r"\d+", match.group(1))] if match else [2]
+    return stub_paper(prompt, marks)
+
+def stub_evaluation(prompt: str) -> str:
+    """Build an evaluation with a deterministic score out of the question's maximum marks"""
+    match = re.search(r"(?:Maximum Marks:|\[\[ ## max_marks ## \]\])\s*(\d+)", prompt)
+    max_marks = int(match.group(1)) if match else 10
+    score = (digest(prompt) % (2 * max_marks + 1)) / 2
+    return (
+        f"Score: {score:g}/{max_marks}\n"
+        "Rubric: Accuracy, completeness and use of the study material.\n"
+        "Feedback: Stub evaluation for load testing."
+    )
+
+def stub_reply(prompt: str) -> str:
+    """Answer in DSPy's chat adapter format for whichever output field is requested, or as plain text"""
+    if "[[ ## question_paper ## ]]" in prompt:
+        field, value = "question_paper", stub_paper(prompt)
+    elif "[[ ## questions ## ]]" in prompt:
+        field, value = "questions", stub_questions(prompt)
+    elif "[[ ## evaluation ## ]]" in prompt:
+        field, value = "evaluation", stub_evaluation(prompt)
+    elif "Generate a question paper" in prompt:
+        return stub_paper(prompt)
+    else:
+        return stub_evaluation(prompt)
+    return f"[[ ## {field} ## ]]\n{value}\n\n[[ ## completed ## ]]"
+
+def usage(prompt: str, reply: str) -> Dict[str, int]:
+    """Token counts of about four characters per token"""
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(reply) // 4
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+async def stream_reply(prompt: str, reply: str, model: str, include_usage: bool) -> AsyncIterator[str]:
+    """Send the reply line by line as OpenAI-style chat completion chunks"""
+    chunk_id = f"stub-{digest(prompt):08x}"
+
+    def chunk(delta: Dict[str, Any], finish_reason: Any = None, **extra: Any) -> str:
+        body = {
+            "id": chunk_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for line in reply.splitlines(keepends=True):
+        await asyncio.sleep(settings.chunk_ms / 1000)
+        yield chunk({"content": line})
+    yield chunk({}, "stop", **({"usage": usage(prompt, reply)} if include_usage else {}))
+    yield "data: [DONE]\n\n"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    delay_ms = max(0.0, settings.latency_ms + settings.rng.uniform(-settings.jitter_ms, settings.jitter_ms))
+    fail = settings.rng.random() < settings.error_rate
+    await asyncio.sleep(delay_ms / 1000)
+
+    if fail:
+        return JSONResponse(
+            status_code=settings.error_status,
+            content={"error": {"message": "Injected stub error", "type": "stub_error"}}
+        )
+
+    prompt = prompt_text(body.get("messages", []))
+    reply = stub_reply(prompt)
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            stream_reply(prompt, reply, body.get("model", "stub"), include_usage),
+            media_type="text/event-stream"
+        )
+
+    return {
+        "id": f"stub-{digest(prompt):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": reply},
+            "finish_reason": "stop"
+        }],
+        "usage": usage(prompt, reply)
+    }
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the stub LLM server")
+    parser.add_argument("--host", default=STUB_LLM_HOST)
+    parser.add_argument("--port", type=int, default=STUB_LLM_PORT)
+    parser.add_argument("--latency-ms", type=float, default=STUB_LLM_LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=STUB_LLM_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=STUB_LLM_ERROR_RATE)
+    parser.add_argument("--error-status", type=int, default=STUB_LLM_ERROR_STATUS)
+    parser.add_argument("--seed", type=int, default=STUB_LLM_SEED)
+    parser.add_argument("--chunk-ms", type=float, default=STUB_LLM_CHUNK_MS)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.seed, args.chunk_ms)
+
+    print(f"🧪 Starting stub LLM server")
+    print(f"📍 Server: http://{args.host}:{args.port}/v1")
+    print(f"⏱️ Latency: {args.latency_ms}ms ± {args.jitter_ms}ms, error rate {args.error_rate}")
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,88 @@
+import os
+from typing import BinaryIO, List
+import pandas as pd
+
+# Optional columnar formats
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+TABLE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+def table_format(filename: str) -> str:
+    """Return the table format for a filename, raising ValueError if it is unsupported"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if not extension:
+        return "csv"
+    fmt = TABLE_FORMATS.get(extension)
+    if fmt is None:
+        supported = ", ".join(sorted(TABLE_FORMATS))
+        raise ValueError(f"Unsupported table type '{extension}'. Supported types: {supported}")
+    if fmt != "csv" and pa is None:
+        raise ValueError("Parquet and Arrow support requires pyarrow. Please run: pip install pyarrow")
+    return fmt
+
+def read_csv_columns(file: BinaryIO, columns: List[str]) -> pd.DataFrame:
+    """
+    Parse the given columns of a CSV, every value as a string.
+
+    Explicit dtypes skip type inference, so IDs like "007" keep their leading
+    zeros; numeric columns are validated row by row later. Other columns are
+    skipped by the parser rather than loaded and dropped.
+    """
+    return pd.read_csv(
+        file,
+        usecols=lambda column: column in columns,
+        dtype={column: str for column in columns},
+        encoding="utf-8"
+    )
+
+def read_arrow(file: BinaryIO, columns: List[str]) -> pd.DataFrame:
+    """Read the given columns of an Arrow IPC file or stream"""
+    try:
+        table = pa.ipc.open_file(file).read_all()
+    except pa.ArrowInvalid:
+        file.seek(0)
+        table = pa.ipc.open_stream(file).read_all()
+    return table.select([c for c in table.column_names if c in columns]).to_pandas(split_blocks=True, self_destruct=True)
+
+def read_parquet(file: BinaryIO, columns: List[str]) -> pd.DataFrame:
+    """Read only the given columns of a Parquet file"""
+    parquet = pq.ParquetFile(file)
+    present = [c for c in parquet.schema_arrow.names if c in columns]
+    return parquet.read(columns=present).to_pandas(split_blocks=True, self_destruct=True)
+
+def read_table(file: BinaryIO, filename: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Read the given columns of an uploaded CSV, Parquet or Arrow IPC table.
+
+    Columns missing from the table are left out for the caller to report.
+    Raises ValueError if the format is unsupported, the table cannot be read
+    or it has no rows.
+    """
+    fmt = table_format(filename)
+    try:
+        if fmt == "parquet":
+            table = read_parquet(file, columns)
+        elif fmt == "arrow":
+            table = read_arrow(file, columns)
+        else:
+            table = read_csv_columns(file, columns)
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ValueError(f"Failed to read {fmt} table '{filename}': {str(e)}")
+    except Exception as e:
+        if pa is not None and isinstance(e, pa.ArrowException):
+            raise ValueError(f"Failed to read {fmt} table '{filename}': {str(e)}")
+        raise
+    if table.empty:
+        raise ValueError(f"Table '{filename}' has no rows")
+    return table
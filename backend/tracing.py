@@ -0,0 +1,136 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Trace of the request being served, if it is traced
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+# (start, end) perf_counter intervals of the child spans of the innermost open span
+_open_span: ContextVar[Optional[List[Tuple[float, float]]]] = ContextVar("open_span", default=None)
+_write_lock = threading.Lock()
+
+def _covered(intervals: List[Tuple[float, float]], start: float, end: float) -> float:
+    """Seconds of [start, end] covered by the union of sorted intervals"""
+    covered, reach = 0.0, start
+    for lo, hi in intervals:
+        lo, hi = max(lo, reach), min(hi, end)
+        if hi > lo:
+            covered += hi - lo
+            reach = hi
+    return covered
+
+class Trace:
+    """Timed spans recorded while serving one request"""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.started = datetime.now(timezone.utc)
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def add(self, name: str, start: float, duration: float,
+            children: Optional[List[Tuple[float, float]]] = None,
+            parent: Optional[List[Tuple[float, float]]] = None) -> None:
+        """
+        Record a span from a perf_counter start time and a duration in seconds.
+
+        children are the intervals of spans nested inside this one; the span's
+        self time excludes the time they cover, counting overlapping children
+        on parallel threads once. The span's own interval is added to parent.
+        """
+        with self._lock:
+            covered = _covered(sorted(children or []), start, start + duration)
+        span = {
+            "name": name,
+            "start_ms": round((start - self._start) * 1000, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "self_ms": round(max(0.0, duration - covered) * 1000, 3),
+            "thread": threading.current_thread().name
+        }
+        with self._lock:
+            self.spans.append(span)
+            if parent is not None:
+                parent.append((start, start + duration))
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Self milliseconds per span name, excluding time spent in nested spans.
+
+        Nested stages are not double-counted, but spans run in parallel threads
+        still add up, so the total can exceed the request's wall time.
+        """
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for span in self.spans:
+                totals[span["name"]] = totals.get(span["name"], 0.0) + span["self_ms"]
+        return {name: round(ms, 3) for name, ms in totals.items()}
+
+    def to_dict(self, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "started": self.started.isoformat(),
+            "duration_ms": round(self.elapsed_ms(), 3),
+            **fields,
+            "breakdown_ms": self.breakdown(),
+            "spans": spans
+        }
+
+def start_trace() -> Trace:
+    """Start tracing the current request"""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+def end_trace() -> None:
+    """Stop tracing the current request"""
+    _current_trace.set(None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Record the enclosed block as a span of the current trace, nested in the open span"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    parent = _open_span.get()
+    children: List[Tuple[float, float]] = []
+    token = _open_span.set(children)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _open_span.reset(token)
+        trace.add(name, start, duration, children, parent)
+
+def bind(fn: Callable) -> Callable:
+    """Carry the current trace and other request context into fn when it runs on a worker thread"""
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        # Each call gets its own copy so several worker threads can run it at once
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def write_trace(path: str, record: Dict[str, Any]) -> None:
+    """Append a trace record to a JSONL file"""
+    line = json.dumps(record) + "\n"
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
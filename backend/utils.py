@@ -5,10 +5,15 @@ import networkx as nx
 import spacy
 from sentence_transformers import SentenceTransformer
 from chromadb.utils import embedding_functions
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator
 import base64
+import hashlib
 import io
 
+from metrics import timed_stage
+from config import PAPER_TOTAL_MARKS, PAPER_ALLOWED_MARKS
+from tables import read_csv_columns
+
 # Initialize spaCy and embedding model
 try:
     nlp = spacy.load("en_core_web_sm")
@@ -38,6 +43,54 @@ def split_text(text: str, chunk_size: int = 400) -> List[str]:
     """Split text into chunks of specified size"""
     return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
 
+def iter_paragraph_slices(pieces: Iterable[str], chunk_size: int = 400) -> Iterator[Tuple[str, bool]]:
+    """Yield (chunk, continues_previous) for paragraph-aligned chunks of a text stream
+
+    Chunk boundaries depend only on the paragraph they fall in, so editing one
+    paragraph leaves the chunks of every other paragraph unchanged. Full slices of
+    an over-long paragraph are emitted as soon as they arrive, so the buffer never
+    holds much more than one chunk regardless of the input size. Slices after the
+    first of a paragraph are flagged, since they may start mid-word and must be
+    joined to the previous chunk without a paragraph break.
+    """
+    buffer = ""
+    continued = False  # the buffered paragraph already had slices emitted
+
+    def slices(paragraph: str, continues: bool) -> Iterator[Tuple[str, bool]]:
+        for i, chunk in enumerate(split_text(paragraph, chunk_size)):
+            yield chunk, continues or i > 0
+
+    for piece in pieces:
+        buffer += piece
+        *paragraphs, buffer = re.split(r"\n\s*\n", buffer)
+        for paragraph in paragraphs:
+            paragraph = paragraph.rstrip() if continued else paragraph.strip()
+            if paragraph:
+                yield from slices(paragraph, continued)
+            continued = False
+        if not continued:
+            buffer = buffer.lstrip()
+        while len(buffer.rstrip()) > chunk_size:
+            yield buffer[:chunk_size], continued
+            buffer = buffer[chunk_size:]
+            continued = True
+
+    paragraph = buffer.rstrip() if continued else buffer.strip()
+    if paragraph:
+        yield from slices(paragraph, continued)
+
+def iter_paragraph_chunks(pieces: Iterable[str], chunk_size: int = 400) -> Iterator[str]:
+    """Yield paragraph-aligned chunks of at most chunk_size characters from a text stream"""
+    return (chunk for chunk, _ in iter_paragraph_slices(pieces, chunk_size))
+
+def split_paragraphs(text: str, chunk_size: int = 400) -> List[str]:
+    """Split text into paragraph-aligned chunks of at most chunk_size characters"""
+    return list(iter_paragraph_chunks([text], chunk_size))
+
+def chunk_hash(chunk: str) -> str:
+    """Stable content hash identifying a chunk across material versions"""
+    return hashlib.sha1(chunk.encode('utf-8')).hexdigest()[:16]
+
 def store_chunks(text: str) -> List[str]:
     """Store text chunks in ChromaDB"""
     chunks = split_text(text)
@@ -56,6 +109,7 @@ def retrieve_chunks(question: str, k: int = 3) -> List[str]:
     results = collection.query(query_texts=[question], n_results=k)
     return results['documents'][0]
 
+@timed_stage("extract_concepts")
 def extract_concepts(text: str) -> List[Tuple[str, str, str]]:
     """Extract subject-verb-object relationships from text"""
     if not nlp:
@@ -81,6 +135,38 @@ def build_graph(text: str) -> nx.DiGraph:
         G.add_edge(s, o, label=r)
     return G
 
+def add_chunk_edges(G: nx.DiGraph, chunk_id: str, concepts: List[Tuple[str, str, str]]) -> None:
+    """Add concept edges to the graph, remembering which chunk contributed them"""
+    for s, r, o in concepts:
+        if G.has_edge(s, o):
+            G.edges[s, o]['sources'][chunk_id] = r
+        else:
+            G.add_edge(s, o, label=r, sources={chunk_id: r})
+        G.edges[s, o]['label'] = r
+
+def copy_concept_graph(G: nx.DiGraph) -> nx.DiGraph:
+    """Copy a concept graph, including each edge's sources, so the copy can change independently"""
+    copy = G.copy()
+    for _, _, data in copy.edges(data=True):
+        data['sources'] = dict(data['sources'])
+    return copy
+
+def remove_chunk_edges(G: nx.DiGraph, chunk_id: str, concepts: List[Tuple[str, str, str]]) -> None:
+    """Remove the edges a chunk contributed, keeping edges still backed by other chunks"""
+    for s, r, o in concepts:
+        if not G.has_edge(s, o):
+            continue
+        sources = G.edges[s, o]['sources']
+        sources.pop(chunk_id, None)
+        if sources:
+            G.edges[s, o]['label'] = next(reversed(sources.values()))
+        else:
+            G.remove_edge(s, o)
+            for node in (s, o):
+                if G.has_node(node) and G.degree(node) == 0:
+                    G.remove_node(node)
+
+@timed_stage("graph_context")
 def graph_context(question: str, G: nx.DiGraph) -> str:
     """Get graph context relevant to a question"""
     nodes = [n for n in G.nodes if question.lower() in n.lower()]
@@ -93,28 +179,185 @@ def graph_context(question: str, G: nx.DiGraph) -> str:
     
     return "\n".join(info)
 
-def extract_questions_from_paper(paper_text: str) -> pd.DataFrame:
-    """Extract questions from generated paper text"""
-    pattern = r"\d+\.\s(.+?)\s*\((\d+)\s*marks?\)\s*Answer:\s*(.*?)(?=\n\d+\.|\Z)"
-    matches = re.findall(pattern, paper_text, re.DOTALL)
-    
-    questions = []
-    for q_text, marks, answer in matches:
-        questions.append({
-            "question_text": q_text.strip(),
-            "marks": int(marks.strip()),
-            "answer_text": answer.strip()
-        })
-    
-    return pd.DataFrame(questions)
+QUESTION_HEADER = re.compile(r"\s*\d+\.\s")
+MARKS_SUFFIX = re.compile(r"\((\d+)\s*marks?\)\s*$")
+
+def parse_question_block(block: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse one "N. Question (M marks) Answer: ..." block into a question record.
+
+    Uses a single partition on "Answer:" and an end-anchored marks match, so
+    parsing never backtracks across the block.
+    """
+    head, sep, answer = block.partition("Answer:")
+    header = QUESTION_HEADER.match(head)
+    if not sep or not header:
+        return None
+    question = head[header.end():].rstrip()
+    marks = MARKS_SUFFIX.search(question)
+    if not marks:
+        return None
+    return {
+        "question_text": question[:marks.start()].strip(),
+        "marks": int(marks.group(1)),
+        "answer_text": answer.strip()
+    }
+
+class QuestionStreamParser:
+    """
+    Incremental parser for generated paper text arriving in pieces.
+
+    Text is consumed line by line; a numbered question block is complete once
+    the next "N. " header line starts, or when the stream is closed. Each
+    completed block is parsed on its own, so the work stays linear in the
+    length of the paper.
+    """
+
+    def __init__(self):
+        self._partial = ""
+        self._block: List[str] = []
+
+    def _finish_block(self) -> List[Dict[str, Any]]:
+        """Parse the buffered block into a question record, if it is one"""
+        block, self._block = "\n".join(self._block), []
+        record = parse_question_block(block) if block else None
+        return [record] if record else []
+
+    def _line(self, line: str) -> List[Dict[str, Any]]:
+        records = []
+        if QUESTION_HEADER.match(line):
+            records = self._finish_block()
+            self._block = [line]
+        elif self._block:
+            self._block.append(line)
+        return records
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more text and return the questions completed by it"""
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        records = []
+        for line in lines:
+            records.extend(self._line(line))
+        return records
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the remaining text and return the last questions"""
+        records = self._line(self._partial) if self._partial else []
+        self._partial = ""
+        return records + self._finish_block()
+
+@timed_stage("parse")
+def extract_questions_from_paper(paper_text: str) -> List[Dict[str, Any]]:
+    """Extract question records from generated paper text"""
+    parser = QuestionStreamParser()
+    return parser.feed(paper_text) + parser.close()
+
+def format_paper(questions: List[Dict[str, Any]]) -> str:
+    """Render question records in the numbered format the LLM is asked for"""
+    return "\n\n".join(
+        f"{i}. {q['question_text']} ({q['marks']} marks)\nAnswer: {q['answer_text']}"
+        for i, q in enumerate(questions, 1)
+    ) + "\n"
+
+def paper_issues(questions: List[Dict[str, Any]], total_marks: int = PAPER_TOTAL_MARKS,
+                 allowed_marks: Tuple[int, ...] = PAPER_ALLOWED_MARKS) -> List[str]:
+    """Describe how a paper breaks the allowed marks and total marks rules; empty if it is valid"""
+    issues = [
+        f"Question {i} is worth {q['marks']} marks; only {', '.join(map(str, allowed_marks))} are allowed"
+        for i, q in enumerate(questions, 1) if q["marks"] not in allowed_marks
+    ]
+    total = sum(q["marks"] for q in questions)
+    if total != total_marks:
+        issues.append(f"Paper totals {total} marks instead of {total_marks}")
+    return issues
+
+def parse_paper(paper_text: str) -> Dict[str, Any]:
+    """Parse generated paper text into question records, their total marks and any rule violations"""
+    questions = extract_questions_from_paper(paper_text)
+    return {
+        "questions": questions,
+        "total_marks": sum(q["marks"] for q in questions),
+        "raw_paper": paper_text,
+        "issues": paper_issues(questions)
+    }
+
+QUESTION_COLUMNS = ["question_text", "marks", "answer_text"]
+ANSWER_COLUMNS = ["question_number", "student_answer"]
+COHORT_ANSWER_COLUMNS = ["student_id", "question_number", "answer"]
+
+def _rejected(df: pd.DataFrame, source: str, reason: str) -> List[Dict[str, Any]]:
+    """Describe rejected rows by their 1-based data row number"""
+    return [{"source": source, "row": int(row), "reason": reason} for row in df["row"]]
+
+@timed_stage("csv_prepare")
+def prepare_csv_evaluation(questions_df: pd.DataFrame, answers_df: pd.DataFrame,
+                           answer_columns: List[str] = ANSWER_COLUMNS) -> Tuple[pd.DataFrame, pd.DataFrame, List[Dict[str, Any]], pd.DataFrame]:
+    """
+    Validate question and answer CSVs and join them on question number.
+
+    Returns the joined rows, the unique (question_number, student_answer) pairs
+    that actually need grading, a report of rejected rows and the questions that
+    passed validation, which make up the paper. Raises ValueError
+    if a CSV is missing required columns. With COHORT_ANSWER_COLUMNS the answers
+    are in long format, one row per student and question.
+    """
+    for name, df, columns in (("Questions", questions_df, QUESTION_COLUMNS),
+                              ("Student answers", answers_df, answer_columns)):
+        missing = [c for c in columns if c not in df.columns]
+        if missing:
+            raise ValueError(f"{name} CSV is missing required columns: {', '.join(missing)}")
+
+    rejected = []
+
+    # Questions are numbered by position, starting at 1
+    questions = questions_df[QUESTION_COLUMNS].copy()
+    questions["row"] = range(1, len(questions) + 1)
+    questions["question_number"] = questions["row"]
+    questions["marks"] = pd.to_numeric(questions["marks"], errors="coerce")
+    # Marks like "2.5" are rejected rather than truncated
+    invalid = questions["marks"].isna() | (questions["marks"] % 1 != 0) | (questions["marks"] <= 0) | questions["question_text"].isna()
+    rejected += _rejected(questions[invalid], "questions", "missing question_text or marks that are not a positive integer")
+    questions = questions[~invalid].drop(columns="row")
+    questions["marks"] = questions["marks"].astype(int)
+    questions["answer_text"] = questions["answer_text"].fillna("").astype(str)
+
+    answers = answers_df[answer_columns].rename(columns={"answer": "student_answer"})
+    answers["row"] = range(1, len(answers) + 1)
+    numbers = pd.to_numeric(answers["question_number"], errors="coerce")
+    invalid = numbers.isna() | (numbers % 1 != 0)
+    rejected += _rejected(answers[invalid], "student_answers", "question_number is not an integer")
+    answers = answers[~invalid].copy()
+    answers["question_number"] = numbers[~invalid].astype(int)
+    answers["student_answer"] = answers["student_answer"].fillna("").astype(str).str.strip()
+
+    if "student_id" in answers.columns:
+        invalid = answers["student_id"].isna()
+        rejected += _rejected(answers[invalid], "student_answers", "missing student_id")
+        answers = answers[~invalid].copy()
+        answers["student_id"] = answers["student_id"].astype(str)
+        duplicate = answers.duplicated(["student_id", "question_number"])
+        rejected += _rejected(answers[duplicate], "student_answers", "duplicate answer for this student and question")
+        answers = answers[~duplicate]
+
+    rows = answers.merge(questions, on="question_number", how="left", indicator=True)
+    unmatched = rows["_merge"] == "left_only"
+    rejected += _rejected(rows[unmatched], "student_answers", "question_number does not match a valid question")
+    rows = rows[~unmatched].drop(columns="_merge").reset_index(drop=True)
+    rows["marks"] = rows["marks"].astype(int)
+
+    pairs = rows.drop_duplicates(["question_number", "student_answer"]).reset_index(drop=True)
+    return rows, pairs, rejected, questions
 
-def decode_csv_content(base64_content: str) -> pd.DataFrame:
-    """Decode base64 CSV content to DataFrame"""
+def decode_csv_content(base64_content: str, columns: List[str]) -> pd.DataFrame:
+    """Decode base64 CSV content and parse the given columns, without a decoded text copy"""
     try:
-        decoded_content = base64.b64decode(base64_content).decode('utf-8')
-        return pd.read_csv(io.StringIO(decoded_content))
+        table = read_csv_columns(io.BytesIO(base64.b64decode(base64_content)), columns)
     except Exception as e:
         raise ValueError(f"Failed to decode CSV content: {str(e)}")
+    if table.empty:
+        raise ValueError("CSV content has no rows")
+    return table
 
 def encode_csv_content(df: pd.DataFrame) -> str:
     """Encode DataFrame to base64 CSV content"""
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files and flag regressions.
+
+    python benchmarks/compare.py benchmarks/results/base.json benchmarks/results/new.json
+
+A run regresses when its p95 latency or peak RSS grows, or its throughput
+drops, by more than the threshold. Exits with status 1 on any regression
+when --fail is given, for use in CI.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+Key = Tuple[str, int]
+
+def load(path: str) -> Tuple[Dict[str, Any], Dict[Key, Dict[str, Any]]]:
+    """Load a result file as its metadata and results keyed by (stage, size)"""
+    with open(path) as f:
+        data = json.load(f)
+    return data["meta"], {(r["stage"], r["size"]): r for r in data["results"]}
+
+def change(old: Optional[float], new: Optional[float]) -> Optional[float]:
+    """Relative change from old to new"""
+    if not old or new is None:
+        return None
+    return (new - old) / old
+
+def fmt(value: Optional[float]) -> str:
+    return "     n/a" if value is None else f"{value:+8.1%}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--fail", action="store_true", help="Exit with status 1 if anything regressed")
+    args = parser.parse_args()
+
+    base_meta, base = load(args.base)
+    new_meta, new = load(args.new)
+    print(f"Comparing {base_meta['commit']} -> {new_meta['commit']} (threshold {args.threshold:.0%})")
+    print(f"{'stage':<13} {'size':>6}  {'p50':>8} {'p95':>8} {'p99':>8} {'thruput':>8} {'rss':>8}")
+
+    regressions = []
+    for key in sorted(base.keys() & new.keys()):
+        old, cur = base[key], new[key]
+        p50 = change(old["latency_ms"]["p50"], cur["latency_ms"]["p50"])
+        p95 = change(old["latency_ms"]["p95"], cur["latency_ms"]["p95"])
+        p99 = change(old["latency_ms"]["p99"], cur["latency_ms"]["p99"])
+        throughput = change(old["throughput_per_s"], cur["throughput_per_s"])
+        rss = change(old["rss_peak_mb"], cur["rss_peak_mb"])
+
+        regressed = (
+            (p95 is not None and p95 > args.threshold)
+            or (throughput is not None and throughput < -args.threshold)
+            or (rss is not None and rss > args.threshold)
+        )
+        if regressed:
+            regressions.append(key)
+        marker = "  ⚠️ regression" if regressed else ""
+        print(f"{key[0]:<13} {key[1]:>6}  {fmt(p50)} {fmt(p95)} {fmt(p99)} {fmt(throughput)} {fmt(rss)}{marker}")
+
+    for key in sorted(base.keys() ^ new.keys()):
+        print(f"{key[0]:<13} {key[1]:>6}  only in {'base' if key in base else 'new'}")
+
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s)")
+        if args.fail:
+            sys.exit(1)
+    else:
+        print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
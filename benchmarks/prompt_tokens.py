@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Prompt token measurement for the answer evaluation prompt.
+
+Renders the evaluation prompt for every answer of a synthetic cohort that
+would reach the LLM, in the current field layout and in the layout used
+before the shared study context was moved to the front, and reports prompt
+tokens per call plus how many of them repeat an earlier prompt for the same
+question: the prefix a provider-side prompt cache can reuse. No LLM is called.
+
+    python benchmarks/prompt_tokens.py
+    python benchmarks/prompt_tokens.py --students 200 --material-kb 64 --per-call
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent / "backend"
+
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+import synthetic
+
+# Instructions and input fields of EvalSignature, in the order DSPy renders them
+INSTRUCTIONS = "Signature for answer evaluation"
+CURRENT_FIELDS = ("study_context", "question", "max_marks", "reference_answer", "student_answer")
+LEGACY_FIELDS = ("study_context", "question", "reference_answer", "student_answer")
+
+def render_prompt(fields: Tuple[str, ...], inputs: Dict[str, str]) -> str:
+    """Render inputs the way DSPy's chat adapter lays out a prompt"""
+    header = f"{INSTRUCTIONS}\n\nYour input fields are: {', '.join(fields)}.\n\n"
+    return header + "".join(f"[[ ## {name} ## ]]\n{inputs[name]}\n\n" for name in fields)
+
+def common_prefix(a: str, b: str) -> int:
+    """Length of the common prefix of two strings"""
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+def measure(calls: List[Tuple[int, str]]) -> Dict[str, Any]:
+    """Prompt tokens per call and the tokens each shares with the previous prompt for its question"""
+    previous: Dict[int, str] = {}
+    per_call = []
+    for question_number, prompt in calls:
+        cached = common_prefix(previous[question_number], prompt) if question_number in previous else 0
+        previous[question_number] = prompt
+        # Same four-characters-per-token estimate the usage ledger falls back to
+        per_call.append({"prompt_tokens": len(prompt) // 4, "prefix_tokens": cached // 4})
+
+    prompt_tokens = sum(c["prompt_tokens"] for c in per_call)
+    prefix_tokens = sum(c["prefix_tokens"] for c in per_call)
+    return {
+        "calls": len(per_call),
+        "prompt_tokens": prompt_tokens,
+        "mean_prompt_tokens": prompt_tokens / len(per_call) if per_call else 0.0,
+        "prefix_tokens": prefix_tokens,
+        "prefix_share": prefix_tokens / prompt_tokens if prompt_tokens else 0.0,
+        "per_call": per_call
+    }
+
+def build_calls(material_kb: int, students: int, seed: int) -> Dict[str, List[Tuple[int, str]]]:
+    """Render every unique (question, answer) pair's prompt in both layouts"""
+    from services.grading import build_question_contexts
+    from services.material_store import material_store
+    from utils import prepare_csv_evaluation, COHORT_ANSWER_COLUMNS
+
+    material_store.upsert("bench-prompt", synthetic.study_material(material_kb * 1024, seed))
+    questions_df = synthetic.questions(seed=seed)
+    answers_df = synthetic.cohort_answers(questions_df, students, seed)
+    _, pairs, _, _ = prepare_csv_evaluation(questions_df, answers_df, COHORT_ANSWER_COLUMNS)
+    contexts = build_question_contexts("bench-prompt", pairs)
+
+    calls = {"legacy": [], "current": []}
+    for pair in pairs.itertuples(index=False):
+        context, _ = contexts[pair.question_number]
+        inputs = {
+            "question": pair.question_text,
+            "max_marks": str(pair.marks),
+            "reference_answer": pair.answer_text,
+            "student_answer": pair.student_answer
+        }
+        # Before: per-question fields led the context and repeated the reference answer
+        legacy_context = f"Maximum Marks: {pair.marks}\nReference Answer: {pair.answer_text}\n" + context
+        calls["legacy"].append((pair.question_number, render_prompt(LEGACY_FIELDS, {**inputs, "study_context": legacy_context})))
+        calls["current"].append((pair.question_number, render_prompt(CURRENT_FIELDS, {**inputs, "study_context": context})))
+    return calls
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure evaluation prompt tokens per call before and after the prompt layout change")
+    parser.add_argument("--material-kb", type=int, default=64, help="Study material size in KB")
+    parser.add_argument("--students", type=int, default=50, help="Cohort size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--per-call", action="store_true", help="Print every call's token counts")
+    parser.add_argument("--output", help="Also write the measurements as JSON to this file")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)
+    results = {layout: measure(calls) for layout, calls in build_calls(args.material_kb, args.students, args.seed).items()}
+
+    print(f"📊 Evaluation prompts for {args.students} students, {args.material_kb}KB material (tokens estimated at 4 chars each)")
+    for layout, result in results.items():
+        print(
+            f"  {layout:<8} {result['calls']:>6} calls  {result['mean_prompt_tokens']:9.1f} tokens/call  "
+            f"{result['prefix_share']:6.1%} reusable prefix"
+        )
+    if args.per_call:
+        print("  call  legacy tokens (prefix)  current tokens (prefix)")
+        for i, (legacy, current) in enumerate(zip(results["legacy"]["per_call"], results["current"]["per_call"]), 1):
+            print(
+                f"  {i:>4}  {legacy['prompt_tokens']:>7} ({legacy['prefix_tokens']:>6})       "
+                f"{current['prompt_tokens']:>7} ({current['prefix_tokens']:>6})"
+            )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"options": vars(args), "results": results}, indent=2))
+        print(f"✅ Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
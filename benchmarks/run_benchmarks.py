@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmarks for the ingestion, retrieval, graph and grading paths.
+
+Each (stage, size) pair runs in a fresh spawned process, so peak RSS is per
+stage, against the stub LLM server started on a free local port. Results are
+written as JSON for comparison between commits with compare.py.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --stages ingest,retrieve --material-kb 64,512
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BENCHMARKS_DIR.parent
+BACKEND_DIR = ROOT_DIR / "backend"
+RESULTS_DIR = BENCHMARKS_DIR / "results"
+
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BENCHMARKS_DIR))
+
+import synthetic
+
+# A stage returns per-call latencies in seconds and the number of items processed
+StageResult = Tuple[List[float], int]
+STAGES: Dict[str, Tuple[str, Callable[[int, Dict[str, Any]], StageResult]]] = {}
+
+def stage(name: str, size_unit: str):
+    """Register a benchmark stage; size_unit says what its sizes count"""
+    def decorator(fn):
+        STAGES[name] = (size_unit, fn)
+        return fn
+    return decorator
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def timed(fn: Callable, *args) -> Tuple[Any, float]:
+    """Call fn and return its result with the elapsed seconds"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def ingest_material(material_id: str, size_kb: int, seed: int) -> str:
+    """Index a synthetic material and return its text"""
+    from services.material_store import material_store
+    text = synthetic.study_material(size_kb * 1024, seed)
+    material_store.upsert(material_id, text)
+    return text
+
+@stage("chunk", "material_kb")
+def bench_chunk(size_kb: int, opts: Dict[str, Any]) -> StageResult:
+    from config import CHUNK_SIZE
+    from utils import split_paragraphs
+    text = synthetic.study_material(size_kb * 1024, opts["seed"])
+    latencies, items = [], 0
+    for _ in range(opts["iterations"]):
+        chunks, seconds = timed(split_paragraphs, text, CHUNK_SIZE)
+        latencies.append(seconds)
+        items += len(chunks)
+    return latencies, items
+
+@stage("ingest", "material_kb")
+def bench_ingest(size_kb: int, opts: Dict[str, Any]) -> StageResult:
+    from services.material_store import material_store
+    text = synthetic.study_material(size_kb * 1024, opts["seed"])
+    latencies, items = [], 0
+    for i in range(opts["iterations"]):
+        stats, seconds = timed(material_store.upsert, f"bench-ingest-{i}", text)
+        latencies.append(seconds)
+        items += stats["added"]
+        material_store.delete(f"bench-ingest-{i}")
+    return latencies, items
+
+@stage("update", "material_kb")
+def bench_update(size_kb: int, opts: Dict[str, Any]) -> StageResult:
+    from services.material_store import material_store
+    paragraphs = ingest_material("bench-update", size_kb, opts["seed"]).split("\n\n")
+    latencies, items = [], 0
+    for i in range(opts["iterations"]):
+        # Edit one paragraph, as a teacher correcting their notes would
+        paragraphs[i % len(paragraphs)] += f" Revision {i}."
+        stats, seconds = timed(material_store.upsert, "bench-update", "\n\n".join(paragraphs))
+        latencies.append(seconds)
+        items += stats["added"]
+    return latencies, items
+
+@stage("retrieve", "material_kb")
+def bench_retrieve(size_kb: int, opts: Dict[str, Any]) -> StageResult:
+    from services.material_store import material_store
+    ingest_material("bench-retrieve", size_kb, opts["seed"])
+    questions = synthetic.questions(seed=opts["seed"])["question_text"].tolist()
+    latencies = []
+    for _ in range(opts["iterations"]):
+        for question in questions:
+            latencies.append(timed(material_store.retrieve, "bench-retrieve", question)[1])
+    return latencies, len(latencies)
+
+@stage("graph", "material_kb")
+def bench_graph(size_kb: int, opts: Dict[str, Any]) -> StageResult:
+    from services.material_store import material_store
+    from utils import graph_context
+    ingest_material("bench-graph", size_kb, opts["seed"])
+    graph = material_store.get("bench-graph").graph
+    latencies = []
+    for _ in range(opts["iterations"]):
+        for noun in synthetic.NOUNS:
+            latencies.append(timed(graph_context, noun, graph)[1])
+    return latencies, len(latencies)
+
+@stage("csv_prepare", "students")
+def bench_csv_prepare(students: int, opts: Dict[str, Any]) -> StageResult:
+    from utils import prepare_csv_evaluation, COHORT_ANSWER_COLUMNS
+    questions_df = synthetic.questions(seed=opts["seed"])
+    answers_df = synthetic.cohort_answers(questions_df, students, opts["seed"])
+    latencies = []
+    for _ in range(opts["iterations"]):
+        latencies.append(timed(prepare_csv_evaluation, questions_df, answers_df, COHORT_ANSWER_COLUMNS)[1])
+    return latencies, len(answers_df) * len(latencies)
+
+@stage("grade_answer", "students")
+def bench_grade_answer(students: int, opts: Dict[str, Any]) -> StageResult:
+    from services.grading import build_question_contexts, grade_answer
+    from utils import prepare_csv_evaluation, COHORT_ANSWER_COLUMNS
+    ingest_material("bench-grade", opts["grading_material_kb"], opts["seed"])
+    questions_df = synthetic.questions(seed=opts["seed"])
+    answers_df = synthetic.cohort_answers(questions_df, students, opts["seed"])
+    _, pairs, _, _ = prepare_csv_evaluation(questions_df, answers_df, COHORT_ANSWER_COLUMNS)
+    contexts = build_question_contexts("bench-grade", pairs)
+
+    latencies = []
+    for pair in pairs.itertuples(index=False):
+        context, chunks = contexts[pair.question_number]
+        latencies.append(timed(
+            grade_answer, context, chunks, pair.question_text,
+            pair.student_answer, pair.answer_text, pair.marks
+        )[1])
+    return latencies, len(latencies)
+
+@stage("grade_batch", "students")
+def bench_grade_batch(students: int, opts: Dict[str, Any]) -> StageResult:
+    from services.grading import grade_cache, grade_pairs, merge_grades
+    from utils import prepare_csv_evaluation, COHORT_ANSWER_COLUMNS
+    ingest_material("bench-grade", opts["grading_material_kb"], opts["seed"])
+    questions_df = synthetic.questions(seed=opts["seed"])
+    answers_df = synthetic.cohort_answers(questions_df, students, opts["seed"])
+
+    def grade_cohort():
+        rows, pairs, _, _ = prepare_csv_evaluation(questions_df, answers_df, COHORT_ANSWER_COLUMNS)
+        return merge_grades(rows, grade_pairs("bench-grade", pairs))
+
+    latencies = []
+    for _ in range(opts["iterations"]):
+        # Start cold so every run grades the whole cohort
+        grade_cache.clear()
+        latencies.append(timed(grade_cohort)[1])
+    return latencies, len(answers_df) * len(latencies)
+
+def run_stage(name: str, size: int, opts: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one stage at one size in this (fresh) process and summarize it"""
+    from utils import embedding_fn, extract_concepts
+
+    # Load the embedding and spaCy models before measuring
+    embedding_fn(["warm up"])
+    extract_concepts("The model warms up the cache.")
+    baseline_rss = peak_rss_mb()
+
+    size_unit, fn = STAGES[name]
+    (latencies, items), elapsed = timed(fn, size, opts)
+    latencies_ms = np.asarray(latencies) * 1000
+
+    return {
+        "stage": name,
+        "size": size,
+        "size_unit": size_unit,
+        "calls": len(latencies),
+        "items": items,
+        "throughput_per_s": items / sum(latencies) if sum(latencies) else None,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "max": float(latencies_ms.max())
+        },
+        "stage_seconds": elapsed,
+        "rss_baseline_mb": baseline_rss,
+        "rss_peak_mb": peak_rss_mb()
+    }
+
+def free_port() -> int:
+    """Find a free local TCP port"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_stub_llm(latency_ms: float, jitter_ms: float, seed: int) -> subprocess.Popen:
+    """Start the stub LLM server and point the backend at it through the environment"""
+    port = free_port()
+    os.environ.update({"LLM_BACKEND": "stub", "STUB_LLM_HOST": "127.0.0.1", "STUB_LLM_PORT": str(port)})
+    server = subprocess.Popen(
+        [sys.executable, "stub_llm.py", "--port", str(port), "--latency-ms", str(latency_ms),
+         "--jitter-ms", str(jitter_ms), "--seed", str(seed)],
+        cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("Stub LLM server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Stub LLM server did not start within 30 seconds")
+
+def git_commit() -> str:
+    """Current commit hash, or 'unknown' outside a git checkout"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the end-to-end benchmarks")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated stages ({', '.join(STAGES)})")
+    parser.add_argument("--material-kb", type=parse_sizes, default=[16, 128, 1024], help="Study material sizes in KB")
+    parser.add_argument("--students", type=parse_sizes, default=[10, 50, 200], help="Cohort sizes for the grading stages")
+    parser.add_argument("--grading-material-kb", type=int, default=64, help="Study material size for the grading stages")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    parser.add_argument("--llm-jitter-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    opts = {
+        "iterations": args.iterations,
+        "grading_material_kb": args.grading_material_kb,
+        "seed": args.seed
+    }
+    commit = git_commit()
+    started = datetime.now(timezone.utc)
+
+    print(f"📊 Benchmarking commit {commit}")
+    server = start_stub_llm(args.llm_latency_ms, args.llm_jitter_ms, args.seed)
+    results = []
+    try:
+        # Spawn a fresh process per run so models, caches and peak RSS never carry over
+        context = multiprocessing.get_context("spawn")
+        for name in stages:
+            size_unit, _ = STAGES[name]
+            sizes = args.students if size_unit == "students" else args.material_kb
+            for size in sizes:
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_stage, (name, size, opts))
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"  {name:<13} {size:>6} {size_unit:<12} "
+                    f"p50 {latency['p50']:9.2f}ms  p95 {latency['p95']:9.2f}ms  p99 {latency['p99']:9.2f}ms  "
+                    f"{result['throughput_per_s'] or 0:10.1f}/s  peak {result['rss_peak_mb']:7.1f}MB"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{started:%Y%m%dT%H%M%S}-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "meta": {
+            "commit": commit,
+            "started": started.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {**opts, "llm_latency_ms": args.llm_latency_ms, "llm_jitter_ms": args.llm_jitter_ms}
+        },
+        "results": results
+    }, indent=2))
+    print(f"✅ Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Synthetic study material and answer CSVs for the benchmarks.
+
+Everything is generated from a seeded RNG, so a given size and seed always
+produces the same data and results stay comparable between commits.
+"""
+
+import random
+from typing import List
+
+import pandas as pd
+
+NOUNS = [
+    "cell", "enzyme", "protein", "membrane", "nucleus", "molecule", "energy", "plant", "photosynthesis",
+    "chlorophyll", "glucose", "oxygen", "carbon", "mitochondria", "ribosome", "gene", "chromosome",
+    "organism", "population", "ecosystem", "nutrient", "hormone", "neuron", "muscle", "tissue",
+    "bacteria", "virus", "antibody", "receptor", "signal", "reaction", "catalyst", "substrate",
+]
+VERBS = [
+    "produces", "converts", "regulates", "transports", "binds", "releases", "absorbs", "stores",
+    "activates", "inhibits", "controls", "requires", "forms", "breaks", "synthesizes", "protects",
+]
+ADJECTIVES = [
+    "active", "complex", "stable", "essential", "internal", "external", "rapid", "specific",
+    "primary", "cellular", "chemical", "biological",
+]
+PAPER_MARKS = [2, 2, 2, 2, 2, 5, 5, 10, 10, 10]
+
+def sentence(rng: random.Random) -> str:
+    """One subject-verb-object sentence, so concept extraction has work to do"""
+    return (
+        f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(VERBS)} "
+        f"the {rng.choice(NOUNS)} in the {rng.choice(NOUNS)}."
+    )
+
+def study_material(size_bytes: int, seed: int = 0) -> str:
+    """Paragraphs of three to six sentences, about size_bytes long"""
+    rng = random.Random(seed)
+    paragraphs, length = [], 0
+    while length < size_bytes:
+        paragraph = " ".join(sentence(rng) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def questions(n_questions: int = len(PAPER_MARKS), seed: int = 0) -> pd.DataFrame:
+    """A questions CSV whose marks follow the 2/5/10 paper layout"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_questions):
+        subject, verb, obj = rng.choice(NOUNS), rng.choice(VERBS), rng.choice(NOUNS)
+        rows.append({
+            "question_text": f"Explain how the {subject} {verb} the {obj}.",
+            "marks": PAPER_MARKS[i % len(PAPER_MARKS)],
+            "answer_text": f"The {subject} {verb} the {obj}. " + " ".join(sentence(rng) for _ in range(2))
+        })
+    return pd.DataFrame(rows)
+
+def answer(rng: random.Random, reference: str) -> str:
+    """
+    A student answer mixing the cases the grading tiers see.
+
+    About 20% copy the reference, 10% are blank, 10% are off-topic and the rest
+    are paraphrases with some words swapped, so most reach the LLM.
+    """
+    roll = rng.random()
+    if roll < 0.2:
+        return reference
+    if roll < 0.3:
+        return ""
+    if roll < 0.4:
+        return "I am not sure, we did not cover this topic in class."
+    words = reference.split()
+    for _ in range(max(1, len(words) // 4)):
+        words[rng.randrange(len(words))] = rng.choice(NOUNS + VERBS)
+    return " ".join(words)
+
+def cohort_answers(questions_df: pd.DataFrame, n_students: int, seed: int = 0) -> pd.DataFrame:
+    """A long-format answers CSV with one answer per student and question"""
+    rng = random.Random(seed)
+    references: List[str] = questions_df["answer_text"].tolist()
+    rows = [
+        {"student_id": f"s{student:05d}", "question_number": number, "answer": answer(rng, reference)}
+        for student in range(n_students)
+        for number, reference in enumerate(references, 1)
+    ]
+    return pd.DataFrame(rows)
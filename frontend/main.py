@@ -13,7 +13,11 @@ from pages import (
     evaluate_single_answer_page,
     evaluate_csv_page,
     score_summary_page,
-    call_api
+    call_api,
+    get_session,
+    BACKEND_URL,
+    API_BASE_URL,
+    API_CONNECT_TIMEOUT
 )
 
 # Page configuration
@@ -205,9 +209,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# API Configuration
-API_BASE_URL = "http://localhost:8000/api/v1"
-
 def show_toast(message: str, type: str = "success"):
     """Show a toast notification with enhanced styling"""
     if type == "success":
@@ -362,7 +363,7 @@ def main():
         # API Status with enhanced styling
         st.markdown("### 🔗 System Status")
         try:
-            response = requests.get("http://localhost:8000/health", timeout=5)
+            response = get_session().get(f"{BACKEND_URL}/health", timeout=(API_CONNECT_TIMEOUT, 5))
             if response.status_code == 200:
                 st.markdown('<div class="status-connected">🟢 Connected</div>', unsafe_allow_html=True)
             else:
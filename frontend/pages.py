@@ -3,7 +3,22 @@ import requests
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from typing import Dict, Any
+import gzip
+import hashlib
+import json
+import os
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Any, Iterator, Tuple
+
+# API Configuration
+BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000").rstrip("/")
+API_BASE_URL = f"{BACKEND_URL}/api/v1"
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", 5))
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", 300))  # Generation and batch grading can be slow
+API_RETRIES = int(os.getenv("API_RETRIES", 3))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", 10))
+API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", 1024))  # Request bodies at least this large are gzipped
 
 def show_toast(message: str, type: str = "success"):
     """Show a toast notification"""
@@ -16,24 +31,101 @@ def show_toast(message: str, type: str = "success"):
     elif type == "warning":
         st.warning(message)
 
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Shared HTTP session reusing pooled connections to the backend across reruns"""
+    session = requests.Session()
+    retry = Retry(
+        total=API_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}),  # Only idempotent calls
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip"
+    return session
+
+def send_request(method: str, endpoint: str, data: Dict = None, files: Dict = None, stream: bool = False) -> requests.Response:
+    """Send a request to the backend, gzipping large request bodies"""
+    session = get_session()
+    if files:
+        request = requests.Request(method, f"{API_BASE_URL}{endpoint}", files=files, data=data)
+    else:
+        request = requests.Request(method, f"{API_BASE_URL}{endpoint}", json=data)
+    prepared = session.prepare_request(request)
+    
+    if prepared.body and len(prepared.body) >= API_GZIP_MIN_BYTES:
+        body = prepared.body.encode("utf-8") if isinstance(prepared.body, str) else prepared.body
+        prepared.body = gzip.compress(body, compresslevel=6)
+        prepared.headers["Content-Encoding"] = "gzip"
+        prepared.headers["Content-Length"] = str(len(prepared.body))
+    
+    return session.send(prepared, stream=stream, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+
 def call_api(endpoint: str, method: str = "POST", data: Dict = None, files: Dict = None) -> Dict[str, Any]:
     """Make API call to backend"""
     try:
-        url = f"http://localhost:8000/api/v1{endpoint}"
-        
-        if method == "POST":
-            if files:
-                response = requests.post(url, files=files, data=data)
-            else:
-                response = requests.post(url, json=data)
-        else:
-            response = requests.get(url)
-        
+        response = send_request(method, endpoint, data=data, files=files)
         response.raise_for_status()
         return {"success": True, "data": response.json()}
     
     except requests.exceptions.RequestException as e:
-        return {"success": False, "error": str(e)}
+        status = e.response.status_code if e.response is not None else None
+        return {"success": False, "error": str(e), "status": status}
+
+def stream_api(endpoint: str, data: Dict = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """POST to a server-sent events endpoint and yield (event, data) pairs as they arrive"""
+    try:
+        with send_request("POST", endpoint, data=data, stream=True) as response:
+            response.raise_for_status()
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):])
+                    event = "message"
+    
+    except requests.exceptions.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        yield "error", {"detail": str(e), "status": status}
+
+def forget_material():
+    """Drop the remembered material so it is registered again on the upload page"""
+    for key in ('material_id', 'material_source', 'material_chunks'):
+        st.session_state.pop(key, None)
+
+def material_lost(result: Dict[str, Any]) -> bool:
+    """Forget the material if the backend no longer has it (restarted or deleted); True if so"""
+    if result.get("status") != 404:
+        return False
+    forget_material()
+    show_toast("⚠️ The backend no longer has this study material. Please upload it again.", "warning")
+    return True
+
+def register_study_material(source_key: str, endpoint: str, data: Dict = None, files: Dict = None) -> bool:
+    """Register study material with the backend once and remember its material ID"""
+    if st.session_state.get('material_source') == source_key and 'material_id' in st.session_state:
+        # Reuse the ID only while the backend still has it; it may have restarted
+        check = call_api(f"/materials/{st.session_state['material_id']}", method="GET")
+        if check.get("status") != 404:
+            return True
+        forget_material()
+    
+    with st.spinner("⚙️ Processing study material..."):
+        result = call_api(endpoint, data=data, files=files)
+    
+    if not result["success"]:
+        show_toast(f"❌ Failed to process study material: {result['error']}", "error")
+        return False
+    
+    st.session_state['material_id'] = result["data"]["material_id"]
+    st.session_state['material_chunks'] = result["data"]["chunks"]
+    st.session_state['material_source'] = source_key
+    return True
 
 def upload_study_material_page():
     """Page for uploading study material"""
@@ -41,9 +133,9 @@ def upload_study_material_page():
     
     st.markdown("""
     ### Instructions
-    1. Upload a `.txt` file containing your study material
+    1. Upload a `.txt`, `.md`, `.html`, `.pdf` or `.docx` file containing your study material
     2. Or paste the study material directly in the text area below
-    3. The material will be processed and stored for question generation and evaluation
+    3. The material will be processed and stored once for question generation and evaluation
     """)
     
     col1, col2 = st.columns(2)
@@ -51,19 +143,26 @@ def upload_study_material_page():
     with col1:
         st.subheader("📁 File Upload")
         uploaded_file = st.file_uploader(
-            "Choose a .txt file",
-            type=['txt'],
-            help="Upload a text file containing study material"
+            "Choose a study material file",
+            type=['txt', 'md', 'markdown', 'html', 'htm', 'pdf', 'docx'],
+            help="Upload a document containing study material"
         )
         
         if uploaded_file is not None:
-            study_text = uploaded_file.read().decode('utf-8')
-            st.session_state['study_text'] = study_text
-            st.success(f"✅ File uploaded successfully! ({len(study_text)} characters)")
+            file_content = uploaded_file.getvalue()
+            source_key = hashlib.sha1(file_content).hexdigest()
             
-            # Show preview
-            with st.expander("📖 Preview Study Material"):
-                st.text_area("Study Material Preview", study_text[:1000] + "..." if len(study_text) > 1000 else study_text, height=200)
+            if register_study_material(source_key, "/materials/file", files={
+                'file': (uploaded_file.name, file_content)
+            }):
+                st.success(f"✅ File uploaded successfully! ({st.session_state['material_chunks']} chunks)")
+                
+                # Show preview of plain text files
+                if uploaded_file.name.endswith('.txt'):
+                    study_text = file_content.decode('utf-8', errors='replace')
+                    st.session_state['study_text'] = study_text
+                    with st.expander("📖 Preview Study Material"):
+                        st.text_area("Study Material Preview", study_text[:1000] + "..." if len(study_text) > 1000 else study_text, height=200)
     
     with col2:
         st.subheader("✍️ Direct Input")
@@ -74,11 +173,14 @@ def upload_study_material_page():
         )
         
         if study_text_input.strip():
-            st.session_state['study_text'] = study_text_input
-            st.success(f"✅ Text input saved! ({len(study_text_input)} characters)")
+            source_key = hashlib.sha1(study_text_input.encode('utf-8')).hexdigest()
+            
+            if register_study_material(source_key, "/materials", data={"study_text": study_text_input}):
+                st.session_state['study_text'] = study_text_input
+                st.success(f"✅ Text input saved! ({len(study_text_input)} characters)")
     
     # Store in session state
-    if 'study_text' in st.session_state:
+    if 'material_id' in st.session_state:
         st.markdown('<div class="success-box">', unsafe_allow_html=True)
         st.markdown("**✅ Study material is ready for use!**")
         st.markdown("You can now proceed to generate question papers or evaluate answers.")
@@ -88,7 +190,7 @@ def generate_question_paper_page():
     """Page for generating question papers"""
     st.markdown('<h1 class="main-header">📝 Generate Question Paper</h1>', unsafe_allow_html=True)
     
-    if 'study_text' not in st.session_state or not st.session_state['study_text'].strip():
+    if 'material_id' not in st.session_state:
         st.markdown('<div class="error-box">', unsafe_allow_html=True)
         st.markdown("**⚠️ No study material found!**")
         st.markdown("Please upload study material first from the 'Upload Study Material' page.")
@@ -102,70 +204,90 @@ def generate_question_paper_page():
     """)
     
     if st.button("🚀 Generate Question Paper", type="primary", use_container_width=True):
-        with st.spinner("⚙️ Generating question paper..."):
-            # Call API to generate question paper
-            result = call_api("/generate/paper/text", data={
-                "study_text": st.session_state['study_text']
-            })
+        # Stream the paper so questions show up while the rest is still being written
+        st.subheader("📄 Generated Question Paper")
+        status = st.empty()
+        status.info("⚙️ Generating question paper...")
+        questions_area = st.container()
+        questions = {}
+        slots = {}
+        data = None
+        
+        for event, payload in stream_api("/generate/paper/stream", data={
+            "material_id": st.session_state['material_id']
+        }):
+            if event == "question":
+                q = payload["question"]
+                questions[payload["number"]] = q
+                status.info(f"⚙️ Generating question paper... {len(questions)} questions, {payload['total_marks']} marks so far")
+                slots[payload["number"]] = questions_area.empty()
+                with slots[payload["number"]].expander(f"Question {len(questions)} ({q['marks']} marks)"):
+                    st.write(f"**Question:** {q['question_text']}")
+                    st.write(f"**Answer:** {q['answer_text']}")
+            elif event == "removed":
+                # Questions dropped to fix the total marks; their replacements follow
+                for number in payload["numbers"]:
+                    questions.pop(number, None)
+                    slots.pop(number).empty()
+                status.info(f"🔧 Replacing {len(payload['numbers'])} question(s) to reach the required total...")
+            elif event == "done":
+                data = {
+                    "questions": list(questions.values()),
+                    "total_marks": payload["total_marks"],
+                    "raw_paper": payload["raw_paper"],
+                    "material_id": payload["material_id"]
+                }
+                for issue in payload.get("issues", []):
+                    show_toast(f"⚠️ {issue}", "warning")
+            elif event == "error":
+                status.empty()
+                if not material_lost(payload):
+                    show_toast(f"❌ Failed to generate question paper: {payload['detail']}", "error")
+        
+        if data is not None:
+            st.session_state['generated_paper'] = data
+            status.empty()
+            show_toast("✅ Question paper generated successfully!", "success")
             
-            if result["success"]:
-                data = result["data"]
-                st.session_state['generated_paper'] = data
-                
-                show_toast("✅ Question paper generated successfully!", "success")
-                
-                # Display the generated paper
-                st.subheader("📄 Generated Question Paper")
-                
-                col1, col2 = st.columns([2, 1])
-                
-                with col1:
-                    st.text_area("Raw Question Paper", data["raw_paper"], height=400)
-                
-                with col2:
-                    st.subheader("📊 Paper Summary")
-                    st.metric("Total Questions", len(data["questions"]))
-                    st.metric("Total Marks", data["total_marks"])
-                    
-                    # Questions breakdown
-                    st.subheader("📋 Questions Breakdown")
-                    for i, q in enumerate(data["questions"], 1):
-                        with st.expander(f"Question {i} ({q['marks']} marks)"):
-                            st.write(f"**Question:** {q['question_text']}")
-                            st.write(f"**Answer:** {q['answer_text']}")
-                
-                # Download options
-                st.subheader("💾 Download Options")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    # Download as text
-                    st.download_button(
-                        label="📄 Download as Text",
-                        data=data["raw_paper"],
-                        file_name="generated_question_paper.txt",
-                        mime="text/plain"
-                    )
-                
-                with col2:
-                    # Download as CSV
-                    questions_df = pd.DataFrame(data["questions"])
-                    csv_data = questions_df.to_csv(index=False)
-                    st.download_button(
-                        label="📊 Download as CSV",
-                        data=csv_data,
-                        file_name="generated_question_paper.csv",
-                        mime="text/csv"
-                    )
-                
-            else:
-                show_toast(f"❌ Failed to generate question paper: {result['error']}", "error")
+            col1, col2 = st.columns([2, 1])
+            
+            with col1:
+                st.text_area("Raw Question Paper", data["raw_paper"], height=400)
+            
+            with col2:
+                st.subheader("📊 Paper Summary")
+                st.metric("Total Questions", len(data["questions"]))
+                st.metric("Total Marks", data["total_marks"])
+            
+            # Download options
+            st.subheader("💾 Download Options")
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                # Download as text
+                st.download_button(
+                    label="📄 Download as Text",
+                    data=data["raw_paper"],
+                    file_name="generated_question_paper.txt",
+                    mime="text/plain"
+                )
+            
+            with col2:
+                # Download as CSV
+                questions_df = pd.DataFrame(data["questions"])
+                csv_data = questions_df.to_csv(index=False)
+                st.download_button(
+                    label="📊 Download as CSV",
+                    data=csv_data,
+                    file_name="generated_question_paper.csv",
+                    mime="text/csv"
+                )
 
 def evaluate_single_answer_page():
     """Page for evaluating a single answer"""
     st.markdown('<h1 class="main-header">✅ Evaluate Single Answer</h1>', unsafe_allow_html=True)
     
-    if 'study_text' not in st.session_state or not st.session_state['study_text'].strip():
+    if 'material_id' not in st.session_state:
         st.markdown('<div class="error-box">', unsafe_allow_html=True)
         st.markdown("**⚠️ No study material found!**")
         st.markdown("Please upload study material first from the 'Upload Study Material' page.")
@@ -220,11 +342,12 @@ def evaluate_single_answer_page():
         with st.spinner("🔍 Evaluating answer..."):
             # Call API to evaluate
             result = call_api("/evaluate/one/text", data={
-                "study_text": st.session_state['study_text'],
+                "material_id": st.session_state['material_id'],
                 "question": selected_question['question_text'],
                 "reference_answer": selected_question['answer_text'],
                 "student_answer": student_answer,
-                "max_marks": selected_question['marks']
+                "max_marks": selected_question['marks'],
+                "include_analysis": False  # Only the feedback is shown
             })
             
             if result["success"]:
@@ -276,14 +399,14 @@ def evaluate_single_answer_page():
                 ))
                 st.plotly_chart(fig, use_container_width=True)
                 
-            else:
+            elif not material_lost(result):
                 show_toast(f"❌ Evaluation failed: {result['error']}", "error")
 
 def evaluate_csv_page():
     """Page for evaluating answers from CSV files"""
     st.markdown('<h1 class="main-header">📊 Evaluate from CSV</h1>', unsafe_allow_html=True)
     
-    if 'study_text' not in st.session_state or not st.session_state['study_text'].strip():
+    if 'material_id' not in st.session_state:
         st.markdown('<div class="error-box">', unsafe_allow_html=True)
         st.markdown("**⚠️ No study material found!**")
         st.markdown("Please upload study material first from the 'Upload Study Material' page.")
@@ -339,11 +462,12 @@ def evaluate_csv_page():
                     'questions_csv': ('questions.csv', questions_csv.getvalue()),
                     'student_answers_csv': ('student_answers.csv', student_answers_csv.getvalue())
                 }, data={
-                    'study_text': st.session_state['study_text']
+                    'material_id': st.session_state['material_id']
                 })
                 
                 if result["success"]:
                     data = result["data"]
+                    st.session_state['result_id'] = data.get('result_id')
                     
                     show_toast("✅ Batch evaluation completed!", "success")
                     
@@ -365,6 +489,12 @@ def evaluate_csv_page():
                     with col4:
                         st.metric("Questions Evaluated", len(data['results']))
                     
+                    # Rows the backend could not match to a question
+                    if data.get('rejected_rows'):
+                        st.warning(f"⚠️ {len(data['rejected_rows'])} CSV rows were rejected and not evaluated")
+                        with st.expander("🚫 Rejected Rows"):
+                            st.dataframe(pd.DataFrame(data['rejected_rows']), use_container_width=True)
+                    
                     # Results table
                     st.subheader("📋 Detailed Results")
                     results_df = pd.DataFrame(data['results'])
@@ -391,173 +521,205 @@ def evaluate_csv_page():
                         mime="text/csv"
                     )
                     
-                else:
+                elif not material_lost(result):
                     show_toast(f"❌ Batch evaluation failed: {result['error']}", "error")
 
+@st.cache_data(show_spinner=False)
+def fetch_analytics(result_id: str) -> Dict[str, Any]:
+    """Fetch pre-aggregated analytics once per result set; stored result sets never change"""
+    return call_api(f"/analytics/{result_id}", method="GET")
+
 def score_summary_page():
     """Page for displaying score summaries"""
     st.markdown('<h1 class="main-header">📈 Score Summary</h1>', unsafe_allow_html=True)
     
     st.markdown("""
     ### Score Summary Dashboard
-    Upload evaluation results CSV to view detailed score analysis and statistics.
+    View the latest batch evaluation, or upload an evaluation results CSV, for detailed score analysis and statistics.
     """)
     
-    uploaded_file = st.file_uploader(
-        "Upload evaluation results CSV",
-        type=['csv'],
-        help="CSV file with evaluation results"
-    )
+    sources = ["Upload results CSV"]
+    if st.session_state.get('result_id'):
+        sources.insert(0, "Latest batch evaluation")
+    source = st.radio("Results source", sources, horizontal=True)
     
-    if uploaded_file is not None:
-        df = pd.read_csv(uploaded_file)
+    result_id = None
+    if source == "Latest batch evaluation":
+        result_id = st.session_state['result_id']
+    else:
+        uploaded_file = st.file_uploader(
+            "Upload evaluation results CSV",
+            type=['csv'],
+            help="CSV file with evaluation results"
+        )
         
-        if 'score' in df.columns and 'max_marks' in df.columns:
-            st.success(f"✅ Results loaded! ({len(df)} evaluations)")
-            
-            # Calculate summary statistics
-            total_score = df['score'].sum()
-            total_max = df['max_marks'].sum()
-            percentage = (total_score / total_max) * 100 if total_max > 0 else 0
-            
-            # Summary metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Total Score", f"{total_score:.1f}")
-            
-            with col2:
-                st.metric("Max Marks", total_max)
-            
-            with col3:
-                st.metric("Percentage", f"{percentage:.1f}%")
-            
-            with col4:
-                st.metric("Questions", len(df))
-            
-            # Score table
-            st.subheader("📋 Score Breakdown")
-            st.dataframe(df, use_container_width=True)
-            
-            # Visualizations
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Score per question
-                fig1 = px.bar(
-                    df,
-                    x='question_number',
-                    y='score',
-                    title="Score per Question",
-                    labels={'question_number': 'Question', 'score': 'Score'}
-                )
-                st.plotly_chart(fig1, use_container_width=True)
-            
-            with col2:
-                # Score vs Max Marks
-                fig2 = px.scatter(
-                    df,
-                    x='max_marks',
-                    y='score',
-                    title="Score vs Max Marks",
-                    labels={'max_marks': 'Max Marks', 'score': 'Score'}
-                )
-                st.plotly_chart(fig2, use_container_width=True)
-            
-            # Enhanced Performance Analysis
-            st.subheader("📊 Advanced Performance Analysis")
-            
-            # Calculate advanced metrics
-            df['percentage'] = (df['score'] / df['max_marks']) * 100
-            df['performance_ratio'] = df['score'] / df['max_marks']
-            
-            # Statistical metrics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Average Score", f"{df['score'].mean():.1f}")
-            
-            with col2:
-                st.metric("Median Score", f"{df['score'].median():.1f}")
-            
-            with col3:
-                st.metric("Std Deviation", f"{df['score'].std():.1f}")
-            
-            with col4:
-                st.metric("Average %", f"{df['percentage'].mean():.1f}%")
-            
-
-            
-            # Question difficulty analysis
-            st.subheader("📈 Question Difficulty Analysis")
-            
-            # Create difficulty categories based on performance
-            df['difficulty'] = pd.cut(df['percentage'], 
-                                    bins=[0, 50, 70, 85, 100], 
-                                    labels=['Very Hard', 'Hard', 'Moderate', 'Easy'])
-            
-            difficulty_counts = df['difficulty'].value_counts()
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Difficulty distribution
-                fig_difficulty = px.pie(
-                    values=difficulty_counts.values,
-                    names=difficulty_counts.index,
-                    title="Question Difficulty Distribution",
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                st.plotly_chart(fig_difficulty, use_container_width=True)
-            
-            with col2:
-                # Performance by difficulty
-                difficulty_performance = df.groupby('difficulty')['percentage'].mean().reset_index()
-                fig_perf_by_diff = px.bar(
-                    difficulty_performance,
-                    x='difficulty',
-                    y='percentage',
-                    title="Average Performance by Difficulty",
-                    labels={'percentage': 'Average %', 'difficulty': 'Difficulty Level'}
-                )
-                st.plotly_chart(fig_perf_by_diff, use_container_width=True)
-            
-            # Performance trends
-            st.subheader("📊 Performance Trends")
-            
-            # Score distribution histogram
-            fig_hist = px.histogram(
-                df,
-                x='percentage',
-                nbins=10,
-                title="Score Distribution",
-                labels={'percentage': 'Percentage Score', 'count': 'Number of Questions'}
-            )
-            st.plotly_chart(fig_hist, use_container_width=True)
-            
-            # Performance recommendations
-            st.subheader("💡 Performance Recommendations")
-            
-            avg_percentage = df['percentage'].mean()
-            
-            if avg_percentage >= 85:
-                recommendation = "Excellent performance! Consider challenging with more difficult questions."
-                color = "success"
-            elif avg_percentage >= 70:
-                recommendation = "Good performance. Focus on areas with lower scores for improvement."
-                color = "info"
-            elif avg_percentage >= 50:
-                recommendation = "Moderate performance. Review fundamental concepts and practice more."
-                color = "warning"
-            else:
-                recommendation = "Performance needs improvement. Consider additional study and practice."
-                color = "error"
-            
-            st.markdown(f'<div class="{color}-box">**Recommendation:** {recommendation}</div>', unsafe_allow_html=True)
-            
-            # Detailed question analysis
-            with st.expander("🔍 Detailed Question Analysis"):
-                st.dataframe(df[['question_number', 'score', 'max_marks', 'percentage', 'difficulty']].sort_values('percentage', ascending=False))
-            
-        else:
-            st.error("❌ Invalid CSV format. Expected columns: score, max_marks") 
\ No newline at end of file
+        if uploaded_file is not None:
+            # Upload each file once; the backend keeps it for analytics
+            file_content = uploaded_file.getvalue()
+            source_key = hashlib.sha1(file_content).hexdigest()
+            if st.session_state.get('uploaded_results_source') != source_key:
+                upload = call_api("/analytics/results", files={'results_csv': (uploaded_file.name, file_content)})
+                if not upload["success"]:
+                    st.error(f"❌ Invalid CSV format. Expected columns: question_number, score, max_marks ({upload['error']})")
+                    return
+                st.session_state['uploaded_results_source'] = source_key
+                st.session_state['uploaded_result_id'] = upload["data"]["result_id"]
+            result_id = st.session_state['uploaded_result_id']
+    
+    if result_id is None:
+        return
+    
+    result = fetch_analytics(result_id)
+    if not result["success"]:
+        fetch_analytics.clear()
+        if result.get("status") == 404 and source != "Latest batch evaluation":
+            # The backend lost the uploaded result set (restart or eviction); upload it again
+            st.session_state.pop('uploaded_results_source', None)
+            st.session_state.pop('uploaded_result_id', None)
+            st.rerun()
+        if result.get("status") == 404:
+            st.session_state.pop('result_id', None)
+            show_toast("⚠️ The backend no longer has the latest batch evaluation. Please run it again.", "warning")
+            return
+        show_toast(f"❌ Failed to load results: {result['error']}", "error")
+        return
+    
+    data = result["data"]
+    summary = data["summary"]
+    questions_df = pd.DataFrame(data["per_question"])
+    st.success(f"✅ Results loaded! ({summary['answers']} evaluations)")
+    
+    # Summary metrics
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Total Score", f"{summary['total_score']:.1f}")
+    
+    with col2:
+        st.metric("Max Marks", summary['total_max_marks'])
+    
+    with col3:
+        st.metric("Percentage", f"{summary['percentage']:.1f}%")
+    
+    with col4:
+        st.metric("Questions", len(questions_df))
+    
+    # Score table
+    st.subheader("📋 Score Breakdown")
+    st.dataframe(questions_df, use_container_width=True)
+    
+    # Visualizations
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Score per question
+        fig1 = px.bar(
+            questions_df,
+            x='question_number',
+            y='mean_score',
+            title="Score per Question",
+            labels={'question_number': 'Question', 'mean_score': 'Score'}
+        )
+        st.plotly_chart(fig1, use_container_width=True)
+    
+    with col2:
+        # Score vs Max Marks
+        fig2 = px.scatter(
+            questions_df,
+            x='max_marks',
+            y='mean_score',
+            title="Score vs Max Marks",
+            labels={'max_marks': 'Max Marks', 'mean_score': 'Score'}
+        )
+        st.plotly_chart(fig2, use_container_width=True)
+    
+    # Per-student totals for cohort results
+    if data["per_student"]:
+        st.subheader("🎓 Student Totals")
+        students_df = pd.DataFrame(data["per_student"])
+        st.dataframe(students_df.sort_values('percentage', ascending=False), use_container_width=True)
+    
+    # Enhanced Performance Analysis
+    st.subheader("📊 Advanced Performance Analysis")
+    
+    # Statistical metrics
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("Average Score", f"{summary['mean_score']:.1f}")
+    
+    with col2:
+        st.metric("Median Score", f"{summary['median_score']:.1f}")
+    
+    with col3:
+        st.metric("Std Deviation", f"{summary['std_score']:.1f}")
+    
+    with col4:
+        st.metric("Average %", f"{summary['mean_percentage']:.1f}%")
+    
+    # Question difficulty analysis
+    st.subheader("📈 Question Difficulty Analysis")
+    difficulty_df = pd.DataFrame(data["difficulty"])
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Difficulty distribution
+        fig_difficulty = px.pie(
+            difficulty_df,
+            values='questions',
+            names='band',
+            title="Question Difficulty Distribution",
+            color_discrete_sequence=px.colors.qualitative.Set3
+        )
+        st.plotly_chart(fig_difficulty, use_container_width=True)
+    
+    with col2:
+        # Performance by difficulty
+        fig_perf_by_diff = px.bar(
+            difficulty_df,
+            x='band',
+            y='mean_percentage',
+            title="Average Performance by Difficulty",
+            labels={'mean_percentage': 'Average %', 'band': 'Difficulty Level'}
+        )
+        st.plotly_chart(fig_perf_by_diff, use_container_width=True)
+    
+    # Performance trends
+    st.subheader("📊 Performance Trends")
+    
+    # Score distribution histogram, binned by the backend
+    histogram_df = pd.DataFrame(data["histogram"])
+    histogram_df['range'] = histogram_df['start'].map('{:.0f}'.format) + "-" + histogram_df['end'].map('{:.0f}%'.format)
+    fig_hist = px.bar(
+        histogram_df,
+        x='range',
+        y='count',
+        title="Score Distribution",
+        labels={'range': 'Percentage Score', 'count': 'Number of Answers'}
+    )
+    st.plotly_chart(fig_hist, use_container_width=True)
+    
+    # Performance recommendations
+    st.subheader("💡 Performance Recommendations")
+    
+    avg_percentage = summary['mean_percentage']
+    
+    if avg_percentage >= 85:
+        recommendation = "Excellent performance! Consider challenging with more difficult questions."
+        color = "success"
+    elif avg_percentage >= 70:
+        recommendation = "Good performance. Focus on areas with lower scores for improvement."
+        color = "info"
+    elif avg_percentage >= 50:
+        recommendation = "Moderate performance. Review fundamental concepts and practice more."
+        color = "warning"
+    else:
+        recommendation = "Performance needs improvement. Consider additional study and practice."
+        color = "error"
+    
+    st.markdown(f'<div class="{color}-box">**Recommendation:** {recommendation}</div>', unsafe_allow_html=True)
+    
+    # Detailed question analysis
+    with st.expander("🔍 Detailed Question Analysis"):
+        st.dataframe(questions_df[['question_number', 'mean_score', 'max_marks', 'mean_percentage', 'difficulty']].sort_values('mean_percentage', ascending=False))
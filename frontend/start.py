@@ -14,7 +14,7 @@ def main():
     
     print("🚀 Starting Question Paper Generator & Evaluator Frontend")
     print("📍 Frontend: http://localhost:8501")
-    print("🔧 Make sure the backend is running on http://localhost:8000")
+    print(f"🔧 Make sure the backend is running on {os.getenv('BACKEND_URL', 'http://localhost:8000')}")
     
     # Change to frontend directory
     os.chdir(frontend_dir)